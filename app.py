@@ -1,6 +1,7 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +14,17 @@ SAM_API_KEY = os.getenv('SAM_API_KEY')
 USASPENDING_API_BASE_URL = 'https://api.usaspending.gov/api/v2'
 SAM_API_BASE_URL = 'https://api.sam.gov/opportunities/v2/search'
 
+# One pooled session for the life of the process so upstream calls reuse
+# keep-alive connections instead of reconnecting on every request
+HTTP_POOL_SIZE = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+HTTP_TIMEOUTS = {
+    'api.sam.gov': float(os.getenv('SAM_TIMEOUT_SECONDS', 30)),
+    'api.usaspending.gov': float(os.getenv('USASPENDING_TIMEOUT_SECONDS', 60)),
+}
+
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(pool_connections=len(HTTP_TIMEOUTS), pool_maxsize=HTTP_POOL_SIZE))
+
 @app.route('/api/opportunities', methods=['GET'])
 def get_opportunities():
     try:
@@ -26,9 +38,10 @@ def get_opportunities():
         }
         
         # Call SAM.gov API
-        sam_response = requests.get(
+        sam_response = http_session.get(
             SAM_API_BASE_URL,
-            params=sam_params
+            params=sam_params,
+            timeout=HTTP_TIMEOUTS['api.sam.gov']
         )
         sam_data = sam_response.json()
 
@@ -100,7 +113,11 @@ def get_spending_data():
             "order": request.args.get('order', 'desc')
         }
 
-        response = requests.post(endpoint, json=payload)
+        response = http_session.post(
+            endpoint,
+            json=payload,
+            timeout=HTTP_TIMEOUTS['api.usaspending.gov']
+        )
         data = response.json()
         
         return jsonify({
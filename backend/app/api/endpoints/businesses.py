@@ -1,27 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
-from app.services.sam_service import SAMService
+from app.api.paging import iterate, match_page, ndjson_response, parse_match_cursor
+from app.core.config import get_settings
+from app.core.jobs import job_queue
+from app.db.session import get_async_db
+from app.services import sync_service
+from app.services.award_service import AwardService
 from app.services.matching_service import MatchingService
+from app.services.snapshots import business_snapshot
 from app.models.business import Business
+from app.models.naics import NAICSCode
 from app.schemas.business import BusinessCreate, BusinessUpdate, BusinessResponse
-import json
+from app.schemas.job import JobResponse
+from app.schemas.match import OpportunityMatch, OpportunityMatchPage
+from datetime import datetime
+
+settings = get_settings()
 
 router = APIRouter()
 
+async def _naics_rows(db: AsyncSession, codes: List[str]) -> List[NAICSCode]:
+    """
+    Reference rows for `codes`, adding untitled rows for codes the loaded
+    NAICS table doesn't have
+    """
+    codes = list(dict.fromkeys(codes))
+    query = select(NAICSCode).where(NAICSCode.code.in_(codes))
+    rows = {row.code: row for row in await db.scalars(query)}
+    missing = [code for code in codes if code not in rows]
+    if missing:
+        # Another request may be adding the same codes; whichever inserts
+        # second waits for the first and then skips them
+        await db.execute(
+            pg_insert(NAICSCode)
+            .values([{'code': code, 'level': len(code)} for code in missing])
+            .on_conflict_do_nothing(index_elements=['code'])
+        )
+        rows = {row.code: row for row in await db.scalars(query)}
+    return [rows[code] for code in codes]
+
 @router.post("/businesses/", response_model=BusinessResponse)
 async def create_business(
     business: BusinessCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new business profile
     """
     # Check if business with CAGE code already exists
-    existing = db.query(Business).filter(
-        Business.cage_code == business.cage_code
-    ).first()
+    existing = await db.scalar(
+        select(Business).where(Business.cage_code == business.cage_code)
+    )
     if existing:
         raise HTTPException(
             status_code=400,
@@ -29,21 +61,24 @@ async def create_business(
         )
     
     # Create new business
-    db_business = Business(**business.dict())
+    db_business = Business(**business.dict(exclude={'naics_codes'}))
+    db_business.naics_codes = await _naics_rows(db, business.naics_codes)
     db.add(db_business)
-    db.commit()
-    db.refresh(db_business)
+    await db.commit()
+    await db.refresh(db_business)
+    business_snapshot.mark_stale()
+    await MatchingService(db).rescore_business(db_business)
     return db_business
 
 @router.get("/businesses/{business_id}", response_model=BusinessResponse)
 async def get_business(
     business_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get detailed information about a specific business
     """
-    business = db.query(Business).filter(Business.id == business_id).first()
+    business = await db.get(Business, business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     return business
@@ -52,28 +87,37 @@ async def get_business(
 async def update_business(
     business_id: int,
     business_update: BusinessUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update a business profile
     """
-    db_business = db.query(Business).filter(Business.id == business_id).first()
+    db_business = await db.get(Business, business_id)
     if not db_business:
         raise HTTPException(status_code=404, detail="Business not found")
     
     # Update business fields
-    for field, value in business_update.dict(exclude_unset=True).items():
+    updates = business_update.dict(exclude_unset=True)
+    naics_codes = updates.pop('naics_codes', None)
+    for field, value in updates.items():
         setattr(db_business, field, value)
+    if naics_codes is not None:
+        db_business.naics_codes = await _naics_rows(db, naics_codes)
+        # The association table has no timestamp; this lets the matching
+        # snapshot pick the change up
+        db_business.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(db_business)
+    await db.commit()
+    await db.refresh(db_business)
+    business_snapshot.mark_stale()
+    await MatchingService(db).rescore_business(db_business)
     return db_business
 
 @router.post("/businesses/{business_id}/capability-statement")
 async def upload_capability_statement(
     business_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a capability statement PDF for a business
@@ -84,88 +128,112 @@ async def upload_capability_statement(
             detail="Only PDF files are accepted"
         )
     
-    business = db.query(Business).filter(Business.id == business_id).first()
+    business = await db.get(Business, business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     
     # TODO: Implement file storage logic (e.g., S3)
     # For now, we'll just update the capabilities field
-    capabilities = business.capabilities or {}
+    capabilities = dict(business.capabilities or {})
     capabilities['capability_statement'] = {
         'filename': file.filename,
         'uploaded_at': datetime.utcnow().isoformat()
     }
     
     business.capabilities = capabilities
-    db.commit()
+    await db.commit()
+    await db.refresh(business)
+    business_snapshot.mark_stale()
+    await MatchingService(db).rescore_business(business)
     
     return {"message": "Capability statement uploaded successfully"}
 
-@router.get("/businesses/{business_id}/matching-opportunities")
+@router.get(
+    "/businesses/{business_id}/matching-opportunities",
+    response_model=OpportunityMatchPage
+)
 async def get_matching_opportunities(
     business_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     min_score: float = 0.6,
-    status: Optional[str] = "active"
+    status: Optional[str] = "active",
+    limit: int = Query(default=25, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False
 ):
     """
     Get opportunities that match with a specific business
+    Returns the best `limit` matches and a next_cursor for the following
+    page; with stream=true every match after the cursor is sent as NDJSON
     """
-    business = db.query(Business).filter(Business.id == business_id).first()
+    business = await db.get(Business, business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    matching_service = MatchingService(db)
-    matches = matching_service.find_matches(
-        business=business,
-        min_score=min_score
-    )
+    after = parse_match_cursor(cursor)
+    page_size = None if stream else limit + 1
     
-    # Filter by status if provided
-    if status:
-        matches = [
-            match for match in matches
-            if match['opportunity'].status == status
-        ]
+    matching_service = MatchingService(db)
+    if min_score >= settings.MATCH_STORE_MIN_SCORE:
+        matches = matching_service.get_stored_matches(
+            business_id=business.id,
+            min_score=min_score,
+            limit=page_size,
+            after=after,
+            status=status
+        )
+    else:
+        matches = await matching_service.find_matches(
+            business=business,
+            min_score=min_score,
+            limit=page_size,
+            after=after,
+            status=status
+        )
+        matches = iterate(matches)
     
-    return matches
+    if stream:
+        return ndjson_response(
+            OpportunityMatch.model_validate(match, from_attributes=True)
+            async for match in matches
+        )
+    return await match_page(matches, limit, lambda match: match['opportunity'].id)
 
-@router.post("/businesses/{business_id}/sync")
+@router.get("/businesses/{business_id}/spending-summary")
+async def get_spending_summary(
+    business_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    naics_code: Optional[str] = None
+):
+    """
+    Summarize a business's federal awards from the local award archive
+    """
+    business = await db.get(Business, business_id)
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+    if not business.duns:
+        raise HTTPException(status_code=400, detail="Business has no DUNS number")
+    return await AwardService(db).spending_summary(business.duns, naics_code)
+
+@router.post(
+    "/businesses/{business_id}/sync",
+    status_code=202,
+    response_model=JobResponse
+)
 async def sync_business_data(
     business_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Sync business data from SAM.gov
+    Queue a sync of business data from SAM.gov
+    Poll GET /jobs/{id} with the returned job id for progress
     """
-    business = db.query(Business).filter(Business.id == business_id).first()
+    business = await db.get(Business, business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    sam_service = SAMService()
-    
-    try:
-        # Get updated entity information from SAM.gov
-        entity_data = await sam_service.get_entity_details(business.cage_code)
-        
-        # Update business information
-        business.name = entity_data.get("entityName")
-        business.duns = entity_data.get("dunsNumber")
-        business.location = {
-            "address": entity_data.get("address", {}),
-            "coordinates": entity_data.get("coordinates", {})
-        }
-        
-        # Update certifications
-        if "certifications" in entity_data:
-            business.certifications = entity_data["certifications"]
-        
-        db.commit()
-        
-        return {"message": "Business data synced successfully"}
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to sync business data: {str(e)}"
-        )
+    return await job_queue.enqueue(
+        sync_service.sync_business,
+        business_id=business.id,
+        cage_code=business.cage_code
+    )
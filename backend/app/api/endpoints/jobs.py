@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+from app.core.jobs import job_queue
+from app.schemas.job import JobResponse
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get the status and progress of a background job, whichever API worker
+    process queued it
+    """
+    job = await job_queue.lookup(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -0,0 +1,59 @@
+from fastapi import APIRouter
+from app.core.cache import response_cache
+from app.core.http import http_client
+from app.core.mail import mail_queue
+from app.core.sms import sms_queue
+from app.core.upstream import upstream
+from app.db.session import pool_monitors
+from app.services.reminder_service import reminder_scheduler
+
+router = APIRouter()
+
+@router.get("/metrics/db")
+async def get_db_metrics():
+    """
+    Database pool usage per engine: checkout waits, overflow and connection age
+    """
+    return {name: monitor.stats() for name, monitor in pool_monitors.items()}
+
+@router.get("/metrics/http")
+async def get_http_metrics():
+    """
+    Outbound HTTP client pool usage, including the connection reuse ratio
+    """
+    return http_client.stats()
+
+@router.get("/metrics/mail")
+async def get_mail_metrics():
+    """
+    Outbound email queue depth, delivery counters, connection reuse and latency
+    """
+    return mail_queue.stats()
+
+@router.get("/metrics/sms")
+async def get_sms_metrics():
+    """
+    Outbound SMS queue depth, delivery, dedupe and throttling counters
+    """
+    return sms_queue.stats()
+
+@router.get("/metrics/reminders")
+async def get_reminder_metrics():
+    """
+    Deadline reminder schedule: tracked notices, next due reminder and digests sent
+    """
+    return reminder_scheduler.stats()
+
+@router.get("/metrics/cache")
+async def get_cache_metrics():
+    """
+    Upstream response cache hit, miss and refresh counters
+    """
+    return response_cache.stats()
+
+@router.get("/metrics/upstream")
+async def get_upstream_metrics():
+    """
+    Upstream API throttle, retry and request coalescing counters
+    """
+    return upstream.stats()
@@ -1,32 +1,45 @@
+import math
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
-from app.db.session import get_db
-from app.services.sam_service import SAMService
-from app.services.usaspending_service import USASpendingService
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from datetime import date, datetime
+from sqlalchemy import and_, func, or_, select, tuple_
+from app.api.paging import (
+    iterate,
+    match_page,
+    ndjson_response,
+    parse_deadline_cursor,
+    parse_match_cursor,
+)
+from app.core.config import get_settings
+from app.core.jobs import job_queue
+from app.core.pagination import encode_cursor
+from app.db.session import get_async_db
+from app.services import sync_service
+from app.services.geo import coordinates_of
 from app.services.matching_service import MatchingService
 from app.models.opportunity import Opportunity
-from app.schemas.opportunity import OpportunityCreate, OpportunityResponse
+from app.schemas.opportunity import (
+    OpportunityPage,
+    OpportunityResponse,
+    OpportunitySearchPage,
+)
+from app.schemas.business import NearbyBusiness
+from app.schemas.job import JobResponse
+from app.schemas.match import BusinessMatch, BusinessMatchPage
+
+settings = get_settings()
 
 router = APIRouter()
 
-@router.get("/opportunities/", response_model=List[OpportunityResponse])
-async def list_opportunities(
-    db: Session = Depends(get_db),
-    naics_code: Optional[str] = None,
-    agency: Optional[str] = None,
-    min_value: Optional[float] = None,
-    max_value: Optional[float] = None,
-    status: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100
+def _filter_opportunities(
+    query,
+    naics_code: Optional[str],
+    agency: Optional[str],
+    min_value: Optional[float],
+    max_value: Optional[float],
+    status: Optional[str]
 ):
-    """
-    List opportunities with optional filters
-    """
-    query = db.query(Opportunity)
-    
     if naics_code:
         query = query.filter(Opportunity.naics_code == naics_code)
     if agency:
@@ -37,85 +50,234 @@ async def list_opportunities(
         query = query.filter(Opportunity.contract_value <= max_value)
     if status:
         query = query.filter(Opportunity.status == status)
+    return query
+
+async def _deadline_page(
+    db: AsyncSession,
+    query,
+    after: Optional[Tuple[Optional[datetime], int]],
+    limit: int
+) -> List[Opportunity]:
+    """
+    Read up to `limit` opportunities after the (response_deadline, id) key
+    `after`, ordered by deadline with undated ones last
+
+    The dated and undated parts are read separately, so each is a plain
+    range scan of a (..., response_deadline, id) index whatever the depth.
+    """
+    rows: List[Opportunity] = []
+    if after is None or after[0] is not None:
+        dated = query.filter(Opportunity.response_deadline.isnot(None))
+        if after is not None:
+            dated = dated.filter(
+                tuple_(Opportunity.response_deadline, Opportunity.id) > after
+            )
+        rows = list(await db.scalars(dated.order_by(
+            Opportunity.response_deadline, Opportunity.id
+        ).limit(limit)))
+    if len(rows) < limit:
+        undated = query.filter(Opportunity.response_deadline.is_(None))
+        if after is not None and after[0] is None:
+            undated = undated.filter(Opportunity.id > after[1])
+        rows += await db.scalars(
+            undated.order_by(Opportunity.id).limit(limit - len(rows))
+        )
+    return rows
+
+@router.get("/opportunities/", response_model=OpportunityPage)
+async def list_opportunities(
+    db: AsyncSession = Depends(get_async_db),
+    naics_code: Optional[str] = None,
+    agency: Optional[str] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    status: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """
+    List opportunities with optional filters, soonest deadline first
+    Pass the returned next_cursor to get the following page
+    """
+    after = parse_deadline_cursor(cursor)
+    query = _filter_opportunities(
+        select(Opportunity), naics_code, agency, min_value, max_value, status
+    )
+    
+    # One extra row tells whether another page follows
+    opportunities = await _deadline_page(db, query, after, limit + 1)
+    next_cursor = None
+    if len(opportunities) > limit:
+        opportunities = opportunities[:limit]
+        last = opportunities[-1]
+        next_cursor = encode_cursor(last.response_deadline, last.id)
+    return {"items": opportunities, "next_cursor": next_cursor}
+
+@router.get("/opportunities/search", response_model=OpportunitySearchPage)
+async def search_opportunities(
+    q: str = Query(min_length=1, max_length=200),
+    db: AsyncSession = Depends(get_async_db),
+    naics_code: Optional[str] = None,
+    agency: Optional[str] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    status: Optional[str] = None,
+    limit: int = Query(default=25, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """
+    Full-text search over opportunity titles and descriptions
+    Accepts web-search syntax ("quoted phrases", or, -excluded) and ranks
+    title hits above description hits; combines with the list filters
+    """
+    after = parse_match_cursor(cursor)
+    ts_query = func.websearch_to_tsquery('english', q)
+    rank = func.ts_rank_cd(Opportunity.search_vector, ts_query)
+    query = _filter_opportunities(
+        select(Opportunity, rank.label('rank')),
+        naics_code, agency, min_value, max_value, status
+    ).filter(Opportunity.search_vector.op('@@')(ts_query))
+    if after is not None:
+        after_rank, after_id = after
+        query = query.filter(or_(
+            rank < after_rank,
+            and_(rank == after_rank, Opportunity.id > after_id)
+        ))
     
-    opportunities = query.offset(skip).limit(limit).all()
-    return opportunities
+    hits = [
+        {'opportunity': opportunity, 'rank': float(hit_rank)}
+        for opportunity, hit_rank in await db.execute(query.order_by(
+            rank.desc(), Opportunity.id
+        ).limit(limit + 1))
+    ]
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1]['rank'], hits[-1]['opportunity'].id)
+    return {"items": hits, "next_cursor": next_cursor}
 
 @router.get("/opportunities/{opportunity_id}", response_model=OpportunityResponse)
 async def get_opportunity(
     opportunity_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get detailed information about a specific opportunity
     """
-    opportunity = db.query(Opportunity).filter(Opportunity.id == opportunity_id).first()
+    opportunity = await db.get(Opportunity, opportunity_id)
     if not opportunity:
         raise HTTPException(status_code=404, detail="Opportunity not found")
     return opportunity
 
-@router.post("/opportunities/sync")
+@router.post("/opportunities/sync", status_code=202, response_model=JobResponse)
 async def sync_opportunities(
-    db: Session = Depends(get_db),
-    days_back: int = Query(default=7, le=30)
+    days_back: Optional[int] = Query(default=None, ge=1, le=30),
+    batch_size: Optional[int] = Query(default=None, ge=1, le=5000)
 ):
     """
-    Sync opportunities from SAM.gov and USAspending.gov
+    Queue a sync of opportunities from SAM.gov
+    Only notices posted since the last successful sync are fetched unless
+    days_back is given. Poll GET /jobs/{id} with the returned job id for
+    progress.
     """
-    sam_service = SAMService()
-    usaspending_service = USASpendingService()
-    
-    # Fetch new opportunities from SAM.gov
-    opportunities = await sam_service.search_opportunities(
-        posted_from=(datetime.now() - timedelta(days=days_back))
+    return await job_queue.enqueue(
+        sync_service.sync_opportunities,
+        days_back=days_back,
+        batch_size=batch_size
+    )
+
+@router.post("/opportunities/backfill", status_code=202, response_model=JobResponse)
+async def backfill_opportunities(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    window_days: Optional[int] = Query(default=None, ge=1, le=365),
+    batch_size: Optional[int] = Query(default=None, ge=1, le=5000)
+):
+    """
+    Queue a backfill of notices posted between start and end
+    Without start, resumes the last unfinished backfill from its checkpoint
+    """
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    return await job_queue.enqueue(
+        sync_service.backfill_opportunities,
+        start=start,
+        end=end,
+        window_days=window_days,
+        batch_size=batch_size
     )
-    
-    new_count = 0
-    updated_count = 0
-    
-    for opp_data in opportunities:
-        # Check if opportunity already exists
-        existing = db.query(Opportunity).filter(
-            Opportunity.notice_id == opp_data["noticeId"]
-        ).first()
-        
-        if existing:
-            # Update existing opportunity
-            for key, value in opp_data.items():
-                setattr(existing, key, value)
-            updated_count += 1
-        else:
-            # Create new opportunity
-            new_opp = OpportunityCreate(**opp_data)
-            db_opp = Opportunity(**new_opp.dict())
-            db.add(db_opp)
-            new_count += 1
-    
-    db.commit()
-    
-    return {
-        "message": "Sync completed",
-        "new_opportunities": new_count,
-        "updated_opportunities": updated_count
-    }
 
-@router.get("/opportunities/{opportunity_id}/matching-businesses")
+@router.get(
+    "/opportunities/{opportunity_id}/matching-businesses",
+    response_model=BusinessMatchPage
+)
 async def get_matching_businesses(
     opportunity_id: int,
-    db: Session = Depends(get_db),
-    min_score: float = Query(default=0.6, ge=0, le=1)
+    db: AsyncSession = Depends(get_async_db),
+    min_score: float = Query(default=0.6, ge=0, le=1),
+    limit: int = Query(default=25, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False
 ):
     """
     Get businesses that match with a specific opportunity
+    Returns the best `limit` matches and a next_cursor for the following
+    page; with stream=true every match after the cursor is sent as NDJSON
     """
-    opportunity = db.query(Opportunity).filter(Opportunity.id == opportunity_id).first()
+    opportunity = await db.get(Opportunity, opportunity_id)
     if not opportunity:
         raise HTTPException(status_code=404, detail="Opportunity not found")
     
+    after = parse_match_cursor(cursor)
+    page_size = None if stream else limit + 1
+    
     matching_service = MatchingService(db)
-    matches = matching_service.find_businesses_for_opportunity(
-        opportunity=opportunity,
-        min_score=min_score
-    )
+    if min_score >= settings.MATCH_STORE_MIN_SCORE:
+        matches = matching_service.get_stored_businesses(
+            opportunity_id=opportunity.id,
+            min_score=min_score,
+            limit=page_size,
+            after=after
+        )
+    else:
+        matches = iterate(await matching_service.find_businesses_for_opportunity(
+            opportunity=opportunity,
+            min_score=min_score,
+            limit=page_size,
+            after=after
+        ))
     
-    return matches
+    if stream:
+        return ndjson_response(
+            BusinessMatch.model_validate(match, from_attributes=True)
+            async for match in matches
+        )
+    return await match_page(matches, limit, lambda match: match['business'].id)
+
+@router.get(
+    "/opportunities/{opportunity_id}/nearby-businesses",
+    response_model=List[NearbyBusiness]
+)
+async def get_nearby_businesses(
+    opportunity_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    radius_miles: float = Query(default=100.0, gt=0, le=1000),
+    limit: int = Query(default=100, ge=1, le=1000)
+):
+    """
+    Get the businesses within `radius_miles` of an opportunity's place of
+    performance, nearest first
+    """
+    opportunity = await db.get(Opportunity, opportunity_id)
+    if not opportunity:
+        raise HTTPException(status_code=404, detail="Opportunity not found")
+
+    latitude, longitude = coordinates_of(opportunity.location)
+    if math.isnan(latitude):
+        raise HTTPException(
+            status_code=400,
+            detail="Opportunity place of performance has no coordinates"
+        )
+    return await MatchingService(db).find_nearby_businesses(
+        latitude, longitude, radius_miles, limit
+    )
@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def parse_match_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """
+    Turn a match-page cursor back into its (score, id) key
+    """
+    if not cursor:
+        return None
+    try:
+        score, match_id = decode_cursor(cursor, 2)
+        return float(score), int(match_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_deadline_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], int]]:
+    """
+    Turn an opportunity-list cursor back into its (response_deadline, id) key
+    """
+    if not cursor:
+        return None
+    try:
+        deadline, opportunity_id = decode_cursor(cursor, 2)
+        return (
+            datetime.fromisoformat(deadline) if deadline is not None else None,
+            int(opportunity_id)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def iterate(items: Iterable) -> AsyncIterator:
+    """
+    Wrap an in-memory result so it pages and streams like a database cursor
+    """
+    for item in items:
+        yield item
+
+
+async def match_page(
+    matches: AsyncIterable[Dict],
+    limit: int,
+    id_of: Callable[[Dict], int]
+) -> Dict:
+    """
+    Build a page from up to limit + 1 best-first matches; the extra match,
+    if present, only signals that a next page exists
+    """
+    items: List[Dict] = [match async for match in matches]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last['score'], id_of(last))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def ndjson_response(items: AsyncIterable[BaseModel]) -> StreamingResponse:
+    """
+    Stream models as newline-delimited JSON, one object per line
+    """
+    return StreamingResponse(
+        (item.model_dump_json() + "\n" async for item in items),
+        media_type="application/x-ndjson"
+    )
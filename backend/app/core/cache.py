@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+import redis.asyncio as redis
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def cache_key(namespace: str, arguments: Dict[str, Any]) -> str:
+    """
+    Build a stable key from the call arguments
+
+    Arguments are serialized with sorted keys (datetimes and other
+    non-JSON values by their string form) and hashed, so equivalent calls
+    hit the same entry however they were spelled.
+    """
+    canonical = json.dumps(
+        arguments, sort_keys=True, separators=(",", ":"), default=str
+    )
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f"{settings.CACHE_KEY_PREFIX}:{namespace}:{digest}"
+
+
+class ResponseCache:
+    """
+    Two-level cache for upstream API responses
+
+    A small in-process LRU sits in front of Redis, so repeat lookups in the
+    same worker skip the network hop entirely. Entries are fresh for their
+    endpoint's TTL and may then be served stale for CACHE_STALE_SECONDS
+    while a single background task refreshes them. If Redis is unreachable
+    the cache keeps working from the local LRU alone.
+    """
+
+    def __init__(self, max_local_entries: Optional[int] = None):
+        if max_local_entries is None:
+            max_local_entries = settings.CACHE_LOCAL_MAX_ENTRIES
+        self.max_local_entries = max_local_entries
+        self._local: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._redis: Optional[redis.Redis] = None
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "redis_errors": 0,
+        }
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                socket_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+                socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+            )
+        return self._redis
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def stats(self) -> Dict:
+        return {**self.counters, "local_entries": len(self._local)}
+
+    def cached(self, namespace: str) -> Callable:
+        """
+        Decorate an async service method so its JSON result is cached under
+        `namespace`, using the TTL configured in CACHE_TTL_SECONDS
+        """
+        def decorator(fn):
+            signature = inspect.signature(fn)
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                ttl = settings.CACHE_TTL_SECONDS.get(namespace)
+                if not settings.CACHE_ENABLED or not ttl:
+                    return await fn(*args, **kwargs)
+
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                arguments.pop("self", None)
+                key = cache_key(namespace, arguments)
+                return await self.get_or_fetch(
+                    key, lambda: fn(*args, **kwargs), ttl
+                )
+            return wrapper
+        return decorator
+
+    async def get_or_fetch(self, key: str, fetch: Callable, ttl: float) -> Any:
+        """
+        Return the cached value for `key`, calling `fetch` on a miss and
+        refreshing in the background when the entry is stale
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            self.counters["local_hits"] += 1
+        else:
+            entry = await self._get_redis(key)
+            if entry is not None:
+                self.counters["redis_hits"] += 1
+                self._set_local(key, entry)
+
+        if entry is not None:
+            value, fresh_until, _ = entry
+            if time.time() >= fresh_until:
+                self.counters["stale_hits"] += 1
+                self._schedule_refresh(key, fetch, ttl)
+            return value
+
+        self.counters["misses"] += 1
+        value = await fetch()
+        await self._store(key, value, ttl)
+        return value
+
+    def _get_local(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if time.time() >= entry[2]:
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _set_local(self, key: str, entry: Tuple[Any, float, float]) -> None:
+        self._local[key] = entry
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    async def _get_redis(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        try:
+            raw = await self.redis.get(key)
+        except redis.RedisError as e:
+            self.counters["redis_errors"] += 1
+            logger.warning("cache read failed for %s: %s", key, e)
+            return None
+        if raw is None:
+            return None
+        payload = json.loads(raw)
+        return payload["value"], payload["fresh_until"], payload["expires_at"]
+
+    async def _store(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        stale_for = settings.CACHE_STALE_SECONDS
+        entry = (value, now + ttl, now + ttl + stale_for)
+        self._set_local(key, entry)
+        payload = json.dumps(
+            {"value": value, "fresh_until": entry[1], "expires_at": entry[2]},
+            default=str
+        )
+        try:
+            await self.redis.set(key, payload, ex=int(ttl + stale_for))
+        except redis.RedisError as e:
+            self.counters["redis_errors"] += 1
+            logger.warning("cache write failed for %s: %s", key, e)
+
+    def _schedule_refresh(self, key: str, fetch: Callable, ttl: float) -> None:
+        # One refresh per key at a time, however many readers saw it stale
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                value = await fetch()
+                await self._store(key, value, ttl)
+                self.counters["refreshes"] += 1
+            except Exception as e:
+                logger.warning("background refresh failed for %s: %s", key, e)
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+response_cache = ResponseCache()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, List
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Sam Shortlist"
@@ -12,6 +13,13 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = "samshortlist"
     SQLALCHEMY_DATABASE_URI: str = ""
+    DB_MAX_CONNECTIONS: int = 90  # across all worker processes; keep below Postgres max_connections
+    WEB_CONCURRENCY: int = 1  # uvicorn/gunicorn worker processes sharing DB_MAX_CONNECTIONS
+    DB_ASYNC_POOL_SHARE: float = 0.75  # part of a process's connections for API requests; the rest serve jobs
+    DB_POOL_CORE_FRACTION: float = 0.5  # part of each pool kept open; the rest is overflow
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_WAIT_SAMPLES: int = 2048  # recent checkout waits kept for percentiles
     
     # Redis
     REDIS_HOST: str = "localhost"
@@ -23,6 +31,138 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     TWILIO_ACCOUNT_SID: str = ""
     TWILIO_AUTH_TOKEN: str = ""
+    TWILIO_PHONE_NUMBER: str = ""
+    SAM_OPPORTUNITIES_URL: str = "https://api.sam.gov/opportunities/v2/search"
+    SAM_PAGE_SIZE: int = 1000  # largest page the search API allows
+    SAM_MAX_CONCURRENCY: int = 4
+    SAM_STREAM_BUFFER: int = 2000  # parsed notices buffered between page workers and the consumer
+    
+    # Outbound HTTP
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_TIMEOUT_SECONDS: float = 30.0
+    HTTP_HOST_TIMEOUTS: Dict[str, float] = {"api.usaspending.gov": 60.0}
+    HTTP2_ENABLED: bool = False
+    
+    # Upstream rate limits, per API key ("rate" calls/second, bursts of "burst")
+    UPSTREAM_DEFAULT_RATE: float = 10.0
+    UPSTREAM_DEFAULT_BURST: int = 20
+    UPSTREAM_RATE_LIMITS: Dict[str, Dict[str, float]] = {
+        "api.sam.gov": {"rate": 4.0, "burst": 8},
+        "api.usaspending.gov": {"rate": 10.0, "burst": 20},
+    }
+    UPSTREAM_MAX_RETRIES: int = 5
+    UPSTREAM_BACKOFF_BASE_SECONDS: float = 0.5
+    UPSTREAM_BACKOFF_MAX_SECONDS: float = 30.0
+    UPSTREAM_MAX_RETRY_AFTER_SECONDS: float = 120.0  # longer waits (e.g. daily quota) fail instead
+    
+    # Email
+    SMTP_HOST: str = "smtp.gmail.com"
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = True
+    SMTP_USE_TLS: bool = False  # implicit TLS (port 465) instead of STARTTLS
+    MAIL_FROM: str = "notifications@samshortlist.com"
+    MAIL_WORKERS: int = 2  # each holds one SMTP connection
+    MAIL_BATCH_SIZE: int = 50  # queued messages a worker sends per wake-up
+    MAIL_MAX_MESSAGES_PER_CONNECTION: int = 100  # many providers cap messages per session
+    MAIL_CONNECTION_IDLE_SECONDS: float = 60.0
+    MAIL_TIMEOUT_SECONDS: float = 30.0
+    MAIL_MAX_RETRIES: int = 5
+    MAIL_BACKOFF_BASE_SECONDS: float = 1.0
+    MAIL_BACKOFF_MAX_SECONDS: float = 60.0
+    MAIL_SHUTDOWN_SECONDS: float = 10.0  # time queued mail gets to go out on shutdown
+    MAIL_LATENCY_SAMPLES: int = 2048  # recent queue-to-delivery times kept for percentiles
+    
+    # SMS
+    SMS_BACKEND: str = "twilio"  # or "memory" to keep messages locally instead of sending
+    SMS_WORKERS: int = 4  # also the size of the thread pool the blocking sends run on
+    SMS_QUEUE_SIZE: int = 10000  # messages waiting beyond this are rejected
+    SMS_RATE_PER_SECOND: float = 1.0  # Twilio sends one message per second per long code
+    SMS_BURST: int = 1
+    SMS_DEDUPE_SECONDS: int = 3600  # the same text to the same number goes out once per window
+    SMS_MAX_RETRIES: int = 5
+    SMS_BACKOFF_BASE_SECONDS: float = 1.0
+    SMS_BACKOFF_MAX_SECONDS: float = 60.0
+    SMS_SHUTDOWN_SECONDS: float = 10.0
+    
+    # Cache
+    CACHE_ENABLED: bool = True
+    CACHE_KEY_PREFIX: str = "samshortlist"
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    CACHE_REDIS_TIMEOUT_SECONDS: float = 0.5
+    CACHE_STALE_SECONDS: int = 3600  # how long an expired entry may still be served while it refreshes
+    CACHE_TTL_SECONDS: Dict[str, int] = {
+        "usaspending.search_awards": 6 * 3600,
+        "usaspending.recipient_profile": 24 * 3600,
+        "usaspending.award_spending_summary": 24 * 3600,
+        "usaspending.subaward_count": 12 * 3600,
+        "sam.entity_details": 24 * 3600,
+    }
+    
+    # Matching
+    MATCH_SNAPSHOT_REFRESH_SECONDS: int = 30
+    MATCH_SNAPSHOT_OVERLAP_SECONDS: int = 300  # re-read window for rows committed out of order
+    MATCH_STORE_MIN_SCORE: float = 0.4  # lowest score persisted in the matches table
+    # Share of the NAICS weight earned by the number of leading digits shared
+    # with a registered code (2 sector ... 6 exact national industry)
+    NAICS_LEVEL_CREDIT: Dict[int, float] = {2: 0.2, 3: 0.4, 4: 0.6, 5: 0.8, 6: 1.0}
+    # Location credit halves every half-life and ends at the radius; places
+    # without coordinates fall back to comparing states
+    MATCH_LOCATION_RADIUS_MILES: float = 150.0
+    MATCH_LOCATION_HALF_LIFE_MILES: float = 50.0
+    GEO_GRID_CELL_MILES: float = 50.0  # cell size of the spatial index behind radius queries
+    TEXT_INDEX_FEATURES: int = 2 ** 18  # hashed term space of the capability/description index
+    TEXT_INDEX_PATH: str = ""  # prebuilt index (scripts/build_text_index.py) loaded at startup, if set
+    # Score components. Capability text is only scored with MATCH_TEXT_ENABLED,
+    # and MATCH_TEXT_WEIGHTS then apply instead; under them an exact NAICS
+    # match in the same state scores 0.55 before its text, below the 0.6
+    # the match endpoints and NEW_MATCH_MIN_SCORE default to
+    MATCH_TEXT_ENABLED: bool = False
+    MATCH_WEIGHTS: Dict[str, float] = {
+        "naics_match": 0.4,
+        "location_match": 0.2,
+        "size_match": 0.2,
+        "past_performance": 0.2,
+    }
+    MATCH_TEXT_WEIGHTS: Dict[str, float] = {
+        "naics_match": 0.35,
+        "location_match": 0.2,
+        "size_match": 0.15,
+        "past_performance": 0.15,
+        "text_match": 0.15,
+    }
+    
+    # Sync
+    SYNC_BATCH_SIZE: int = 500
+    SYNC_SCHEDULE_ENABLED: bool = True
+    SYNC_INTERVAL_MINUTES: int = 60
+    SYNC_INITIAL_DAYS_BACK: int = 7  # window of the first sync, before any watermark exists
+    SYNC_REVISIT_DAYS: int = 7  # posted days every sync re-reads, to pick up amended notices
+    SYNC_BACKFILL_WINDOW_DAYS: int = 7
+    
+    # Award archive loading
+    AWARD_LOAD_WORKERS: int = 4
+    AWARD_LOAD_CHUNK_ROWS: int = 50000
+    
+    # Deadline reminders
+    REMINDERS_ENABLED: bool = True
+    REMINDER_LEAD_HOURS: List[int] = [72, 24]  # digests go out this long before each deadline
+    REMINDER_MIN_SCORE: float = 0.6  # stored matches below this get no reminders
+    REMINDER_COALESCE_SECONDS: int = 300  # reminders due this close together share a digest
+    
+    # New match notifications
+    NEW_MATCHES_ENABLED: bool = True
+    NEW_MATCH_MIN_SCORE: float = 0.6  # not below MATCH_STORE_MIN_SCORE; read from stored matches
+    NEW_MATCH_DIGEST_LIMIT: int = 10  # notices listed per digest, best first
+    
+    # Background jobs
+    JOB_WORKERS: int = 2
+    JOB_HISTORY_SIZE: int = 1000
+    JOB_HEARTBEAT_SECONDS: int = 5  # how often unfinished jobs are written to the jobs table
+    JOB_RETENTION_DAYS: int = 7
     
     # JWT
     SECRET_KEY: str = ""
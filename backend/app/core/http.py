@@ -0,0 +1,75 @@
+from typing import Dict, Optional
+import httpx
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+class HTTPClientManager:
+    """
+    Owns the application-lifetime httpx.AsyncClient shared by the upstream
+    API services, so calls reuse pooled keep-alive connections instead of
+    paying DNS, TCP and TLS setup every time
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests_sent = 0
+        self.connections_opened = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        The shared client, created on first use outside the app lifecycle
+        (e.g. in scripts)
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = self._create_client()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict:
+        reused = max(self.requests_sent - self.connections_opened, 0)
+        return {
+            "requests_sent": self.requests_sent,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_ratio": (
+                reused / self.requests_sent if self.requests_sent else 0.0
+            ),
+            "http2": settings.HTTP2_ENABLED,
+        }
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=settings.HTTP2_ENABLED,
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.requests_sent += 1
+        host_timeout = settings.HTTP_HOST_TIMEOUTS.get(request.url.host)
+        if host_timeout is not None:
+            request.extensions["timeout"] = httpx.Timeout(host_timeout).as_dict()
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict) -> None:
+        # Fires only when the pool had no idle connection to hand out
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+
+http_client = HTTPClientManager()
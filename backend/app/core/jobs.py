@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import get_settings
+from app.db.locks import try_advisory_xact_lock
+from app.db.session import AsyncSessionLocal
+from app.models.job import JobRecord
+from app.models.sync_state import SyncState
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+# sync_states source prefix recording when each scheduled job last ran
+SCHEDULE_SOURCE = "jobs/schedule"
+
+
+class Job:
+    """
+    One queued unit of background work and its progress
+    """
+
+    def __init__(self, handler: JobHandler, params: Dict):
+        self.id = uuid.uuid4().hex
+        self.kind = handler.__name__
+        self.handler = handler
+        self.params = params
+        self.status = "queued"
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+class JobQueue:
+    """
+    Asyncio job queue drained by a fixed pool of workers in each process
+
+    Handlers are coroutines called as handler(job, **params); they report
+    progress by updating job.progress and their return value becomes
+    job.result. A job runs in the process that queued it, but its state is
+    written to the jobs table when it is queued, starts and finishes, and
+    every JOB_HEARTBEAT_SECONDS while it is unfinished, so any API worker
+    process can report on it. Only the most recent JOB_HISTORY_SIZE jobs
+    are kept in memory and finished ones are deleted from the table after
+    JOB_RETENTION_DAYS.
+    """
+
+    def __init__(self, workers: Optional[int] = None, history: Optional[int] = None):
+        self.worker_count = workers or settings.JOB_WORKERS
+        self.history = history or settings.JOB_HISTORY_SIZE
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker())
+                for _ in range(self.worker_count)
+            ]
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs still queued will not run in this process; record them as
+        # failed rather than leave them queued in the jobs table
+        for job in [job for job in self._jobs.values() if not job.done]:
+            self._interrupt(job)
+            await self._save(job)
+
+    async def enqueue(self, handler: JobHandler, **params) -> Job:
+        """
+        Queue handler(job, **params) and return the job once it is recorded
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        job = Job(handler, params)
+        self._jobs[job.id] = job
+        self._trim()
+        await self._save(job)
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        A job queued by this process
+        """
+        return self._jobs.get(job_id)
+
+    async def lookup(self, job_id: str) -> Optional[Union[Job, JobRecord]]:
+        """
+        A job queued by any process: this process's own copy if it has one,
+        otherwise the last state recorded in the jobs table
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        async with AsyncSessionLocal() as db:
+            return await db.get(JobRecord, job_id)
+
+    def pending(self, handler: JobHandler) -> Optional[Job]:
+        """
+        The queued or running job of this kind in this process, if any
+        """
+        for job in reversed(self._jobs.values()):
+            if job.handler is handler and not job.done:
+                return job
+        return None
+
+    def schedule(self, handler: JobHandler, interval: float, **params) -> None:
+        """
+        Enqueue handler every `interval` seconds across all API worker
+        processes, skipping a tick while a previous run is still queued or
+        running in any of them
+        """
+        async def tick():
+            while True:
+                try:
+                    if self.pending(handler) is None and await self._claim(handler, interval):
+                        await self.enqueue(handler, **params)
+                except Exception:
+                    logger.exception("could not schedule %s", handler.__name__)
+                await asyncio.sleep(interval)
+
+        self._tasks.append(asyncio.create_task(tick()))
+
+    async def _claim(self, handler: JobHandler, interval: float) -> bool:
+        # Every process ticks; the one holding the advisory lock that finds
+        # no recent run and no live unfinished job records the run and
+        # queues it, and the others see that record and skip
+        source = f"{SCHEDULE_SOURCE}/{handler.__name__}"
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            if not await try_advisory_xact_lock(db, source):
+                return False
+            state = await db.get(SyncState, source)
+            # A little slack, so processes whose ticks drift apart still
+            # run once per interval
+            if state and state.watermark and now - state.watermark < timedelta(seconds=interval * 0.9):
+                return False
+            alive = await db.scalar(
+                select(JobRecord.id).where(
+                    JobRecord.kind == handler.__name__,
+                    JobRecord.status.in_(("queued", "running")),
+                    JobRecord.updated_at >= now - timedelta(seconds=settings.JOB_HEARTBEAT_SECONDS * 3)
+                ).limit(1)
+            )
+            if alive is not None:
+                return False
+            if state is None:
+                state = SyncState(source=source)
+                db.add(state)
+            state.watermark = now
+            await db.commit()
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            await self._save(job)
+            try:
+                job.result = await job.handler(job, **job.params)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                # Shutting down; CancelledError is not an Exception, so the
+                # job would otherwise be saved as running forever
+                logger.warning("job %s (%s) interrupted by shutdown", job.id, job.kind)
+                self._interrupt(job)
+                raise
+            except Exception as e:
+                logger.exception("job %s (%s) failed", job.id, job.kind)
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = datetime.utcnow()
+                await self._save(job)
+                self._queue.task_done()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            for job in [job for job in self._jobs.values() if not job.done]:
+                await self._save(job)
+
+    async def _save(self, job: Job) -> None:
+        # Recording is best effort; a job never fails because of it
+        now = datetime.utcnow()
+        values = {
+            "kind": job.kind,
+            "status": job.status,
+            "progress": jsonable_encoder(job.progress),
+            "result": jsonable_encoder(job.result),
+            "error": job.error,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "updated_at": now,
+        }
+        stmt = pg_insert(JobRecord).values(id=job.id, created_at=job.created_at, **values)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt.on_conflict_do_update(
+                    index_elements=[JobRecord.id], set_=values
+                ))
+                if job.done:
+                    await db.execute(delete(JobRecord).where(
+                        JobRecord.finished_at < now - timedelta(days=settings.JOB_RETENTION_DAYS)
+                    ))
+                await db.commit()
+        except Exception:
+            logger.exception("could not record job %s (%s)", job.id, job.kind)
+
+    def _interrupt(self, job: Job) -> None:
+        job.status = "failed"
+        job.error = "interrupted by shutdown"
+        job.finished_at = datetime.utcnow()
+
+    def _trim(self) -> None:
+        # Drop the oldest finished jobs first; unfinished ones are never lost
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [job.id for job in self._jobs.values() if job.done][:excess]:
+            del self._jobs[job_id]
+
+
+job_queue = JobQueue()
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+import aiosmtplib
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Errors after which the same message may well go through on a new connection
+TRANSIENT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    OSError,
+)
+
+
+class OutgoingEmail:
+    """
+    One queued message and its delivery state
+    """
+    __slots__ = ("message", "attempts", "queued_at", "result")
+
+    def __init__(self, message: EmailMessage, result: asyncio.Future):
+        self.message = message
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self.result = result
+
+
+class _Connection:
+    """
+    A worker's SMTP connection, kept open between batches
+    """
+
+    def __init__(self):
+        self.smtp: Optional[aiosmtplib.SMTP] = None
+        self.sent = 0
+        self.last_used = 0.0
+
+    @property
+    def usable(self) -> bool:
+        return (
+            self.smtp is not None
+            and self.smtp.is_connected
+            and self.sent < settings.MAIL_MAX_MESSAGES_PER_CONNECTION
+            and time.monotonic() - self.last_used < settings.MAIL_CONNECTION_IDLE_SECONDS
+        )
+
+    async def close(self) -> None:
+        smtp, self.smtp = self.smtp, None
+        if smtp is None or not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            smtp.close()
+
+
+class MailQueue:
+    """
+    Outbound email: an asyncio queue drained by MAIL_WORKERS workers
+
+    Each worker keeps one SMTP connection open and takes up to
+    MAIL_BATCH_SIZE queued messages at a time, so the connect, STARTTLS and
+    login are paid once per connection rather than once per message. A
+    connection is replaced after MAIL_MAX_MESSAGES_PER_CONNECTION messages,
+    after MAIL_CONNECTION_IDLE_SECONDS unused, or when the server drops it.
+    Messages that fail on a dropped connection or a 4xx reply are retried
+    with jittered exponential backoff up to MAIL_MAX_RETRIES times. Messages
+    refused with a 5xx reply fail at once.
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: Optional[int] = None):
+        self.worker_count = workers or settings.MAIL_WORKERS
+        self.batch_size = batch_size or settings.MAIL_BATCH_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._connections: List[_Connection] = []
+        # Emails waiting out a retry backoff, and the timers that requeue them
+        self._retries: Dict[OutgoingEmail, asyncio.TimerHandle] = {}
+        self._latencies = deque(maxlen=settings.MAIL_LATENCY_SAMPLES)
+        self.counters = {
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "batches": 0,
+            "connections_opened": 0,
+            "connection_errors": 0,
+        }
+
+    async def start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._tasks:
+            self._connections = [_Connection() for _ in range(self.worker_count)]
+            self._tasks = [
+                asyncio.create_task(self._worker(connection))
+                for connection in self._connections
+            ]
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Give queued messages, and those waiting out a retry backoff that ends
+        in time, up to `timeout` seconds (MAIL_SHUTDOWN_SECONDS) to go out,
+        then stop the workers and close their connections
+        """
+        if timeout is None:
+            timeout = settings.MAIL_SHUTDOWN_SECONDS
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        if self._queue is not None and self._tasks:
+            try:
+                while True:
+                    await asyncio.wait_for(self._queue.join(), max(deadline - loop.time(), 0))
+                    # A retry due before the deadline puts its message back
+                    # in the queue; later ones are given up on below
+                    due = [
+                        handle.when() for handle in self._retries.values()
+                        if handle.when() <= deadline
+                    ]
+                    if not due:
+                        break
+                    await asyncio.sleep(max(min(due) - loop.time(), 0))
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "mail queue closed with %d messages unsent",
+                    self._queue.qsize() + len(self._retries)
+                )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for connection in self._connections:
+            await connection.close()
+        # Retries not yet due are given up on rather than left to requeue
+        # onto a closed queue
+        retries, self._retries = self._retries, {}
+        for email, handle in retries.items():
+            handle.cancel()
+            self._finish(email, False)
+        while self._queue is not None and not self._queue.empty():
+            self._finish(self._queue.get_nowait(), False)
+
+    def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        html: str,
+        from_email: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        Queue a message and return immediately
+        Returns a future resolving to whether the message was delivered
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        message = EmailMessage()
+        message['From'] = from_email or settings.MAIL_FROM
+        message['To'] = to_email
+        message['Subject'] = subject
+        message.set_content(html, subtype='html')
+
+        email = OutgoingEmail(message, asyncio.get_running_loop().create_future())
+        self.counters["queued"] += 1
+        self._queue.put_nowait(email)
+        return email.result
+
+    async def send(self, to_email: str, subject: str, html: str) -> bool:
+        """
+        Queue a message and wait until it is delivered or given up on
+        """
+        return await self.enqueue(to_email, subject, html)
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 1)
+
+        opened = self.counters["connections_opened"]
+        return {
+            **self.counters,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "retrying": len(self._retries),
+            "open_connections": sum(
+                1 for connection in self._connections
+                if connection.smtp is not None and connection.smtp.is_connected
+            ),
+            "messages_per_connection": (
+                round(self.counters["sent"] / opened, 2) if opened else 0.0
+            ),
+            "delivery_latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "samples": len(latencies),
+            },
+        }
+
+    async def _worker(self, connection: _Connection) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.counters["batches"] += 1
+            try:
+                await self._deliver(connection, batch)
+            except Exception:
+                logger.exception("mail worker failed on a batch of %d", len(batch))
+                for email in batch:
+                    self._finish(email, False)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _deliver(self, connection: _Connection, batch: List[OutgoingEmail]) -> None:
+        for position, email in enumerate(batch):
+            if email.result.done():
+                continue
+            try:
+                smtp = await self._connect(connection)
+            except (aiosmtplib.SMTPException, OSError) as e:
+                # Nothing in the batch can go out on this connection, so the
+                # rest backs off too instead of reconnecting once per message
+                for pending in batch[position:]:
+                    self._failed(pending, e)
+                return
+            try:
+                await smtp.send_message(email.message)
+            except TRANSIENT_ERRORS as e:
+                await connection.close()
+                self._failed(email, e)
+                continue
+            except aiosmtplib.SMTPException as e:
+                self._failed(email, e)
+                continue
+            connection.sent += 1
+            connection.last_used = time.monotonic()
+            self._finish(email, True)
+
+    def _failed(self, email: OutgoingEmail, error: Exception) -> None:
+        # Dropped connections and 4xx replies are temporary; 5xx replies,
+        # including refused recipients and failed logins, are permanent
+        if email.result.done():
+            return
+        code = getattr(error, "code", None)
+        if isinstance(error, TRANSIENT_ERRORS) or (code is not None and 400 <= code < 500):
+            self._retry(email, error)
+        else:
+            logger.warning("email to %s refused: %s", email.message['To'], error)
+            self._finish(email, False)
+
+    async def _connect(self, connection: _Connection) -> aiosmtplib.SMTP:
+        if connection.usable:
+            return connection.smtp
+        await connection.close()
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            use_tls=settings.SMTP_USE_TLS,
+            start_tls=settings.SMTP_STARTTLS,
+            timeout=settings.MAIL_TIMEOUT_SECONDS,
+        )
+        try:
+            await smtp.connect()
+            if settings.SMTP_USERNAME:
+                await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        except BaseException:
+            self.counters["connection_errors"] += 1
+            smtp.close()
+            raise
+        self.counters["connections_opened"] += 1
+        connection.smtp = smtp
+        connection.sent = 0
+        connection.last_used = time.monotonic()
+        return smtp
+
+    def _retry(self, email: OutgoingEmail, error: Exception) -> None:
+        email.attempts += 1
+        if email.attempts > settings.MAIL_MAX_RETRIES:
+            logger.warning(
+                "giving up on email to %s after %d attempts: %s",
+                email.message['To'], email.attempts, error
+            )
+            self._finish(email, False)
+            return
+        self.counters["retries"] += 1
+        self._retries[email] = asyncio.get_running_loop().call_later(
+            self._backoff(email.attempts - 1), self._requeue, email
+        )
+
+    def _requeue(self, email: OutgoingEmail) -> None:
+        if self._retries.pop(email, None) is not None:
+            self._queue.put_nowait(email)
+
+    def _finish(self, email: OutgoingEmail, delivered: bool) -> None:
+        if email.result.done():
+            return
+        if delivered:
+            self.counters["sent"] += 1
+            self._latencies.append(time.monotonic() - email.queued_at)
+        else:
+            self.counters["failed"] += 1
+        email.result.set_result(delivered)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter, as for upstream API retries
+        ceiling = min(
+            settings.MAIL_BACKOFF_MAX_SECONDS,
+            settings.MAIL_BACKOFF_BASE_SECONDS * 2 ** attempt
+        )
+        return random.uniform(0, ceiling)
+
+
+mail_queue = MailQueue()
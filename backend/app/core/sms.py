@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from app.core.config import get_settings
+from app.core.upstream import TokenBucket
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class SMSSender:
+    """
+    Delivers one text message; send() is blocking and runs on the SMS
+    queue's own threads
+    """
+
+    def send(self, to_number: str, body: str) -> None:
+        raise NotImplementedError
+
+    def is_transient(self, error: Exception) -> bool:
+        """
+        Whether a failed send may succeed if retried
+        """
+        return isinstance(error, OSError)
+
+
+class TwilioSender(SMSSender):
+    """
+    Sends through the Twilio REST API from TWILIO_PHONE_NUMBER
+    """
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first send, so importing the app needs no credentials
+        if self._client is None:
+            from twilio.rest import Client
+            self._client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        return self._client
+
+    def send(self, to_number: str, body: str) -> None:
+        self.client.messages.create(
+            body=body,
+            from_=settings.TWILIO_PHONE_NUMBER,
+            to=to_number
+        )
+
+    def is_transient(self, error: Exception) -> bool:
+        # Twilio answers 429 when over the account's rate and 5xx when it is
+        # unavailable; other errors (e.g. an invalid number) won't change
+        status = getattr(error, "status", None)
+        if status is not None:
+            return status == 429 or status >= 500
+        return super().is_transient(error)
+
+
+class MemorySender(SMSSender):
+    """
+    Local stand-in that keeps messages in memory instead of sending them,
+    for development and tests
+    """
+
+    def __init__(self):
+        self.sent: List[Tuple[str, str]] = []
+
+    def send(self, to_number: str, body: str) -> None:
+        self.sent.append((to_number, body))
+
+
+SENDERS = {
+    "twilio": TwilioSender,
+    "memory": MemorySender,
+}
+
+
+class OutgoingSMS:
+    """
+    One queued text message and its delivery state
+    """
+    __slots__ = ("to_number", "body", "key", "attempts", "queued_at", "result")
+
+    def __init__(self, to_number: str, body: str, key: str, result: asyncio.Future):
+        self.to_number = to_number
+        self.body = body
+        self.key = key
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self.result = result
+
+
+class SMSQueue:
+    """
+    Outbound SMS: a bounded asyncio queue drained by SMS_WORKERS workers
+
+    The blocking provider calls run on a thread pool of the same size, so a
+    burst of notifications never holds up the event loop or the default
+    executor the database work shares. Sends are paced by a token bucket at
+    the provider's rate (SMS_RATE_PER_SECOND), and the same text to the same
+    number within SMS_DEDUPE_SECONDS is only sent once. Transient failures
+    are retried with jittered exponential backoff up to SMS_MAX_RETRIES
+    times. When SMS_QUEUE_SIZE messages are waiting, new ones are rejected
+    rather than buffered without bound.
+    """
+
+    def __init__(self, sender: Optional[SMSSender] = None, workers: Optional[int] = None):
+        self.sender = sender or SENDERS[settings.SMS_BACKEND]()
+        self.worker_count = workers or settings.SMS_WORKERS
+        self._bucket: Optional[TokenBucket] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks: Set[asyncio.Task] = set()
+        # Dedupe key -> (time first queued, delivery future)
+        self._recent: Dict[str, Tuple[float, asyncio.Future]] = {}
+        self._retrying = 0
+        self.counters = {
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "throttle_wait_seconds": 0.0,
+        }
+
+    async def start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.SMS_QUEUE_SIZE)
+        if not self._tasks:
+            # Made here rather than at import, so its lock belongs to the
+            # running loop
+            self._bucket = TokenBucket(settings.SMS_RATE_PER_SECOND, settings.SMS_BURST)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.worker_count, thread_name_prefix="sms"
+            )
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+            ]
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Give queued messages up to `timeout` seconds (SMS_SHUTDOWN_SECONDS)
+        to go out, then stop the workers
+        """
+        if timeout is None:
+            timeout = settings.SMS_SHUTDOWN_SECONDS
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("SMS queue closed with %d messages unsent", self._queue.qsize())
+        tasks = self._tasks + list(self._retry_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        while self._queue is not None and not self._queue.empty():
+            self._finish(self._queue.get_nowait(), False)
+
+    def enqueue(self, to_number: str, body: str) -> asyncio.Future:
+        """
+        Queue a message and return immediately
+        Returns a future resolving to whether the message was delivered. A
+        duplicate of a recent message gets the original's future.
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.SMS_QUEUE_SIZE)
+        now = time.monotonic()
+        self._forget(now)
+        key = hashlib.sha1(f"{to_number}\n{body}".encode()).hexdigest()
+        recent = self._recent.get(key)
+        if recent is not None:
+            self.counters["deduplicated"] += 1
+            return recent[1]
+
+        sms = OutgoingSMS(to_number, body, key, asyncio.get_running_loop().create_future())
+        try:
+            self._queue.put_nowait(sms)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            logger.warning("SMS queue full; dropping message to %s", to_number)
+            sms.result.set_result(False)
+            return sms.result
+        self.counters["queued"] += 1
+        self._recent[key] = (now, sms.result)
+        return sms.result
+
+    async def send(self, to_number: str, body: str) -> bool:
+        """
+        Queue a message and wait until it is delivered or given up on
+        """
+        return await self.enqueue(to_number, body)
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "throttle_wait_seconds": round(self.counters["throttle_wait_seconds"], 3),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "retrying": self._retrying,
+            "dedupe_entries": len(self._recent),
+            "sender": type(self.sender).__name__,
+        }
+
+    def _forget(self, now: float) -> None:
+        # Entries are added in time order, so expired ones are at the front
+        horizon = now - settings.SMS_DEDUPE_SECONDS
+        while self._recent:
+            key = next(iter(self._recent))
+            if self._recent[key][0] >= horizon:
+                break
+            del self._recent[key]
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            sms = await self._queue.get()
+            try:
+                self.counters["throttle_wait_seconds"] += await self._bucket.acquire()
+                await loop.run_in_executor(
+                    self._executor, self.sender.send, sms.to_number, sms.body
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed(sms, e)
+            else:
+                self._finish(sms, True)
+            finally:
+                self._queue.task_done()
+
+    def _failed(self, sms: OutgoingSMS, error: Exception) -> None:
+        sms.attempts += 1
+        if not self.sender.is_transient(error) or sms.attempts > settings.SMS_MAX_RETRIES:
+            logger.warning(
+                "SMS to %s failed after %d attempts: %s", sms.to_number, sms.attempts, error
+            )
+            self._finish(sms, False)
+            return
+        self.counters["retries"] += 1
+        task = asyncio.create_task(self._requeue(sms, self._backoff(sms.attempts - 1)))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _requeue(self, sms: OutgoingSMS, delay: float) -> None:
+        # A retry waits for room rather than being rejected; it was already
+        # accepted once
+        self._retrying += 1
+        try:
+            await asyncio.sleep(delay)
+            await self._queue.put(sms)
+        except asyncio.CancelledError:
+            # Closed before the retry was due; its sender is told now
+            # rather than waiting forever
+            self._finish(sms, False)
+            raise
+        finally:
+            self._retrying -= 1
+
+    def _finish(self, sms: OutgoingSMS, delivered: bool) -> None:
+        if sms.result.done():
+            return
+        self.counters["sent" if delivered else "failed"] += 1
+        if not delivered:
+            # A failed message may be sent again
+            self._recent.pop(sms.key, None)
+        sms.result.set_result(delivered)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter, as for upstream API retries
+        ceiling = min(
+            settings.SMS_BACKOFF_MAX_SECONDS,
+            settings.SMS_BACKOFF_BASE_SECONDS * 2 ** attempt
+        )
+        return random.uniform(0, ceiling)
+
+
+sms_queue = SMSQueue()
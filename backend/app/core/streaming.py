@@ -0,0 +1,62 @@
+from typing import Any, AsyncIterator, Dict, Optional
+import ijson
+
+
+class _ChunkReader:
+    """
+    Adapts an async iterator of byte chunks to the async read() ijson expects
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._pending = b""
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson's parser buffers expect no more than `size` bytes per call
+        while not self._pending:
+            try:
+                self._pending = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                return b""
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+async def iter_json_items(
+    chunks: AsyncIterator[bytes],
+    item_prefix: str,
+    meta: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Any]:
+    """
+    Yield each value under `item_prefix` (e.g. "results.item") of a JSON
+    document as its bytes arrive, so only one item is held at a time
+
+    Scalars outside the items, such as a total count that precedes or
+    follows them, are collected into `meta` keyed by their ijson prefix
+    (e.g. "totalRecords" or "page_metadata.hasNext").
+    """
+    depth = 0
+    builder = None
+    async for prefix, event, value in ijson.parse_async(
+        _ChunkReader(chunks), use_float=True
+    ):
+        if builder is not None:
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+            builder.event(event, value)
+            if depth == 0:
+                yield builder.value
+                builder = None
+        elif prefix == item_prefix:
+            if event in ("start_map", "start_array"):
+                depth = 1
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif meta is not None and event in ("string", "number", "boolean", "null"):
+            meta[prefix] = value
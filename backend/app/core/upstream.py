@@ -0,0 +1,261 @@
+import asyncio
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional, Tuple
+import httpx
+from app.core.config import get_settings
+from app.core.http import http_client
+
+settings = get_settings()
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average with bursts of up to `burst`
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """
+        Wait for a token
+        Returns the number of seconds spent waiting
+        """
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Seconds requested by a Retry-After header, given as seconds or an HTTP date
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class UpstreamClient:
+    """
+    The single path by which the service classes call government APIs
+
+    Every call takes a token from the bucket of its (host, API key) pair,
+    so concurrent syncs share one quota. 429 and 5xx gateway responses and
+    transport errors are retried with jittered exponential backoff, and a
+    Retry-After header is honoured unless it asks for longer than
+    UPSTREAM_MAX_RETRY_AFTER_SECONDS (e.g. an exhausted daily quota), in
+    which case the response is returned for the caller to raise. Identical
+    in-flight read requests share one upstream call.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.counters = {
+            "requests": 0,
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "throttled": 0,
+            "throttle_wait_seconds": 0.0,
+            "rate_limited_responses": 0,
+            "retries": 0,
+            "gave_up": 0,
+        }
+
+    def stats(self) -> Dict:
+        return dict(self.counters)
+
+    def bucket(self, host: str, api_key: str) -> TokenBucket:
+        bucket = self._buckets.get((host, api_key))
+        if bucket is None:
+            limits = settings.UPSTREAM_RATE_LIMITS.get(host, {})
+            bucket = TokenBucket(
+                limits.get("rate", settings.UPSTREAM_DEFAULT_RATE),
+                int(limits.get("burst", settings.UPSTREAM_DEFAULT_BURST))
+            )
+            self._buckets[(host, api_key)] = bucket
+        return bucket
+
+    async def get(self, url: str, *, api_key: str = "", **kwargs) -> httpx.Response:
+        return await self.request("GET", url, api_key=api_key, coalesce=True, **kwargs)
+
+    async def post(self, url: str, *, api_key: str = "", **kwargs) -> httpx.Response:
+        return await self.request("POST", url, api_key=api_key, **kwargs)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        api_key: str = "",
+        params: Optional[Dict] = None,
+        json: Optional[Dict] = None,
+        headers: Optional[Dict] = None
+    ) -> AsyncIterator[httpx.Response]:
+        """
+        Like request(), but the body is left unread for the caller to
+        consume incrementally; streamed requests are never coalesced, and
+        only failures before the body starts are retried
+        """
+        self.counters["requests"] += 1
+        response = await self._send(
+            method, url, api_key, params, json, headers, stream=True
+        )
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        api_key: str = "",
+        coalesce: bool = False,
+        params: Optional[Dict] = None,
+        json: Optional[Dict] = None,
+        headers: Optional[Dict] = None
+    ) -> httpx.Response:
+        """
+        Send a request through the limiter and retry policy
+        With `coalesce`, concurrent identical requests share the response
+        """
+        self.counters["requests"] += 1
+        if not coalesce:
+            return await self._send(method, url, api_key, params, json, headers)
+
+        key = _request_key(method, url, params, json)
+        while key in self._in_flight:
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(self._in_flight[key])
+            except _LeaderCancelled:
+                # The caller making the upstream call went away; this one
+                # still wants the response, so it (or whichever follower
+                # resumes first) sends the request again
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await self._send(method, url, api_key, params, json, headers)
+        except asyncio.CancelledError:
+            # Cancelling the shared future would cancel every follower too
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a call nobody else joined doesn't warn
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            del self._in_flight[key]
+
+    async def _send(
+        self, method, url, api_key, params, json, headers, stream=False
+    ) -> httpx.Response:
+        bucket = self.bucket(httpx.URL(url).host, api_key)
+        attempt = 0
+        while True:
+            waited = await bucket.acquire()
+            if waited:
+                self.counters["throttled"] += 1
+                self.counters["throttle_wait_seconds"] += waited
+
+            self.counters["upstream_calls"] += 1
+            client = http_client.client
+            try:
+                response = await client.send(
+                    client.build_request(
+                        method, url, params=params, json=json, headers=headers
+                    ),
+                    stream=stream
+                )
+            except httpx.TransportError:
+                if attempt >= settings.UPSTREAM_MAX_RETRIES:
+                    self.counters["gave_up"] += 1
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if stream:
+                    await response.aclose()
+                if response.status_code == 429:
+                    self.counters["rate_limited_responses"] += 1
+                if attempt >= settings.UPSTREAM_MAX_RETRIES:
+                    self.counters["gave_up"] += 1
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                elif delay > settings.UPSTREAM_MAX_RETRY_AFTER_SECONDS:
+                    self.counters["gave_up"] += 1
+                    return response
+
+            attempt += 1
+            self.counters["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retrying workers from stampeding in lockstep
+        ceiling = min(
+            settings.UPSTREAM_BACKOFF_MAX_SECONDS,
+            settings.UPSTREAM_BACKOFF_BASE_SECONDS * 2 ** attempt
+        )
+        return random.uniform(0, ceiling)
+
+
+class _LeaderCancelled(Exception):
+    """
+    Set on a coalesced request's shared future when the caller that was
+    making the upstream call is cancelled
+    """
+
+
+def _request_key(method: str, url: str, params: Optional[Dict], body: Optional[Dict]) -> str:
+    return json.dumps(
+        [method, url, params or {}, body], sort_keys=True, default=str
+    )
+
+
+upstream = UpstreamClient()
@@ -0,0 +1,30 @@
+import zlib
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def advisory_key(name: str) -> int:
+    """
+    The PostgreSQL advisory lock key for a name, the same in every process
+    """
+    return zlib.crc32(name.encode())
+
+
+async def advisory_xact_lock(db: AsyncSession, name: str) -> None:
+    """
+    Wait for the transaction-level advisory lock `name`
+
+    Held until the session's transaction commits or rolls back, so work
+    done under it in one API worker process is never repeated by another.
+    """
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": advisory_key(name)})
+
+
+async def try_advisory_xact_lock(db: AsyncSession, name: str) -> bool:
+    """
+    Take the transaction-level advisory lock `name` if it is free
+    Returns whether it was taken
+    """
+    return bool(await db.scalar(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": advisory_key(name)}
+    ))
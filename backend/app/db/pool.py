@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+def pool_limits(share: float) -> Tuple[int, int]:
+    """
+    Split a share of this process's connection budget into a pool size and
+    an overflow allowance
+
+    DB_MAX_CONNECTIONS is the budget for the whole deployment, so each of
+    the WEB_CONCURRENCY worker processes gets an equal part of it.
+    """
+    per_process = settings.DB_MAX_CONNECTIONS // max(settings.WEB_CONCURRENCY, 1)
+    connections = max(int(per_process * share), 2)
+    pool_size = max(int(connections * settings.DB_POOL_CORE_FRACTION), 1)
+    return pool_size, connections - pool_size
+
+
+class PoolMonitor:
+    """
+    Checkout wait times, usage and connection ages for one engine's pool
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=settings.DB_POOL_WAIT_SAMPLES)
+        self._opened: Dict[int, float] = {}
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.max_wait = 0.0
+
+    def attach(self, engine: Engine) -> None:
+        self.pool = engine.pool
+        engine.pool.monitor = self
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "close", self._on_close)
+        event.listen(engine, "close_detached", self._on_close_detached)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+            self._opened[id(dbapi_connection)] = time.monotonic()
+
+    def _on_close(self, dbapi_connection, connection_record) -> None:
+        self._on_close_detached(dbapi_connection)
+
+    def _on_close_detached(self, dbapi_connection) -> None:
+        with self._lock:
+            self.closes += 1
+            self._opened.pop(id(dbapi_connection), None)
+
+    def record_checkout(self, waited: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self._waits.append(waited)
+            self.max_wait = max(self.max_wait, waited)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            waits = sorted(self._waits)
+            ages = [now - opened for opened in self._opened.values()]
+            counters = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "closes": self.closes,
+            }
+            max_wait = self.max_wait
+
+        def percentile(fraction: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(int(len(waits) * fraction), len(waits) - 1)] * 1000, 3)
+
+        pool = self.pool
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            **counters,
+            "checkout_wait_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(max_wait * 1000, 3),
+                "samples": len(waits),
+            },
+            "connection_age_seconds": {
+                "open": len(ages),
+                "mean": round(sum(ages) / len(ages), 1) if ages else 0.0,
+                "max": round(max(ages), 1) if ages else 0.0,
+            },
+        }
+
+
+class _InstrumentedPool:
+    """
+    Times every checkout, including waiting for a free connection and the
+    pre-ping, and reports it to the attached PoolMonitor
+    """
+    monitor = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.monitor is not None:
+                self.monitor.record_timeout()
+            raise
+        if self.monitor is not None:
+            self.monitor.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep reporting from it
+        pool = super().recreate()
+        pool.monitor = self.monitor
+        if self.monitor is not None:
+            self.monitor.pool = pool
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
@@ -1,20 +1,71 @@
+from typing import Dict
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
+from app.db.pool import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    PoolMonitor,
+    pool_limits,
+)
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI,
-    pool_pre_ping=True,
-    pool_size=32,
-    max_overflow=64
-)
+pool_monitors: Dict[str, PoolMonitor] = {}
+
+
+def make_engine(name: str, share: float, use_async: bool = False):
+    """
+    Create an engine whose pool takes `share` of this process's connection
+    budget, with its checkouts reported under `name`
+
+    Every engine in the app comes from here, so the pools of one process
+    together never exceed DB_MAX_CONNECTIONS / WEB_CONCURRENCY.
+    """
+    pool_size, max_overflow = pool_limits(share)
+    options = dict(
+        pool_pre_ping=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+    if use_async:
+        url = make_url(settings.SQLALCHEMY_DATABASE_URI).set(drivername="postgresql+asyncpg")
+        engine = create_async_engine(url, poolclass=InstrumentedAsyncQueuePool, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = create_engine(
+            settings.SQLALCHEMY_DATABASE_URI, poolclass=InstrumentedQueuePool, **options
+        )
+        sync_engine = engine
+
+    monitor = PoolMonitor(name)
+    monitor.attach(sync_engine)
+    pool_monitors[name] = monitor
+    return engine
+
+
+# Background jobs and scripts use the synchronous engine
+engine = make_engine("sync", 1 - settings.DB_ASYNC_POOL_SHARE)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# API endpoints use the asyncpg engine so queries don't block the event loop
+async_engine = make_engine("async", settings.DB_ASYNC_POOL_SHARE, use_async=True)
+# Objects stay readable after commit; response models read them afterwards
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
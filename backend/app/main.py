@@ -1,9 +1,16 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.endpoints import opportunities, businesses, auth
+from app.api.endpoints import opportunities, businesses, auth, metrics, jobs
+from app.core.cache import response_cache
 from app.core.config import get_settings
-from app.db.session import engine
+from app.core.http import http_client
+from app.core.jobs import job_queue
+from app.core.mail import mail_queue
+from app.core.sms import sms_queue
+from app.db.session import async_engine, engine
 from app.models import base
+from app.services import sync_service
+from app.services.reminder_service import reminder_scheduler
 
 settings = get_settings()
 
@@ -25,6 +32,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    await http_client.start()
+    await mail_queue.start()
+    await sms_queue.start()
+    await job_queue.start()
+    if settings.REMINDERS_ENABLED:
+        await reminder_scheduler.start()
+    if settings.SYNC_SCHEDULE_ENABLED:
+        job_queue.schedule(
+            sync_service.sync_opportunities,
+            settings.SYNC_INTERVAL_MINUTES * 60
+        )
+
+@app.on_event("shutdown")
+async def shutdown():
+    await reminder_scheduler.close()
+    await job_queue.close()
+    await mail_queue.close()
+    await sms_queue.close()
+    await http_client.close()
+    await response_cache.close()
+    await async_engine.dispose()
+
 # Include routers
 app.include_router(
     auth.router,
@@ -44,6 +75,18 @@ app.include_router(
     tags=["businesses"]
 )
 
+app.include_router(
+    jobs.router,
+    prefix="/api/v1",
+    tags=["jobs"]
+)
+
+app.include_router(
+    metrics.router,
+    prefix="/api/v1",
+    tags=["metrics"]
+)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Sam Shortlist API"}
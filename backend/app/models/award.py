@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class Award(Base):
+    __tablename__ = "awards"
+
+    id = Column(Integer, primary_key=True)
+    award_key = Column(String, unique=True, nullable=False)  # contract_award_unique_key
+    piid = Column(String)
+    recipient_uei = Column(String, index=True)
+    recipient_duns = Column(String)
+    recipient_name = Column(String)
+    naics_code = Column(String, index=True)
+    naics_description = Column(String)
+    awarding_agency = Column(String)
+    funding_agency = Column(String)
+    total_obligation = Column(Float)
+    award_value = Column(Float)  # current total value of award
+    start_date = Column(Date)
+    end_date = Column(Date)
+    place_of_performance_state = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Past-performance lookups read one recipient's awards, newest first
+    __table_args__ = (
+        Index('ix_awards_recipient_duns_start', 'recipient_duns', 'start_date'),
+    )
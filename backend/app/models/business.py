@@ -2,13 +2,14 @@ from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Tabl
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
+from .naics import NAICSCode
 
 # Association tables
 business_naics = Table(
     'business_naics',
     Base.metadata,
-    Column('business_id', Integer, ForeignKey('businesses.id')),
-    Column('naics_code', String)
+    Column('business_id', Integer, ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True),
+    Column('naics_code', String(6), ForeignKey('naics_codes.code'), primary_key=True, index=True)
 )
 
 class Business(Base):
@@ -22,9 +23,12 @@ class Business(Base):
     capabilities = Column(JSON)  # List of capability statements
     past_performance = Column(JSON)  # Historical contract performance data
     certifications = Column(JSON)  # Small business certifications
+    notification_preferences = Column(JSON)  # {email, sms, new_matches, deadline_reminders}
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    naics_codes = relationship("NAICSCode", secondary=business_naics)
+    # Loaded with a selectin query alongside the businesses, never one lazy
+    # load per business
+    naics_codes = relationship(NAICSCode, secondary=business_naics, lazy="selectin")
     opportunities = relationship("Opportunity", back_populates="business")
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, JSON, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class JobRecord(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)  # Job.id
+    kind = Column(String, nullable=False)  # handler name, e.g. sync_opportunities
+    status = Column(String, nullable=False)  # queued, running, succeeded, failed
+    progress = Column(JSON)
+    result = Column(JSON)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # last heartbeat of the owning process
+
+    # Scheduled runs look for a live unfinished job of their kind
+    __table_args__ = (
+        Index('ix_jobs_kind_status', 'kind', 'status'),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from datetime import datetime
+from .base import Base
+
+class Match(Base):
+    __tablename__ = "matches"
+
+    business_id = Column(Integer, ForeignKey('businesses.id', ondelete='CASCADE'), primary_key=True)
+    opportunity_id = Column(Integer, ForeignKey('opportunities.id', ondelete='CASCADE'), primary_key=True)
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    # Both matching endpoints read one side's matches ordered by score
+    __table_args__ = (
+        Index('ix_matches_business_score', 'business_id', 'score'),
+        Index('ix_matches_opportunity_score', 'opportunity_id', 'score'),
+    )
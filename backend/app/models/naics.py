@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from .base import Base
+
+class NAICSCode(Base):
+    __tablename__ = "naics_codes"
+
+    code = Column(String(6), primary_key=True)  # 2 to 6 digits
+    title = Column(String)
+    level = Column(Integer, nullable=False, index=True)  # number of digits: 2 sector ... 6 national industry
+    parent_code = Column(String(6), ForeignKey('naics_codes.code'))
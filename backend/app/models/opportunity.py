@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Float, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, Integer, String, JSON, DateTime, ForeignKey, Float, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from .base import Base
 
@@ -22,6 +23,27 @@ class Opportunity(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Kept current by PostgreSQL on every insert and update; deferred so
+    # ordinary reads don't load it
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True
+        )
+    ))
+
     # Relationships
     business_id = Column(Integer, ForeignKey('businesses.id'))
     business = relationship("Business", back_populates="opportunities")
+
+    # list_opportunities pages on (response_deadline, id) within its filters
+    __table_args__ = (
+        Index('ix_opportunities_deadline_id', 'response_deadline', 'id'),
+        Index('ix_opportunities_status_deadline_id', 'status', 'response_deadline', 'id'),
+        Index('ix_opportunities_naics_deadline_id', 'naics_code', 'response_deadline', 'id'),
+        Index('ix_opportunities_agency_deadline_id', 'agency', 'response_deadline', 'id'),
+        Index('ix_opportunities_status_value', 'status', 'contract_value'),
+        Index('ix_opportunities_search_vector', 'search_vector', postgresql_using='gin'),
+    )
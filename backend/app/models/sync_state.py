@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, JSON, DateTime
+from datetime import datetime
+from .base import Base
+
+class SyncState(Base):
+    __tablename__ = "sync_states"
+
+    source = Column(String, primary_key=True)  # e.g. sam.gov/opportunities
+    watermark = Column(DateTime)  # newest posted date pulled by a successful run
+    cursor = Column(JSON)  # checkpoint of an unfinished backfill
+    last_success_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict
 from datetime import datetime
 import re
@@ -13,14 +13,28 @@ def validate_duns(v: str) -> str:
         raise ValueError('DUNS number must be 9 digits')
     return v
 
+def validate_naics_codes(v: Optional[List]) -> Optional[List[str]]:
+    if v is None:
+        return v
+    # Business rows carry NAICSCode objects
+    codes = [getattr(code, 'code', code) for code in v]
+    for code in codes:
+        if not isinstance(code, str) or not re.match(r'^\d{2,6}$', code):
+            raise ValueError('NAICS codes must be 2 to 6 digits')
+    return codes
+
 class BusinessBase(BaseModel):
     name: str
     cage_code: str = Field(validation_alias='cage_code', validators=[validate_cage_code])
     duns: Optional[str] = Field(None, validation_alias='duns', validators=[validate_duns])
     location: Dict
+    naics_codes: List[str] = []
     capabilities: Optional[Dict] = None
     past_performance: Optional[List[Dict]] = None
     certifications: Optional[Dict] = None
+    notification_preferences: Optional[Dict] = None
+
+    _naics_codes = field_validator('naics_codes', mode='before')(validate_naics_codes)
 
 class BusinessCreate(BusinessBase):
     pass
@@ -28,9 +42,13 @@ class BusinessCreate(BusinessBase):
 class BusinessUpdate(BaseModel):
     name: Optional[str] = None
     location: Optional[Dict] = None
+    naics_codes: Optional[List[str]] = None
     capabilities: Optional[Dict] = None
     past_performance: Optional[List[Dict]] = None
     certifications: Optional[Dict] = None
+    notification_preferences: Optional[Dict] = None
+
+    _naics_codes = field_validator('naics_codes', mode='before')(validate_naics_codes)
 
 class BusinessResponse(BusinessBase):
     id: int
@@ -39,3 +57,7 @@ class BusinessResponse(BusinessBase):
 
     class Config:
         from_attributes = True
+
+class NearbyBusiness(BaseModel):
+    business: BusinessResponse
+    distance_miles: float
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from app.schemas.business import BusinessResponse
+from app.schemas.opportunity import OpportunityResponse
+
+class OpportunityMatch(BaseModel):
+    opportunity: OpportunityResponse
+    score: float
+    matched_at: datetime
+
+class BusinessMatch(BaseModel):
+    business: BusinessResponse
+    score: float
+    matched_at: datetime
+
+class OpportunityMatchPage(BaseModel):
+    items: List[OpportunityMatch]
+    next_cursor: Optional[str] = None
+
+class BusinessMatchPage(BaseModel):
+    items: List[BusinessMatch]
+    next_cursor: Optional[str] = None
@@ -1,15 +1,17 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from datetime import datetime
 
 class OpportunityBase(BaseModel):
     notice_id: str
     title: str
-    description: str
-    agency: str
-    naics_code: str
-    contract_value: float
-    response_deadline: datetime
+    # SAM.gov leaves these out of many notices, and ingestion stores them as
+    # NULL rather than guessing
+    description: Optional[str] = None
+    agency: Optional[str] = None
+    naics_code: Optional[str] = None
+    contract_value: Optional[float] = None
+    response_deadline: Optional[datetime] = None
     location: Dict
     requirements: Optional[Dict]
     status: str
@@ -35,4 +37,16 @@ class OpportunityResponse(OpportunityBase):
     business_id: Optional[int]
 
     class Config:
-        orm_mode = True
+        from_attributes = True
+
+class OpportunityPage(BaseModel):
+    items: List[OpportunityResponse]
+    next_cursor: Optional[str] = None
+
+class OpportunitySearchHit(BaseModel):
+    opportunity: OpportunityResponse
+    rank: float
+
+class OpportunitySearchPage(BaseModel):
+    items: List[OpportunitySearchHit]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,229 @@
+import csv
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Archive CSV header -> awards column, in COPY order
+ARCHIVE_COLUMNS = {
+    "contract_award_unique_key": "award_key",
+    "award_id_piid": "piid",
+    "recipient_uei": "recipient_uei",
+    "recipient_duns": "recipient_duns",
+    "recipient_name": "recipient_name",
+    "naics_code": "naics_code",
+    "naics_description": "naics_description",
+    "awarding_agency_name": "awarding_agency",
+    "funding_agency_name": "funding_agency",
+    "total_dollars_obligated": "total_obligation",
+    "current_total_value_of_award": "award_value",
+    "period_of_performance_start_date": "start_date",
+    "period_of_performance_current_end_date": "end_date",
+    "primary_place_of_performance_state_code": "place_of_performance_state",
+}
+AWARD_COLUMNS = list(ARCHIVE_COLUMNS.values())
+STAGING_TABLE = "awards_staging"
+STAGING_TYPES = {
+    "total_obligation": "double precision",
+    "award_value": "double precision",
+    "start_date": "date",
+    "end_date": "date",
+}
+
+
+class LoadResult:
+    """
+    Rows read from an archive and rows that changed the awards table
+    """
+    __slots__ = ("rows_read", "rows_written")
+
+    def __init__(self, rows_read: int = 0, rows_written: int = 0):
+        self.rows_read = rows_read
+        self.rows_written = rows_written
+
+    def add(self, other: "LoadResult") -> None:
+        self.rows_read += other.rows_read
+        self.rows_written += other.rows_written
+
+    def as_counts(self) -> Dict[str, int]:
+        return {"rows_read": self.rows_read, "rows_written": self.rows_written}
+
+
+def _merge_sql() -> str:
+    columns = ", ".join(AWARD_COLUMNS)
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in AWARD_COLUMNS[1:]
+    )
+    changed = " OR ".join(
+        f"awards.{column} IS DISTINCT FROM EXCLUDED.{column}"
+        for column in AWARD_COLUMNS[1:]
+    )
+    # A file can carry the same award more than once; the last row wins.
+    # Merged one range of award keys at a time, (lower, upper]
+    return (
+        f"INSERT INTO awards ({columns}, updated_at) "
+        f"SELECT DISTINCT ON (award_key) {columns}, now() AT TIME ZONE 'utc' "
+        f"FROM {STAGING_TABLE} WHERE award_key > %(lower)s AND award_key <= %(upper)s "
+        f"ORDER BY award_key, row_number DESC "
+        f"ON CONFLICT (award_key) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at "
+        f"WHERE {changed}"
+    )
+
+
+def iter_csv_chunks(
+    stream: io.TextIOBase,
+    chunk_rows: int
+) -> Iterator[io.StringIO]:
+    """
+    Project an archive CSV onto the awards columns, yielding CSV buffers of
+    at most `chunk_rows` rows ready for COPY
+
+    Each row is prefixed with its position in the file so the merge can
+    keep the last copy of a repeated award.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    missing = [name for name in ARCHIVE_COLUMNS if name not in header]
+    if "contract_award_unique_key" in missing:
+        raise ValueError("Archive file has no contract_award_unique_key column")
+    positions = [
+        header.index(name) if name not in missing else None
+        for name in ARCHIVE_COLUMNS
+    ]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row_number, row in enumerate(reader):
+        writer.writerow(
+            [row_number]
+            + [row[position] if position is not None and position < len(row) else ""
+               for position in positions]
+        )
+        count += 1
+        if count >= chunk_rows:
+            buffer.seek(0)
+            yield buffer
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            count = 0
+    if count:
+        buffer.seek(0)
+        yield buffer
+
+
+def load_archive_member(
+    archive_path: str,
+    member: str,
+    chunk_rows: Optional[int] = None
+) -> LoadResult:
+    """
+    COPY one CSV of an award archive into a staging table, then merge it
+    into awards `chunk_rows` staged rows at a time, one transaction each
+
+    The whole file is staged before anything is merged, so an award
+    repeated anywhere in the file is written once with its last row.
+    Runs in its own process with its own connection, so several members of
+    an archive load in parallel. Reloading the same archive only rewrites
+    rows whose values changed.
+    """
+    chunk_rows = chunk_rows or settings.AWARD_LOAD_CHUNK_ROWS
+    engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, poolclass=NullPool)
+    connection = engine.raw_connection()
+    result = LoadResult()
+    try:
+        cursor = connection.cursor()
+        # Empty CSV fields arrive as NULL, so numbers and dates parse as-is
+        staging_columns = ", ".join(
+            f"{column} {STAGING_TYPES.get(column, 'text')}" for column in AWARD_COLUMNS
+        )
+        cursor.execute(
+            f"CREATE TEMP TABLE {STAGING_TABLE} (row_number bigint, {staging_columns})"
+        )
+        copy_sql = (
+            f"COPY {STAGING_TABLE} (row_number, {', '.join(AWARD_COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv)"
+        )
+        merge_sql = _merge_sql()
+        # The greatest award key among the next chunk_rows staged rows
+        bound_sql = (
+            f"SELECT max(award_key) FROM (SELECT award_key FROM {STAGING_TABLE} "
+            f"WHERE award_key > %(lower)s ORDER BY award_key LIMIT %(limit)s) batch"
+        )
+
+        with zipfile.ZipFile(archive_path) as archive:
+            with archive.open(member) as raw:
+                stream = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                for chunk in iter_csv_chunks(stream, chunk_rows):
+                    cursor.copy_expert(copy_sql, chunk)
+                    result.rows_read += cursor.rowcount
+                    connection.commit()
+
+        cursor.execute(f"CREATE INDEX ON {STAGING_TABLE} (award_key, row_number)")
+        connection.commit()
+        lower = ""
+        while True:
+            cursor.execute(bound_sql, {"lower": lower, "limit": chunk_rows})
+            upper = cursor.fetchone()[0]
+            if upper is None:
+                return result
+            # Every row of the bounding key is in this range, so a
+            # repeated award is never split across merges
+            cursor.execute(merge_sql, {"lower": lower, "upper": upper})
+            result.rows_written += cursor.rowcount
+            connection.commit()
+            lower = upper
+    finally:
+        connection.close()
+        engine.dispose()
+
+
+def archive_members(archive_path: str) -> List[str]:
+    with zipfile.ZipFile(archive_path) as archive:
+        return sorted(
+            name for name in archive.namelist() if name.lower().endswith(".csv")
+        )
+
+
+def load_archive(
+    archive_path: str,
+    workers: Optional[int] = None,
+    chunk_rows: Optional[int] = None,
+    on_member: Optional[Callable[[str, LoadResult], None]] = None
+) -> LoadResult:
+    """
+    Load every CSV in a USAspending award archive, up to `workers` files
+    at a time
+
+    An award is expected in one file of the archive; one repeated across
+    files keeps whichever file is merged last.
+    """
+    workers = workers or settings.AWARD_LOAD_WORKERS
+    members = archive_members(archive_path)
+    total = LoadResult()
+    if workers <= 1 or len(members) <= 1:
+        for member in members:
+            result = load_archive_member(archive_path, member, chunk_rows)
+            total.add(result)
+            if on_member:
+                on_member(member, result)
+        return total
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(members))) as pool:
+        futures = {
+            pool.submit(load_archive_member, archive_path, member, chunk_rows): member
+            for member in members
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            total.add(result)
+            if on_member:
+                on_member(futures[future], result)
+    return total
@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.award import Award
+
+# Marks the past_performance entries that come from the award archive
+ARCHIVE_SOURCE = "usaspending"
+
+class AwardService:
+    """
+    Queries over the local awards table loaded from USAspending archives
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def past_performance(self, duns: str, limit: int = 100) -> List[Dict]:
+        """
+        A recipient's most recent awards in the past_performance shape the
+        matcher reads: value and naics_code, plus identifying fields and a
+        source of ARCHIVE_SOURCE
+        """
+        awards = await self.db.scalars(
+            select(Award).where(
+                Award.recipient_duns == duns
+            ).order_by(Award.start_date.desc().nullslast()).limit(limit)
+        )
+        return [
+            {
+                "award_id": award.piid or award.award_key,
+                "value": award.award_value if award.award_value is not None else award.total_obligation,
+                "naics_code": award.naics_code,
+                "agency": award.awarding_agency,
+                "start_date": award.start_date.isoformat() if award.start_date else None,
+                "end_date": award.end_date.isoformat() if award.end_date else None,
+                "source": ARCHIVE_SOURCE,
+            }
+            for award in awards
+        ]
+
+    async def spending_summary(self, duns: str, naics_code: Optional[str] = None) -> Dict:
+        """
+        Award count and obligated total for a recipient
+        """
+        query = select(
+            func.count(Award.id),
+            func.coalesce(func.sum(Award.total_obligation), 0.0)
+        ).where(Award.recipient_duns == duns)
+        if naics_code:
+            query = query.where(Award.naics_code == naics_code)
+        count, total = (await self.db.execute(query)).one()
+        return {"award_count": count, "total_obligation": float(total)}
+
+
+def merge_past_performance(current: Optional[List[Dict]], archived: List[Dict]) -> List[Dict]:
+    """
+    A business's past performance with its archive awards refreshed
+
+    Entries entered through the API are kept as they are; only the entries
+    a previous sync took from the archive are replaced. Archive awards the
+    business already entered itself, by award_id, are not added again.
+    """
+    entered = [
+        contract for contract in current or []
+        if contract.get("source") != ARCHIVE_SOURCE
+    ]
+    entered_ids = {contract.get("award_id") for contract in entered if contract.get("award_id")}
+    return entered + [
+        contract for contract in archived
+        if contract["award_id"] not in entered_ids
+    ]
@@ -0,0 +1,77 @@
+import math
+from typing import Dict, Optional, Tuple
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LATITUDE = 69.0
+
+
+def coordinates_of(location: Optional[Dict]) -> Tuple[float, float]:
+    """
+    (latitude, longitude) from a location's "coordinates", or NaNs when
+    there are none or they are out of range
+
+    Accepts {"latitude", "longitude"}, {"lat", "lon"/"lng"} or a
+    [latitude, longitude] pair.
+    """
+    coordinates = (location or {}).get('coordinates')
+    latitude = longitude = None
+    if isinstance(coordinates, dict):
+        latitude = coordinates.get('latitude', coordinates.get('lat'))
+        longitude = coordinates.get(
+            'longitude', coordinates.get('lon', coordinates.get('lng'))
+        )
+    elif isinstance(coordinates, (list, tuple)) and len(coordinates) == 2:
+        latitude, longitude = coordinates
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return math.nan, math.nan
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return math.nan, math.nan
+    return latitude, longitude
+
+
+def haversine_miles(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distance in miles; any of the arguments may be arrays
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(value, dtype=np.float64))
+        for value in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def location_credits(
+    latitude: float,
+    longitude: float,
+    state: str,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    states: np.ndarray
+) -> np.ndarray:
+    """
+    Share of the location weight earned by each row against one place
+
+    Where both sides have coordinates the credit halves every
+    MATCH_LOCATION_HALF_LIFE_MILES and is zero past MATCH_LOCATION_RADIUS_MILES,
+    so a Bethesda business is close to an Arlington notice even though the
+    states differ. Otherwise it falls back to state equality.
+    """
+    with np.errstate(invalid='ignore'):
+        distances = haversine_miles(latitude, longitude, latitudes, longitudes)
+        decayed = np.where(
+            distances <= settings.MATCH_LOCATION_RADIUS_MILES,
+            0.5 ** (distances / settings.MATCH_LOCATION_HALF_LIFE_MILES),
+            0.0
+        )
+    located = ~np.isnan(distances)
+    return np.where(located, decayed, np.where(states == state, 1.0, 0.0))
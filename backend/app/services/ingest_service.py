@@ -0,0 +1,145 @@
+import asyncio
+from typing import AsyncIterable, Dict, Iterable, List, Optional
+from datetime import datetime
+from sqlalchemy import cast, literal_column, or_
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.models.opportunity import Opportunity
+
+settings = get_settings()
+
+# Columns written by ingestion; notice_id is the conflict key
+OPPORTUNITY_COLUMNS = (
+    "title",
+    "description",
+    "agency",
+    "naics_code",
+    "contract_value",
+    "response_deadline",
+    "location",
+    "requirements",
+    "status",
+    "source",
+    "source_data",
+)
+JSON_COLUMNS = {"location", "requirements", "source_data"}
+
+
+class IngestResult:
+    """
+    Outcome of an upsert run
+    """
+    __slots__ = ("new_ids", "updated_ids", "unchanged")
+
+    def __init__(self):
+        self.new_ids: List[int] = []
+        self.updated_ids: List[int] = []
+        self.unchanged = 0
+
+    @property
+    def changed_ids(self) -> List[int]:
+        return self.new_ids + self.updated_ids
+
+    def as_counts(self) -> Dict[str, int]:
+        return {
+            "new_opportunities": len(self.new_ids),
+            "updated_opportunities": len(self.updated_ids),
+            "unchanged_opportunities": self.unchanged,
+        }
+
+
+def _changed(column: str, excluded):
+    current = getattr(Opportunity, column)
+    incoming = excluded[column]
+    # json has no equality operator in PostgreSQL; compare as jsonb
+    if column in JSON_COLUMNS:
+        current, incoming = cast(current, JSONB), cast(incoming, JSONB)
+    return current.is_distinct_from(incoming)
+
+
+class OpportunityIngestService:
+    """
+    Bulk upsert of normalized opportunity records
+
+    Each batch is one INSERT ... ON CONFLICT (notice_id) DO UPDATE statement
+    in its own transaction. Rows whose columns are all unchanged are left
+    untouched, so they keep their updated_at and are not re-scored.
+    """
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.SYNC_BATCH_SIZE
+
+    def upsert(self, records: Iterable[Dict], result: Optional[IngestResult] = None) -> IngestResult:
+        """
+        Insert or update records keyed by notice_id
+        Returns the new and updated ids and the number of unchanged records
+        """
+        result = result or IngestResult()
+        batch: Dict[str, Dict] = {}
+        for record in records:
+            # A statement may touch each row only once, so the last copy of
+            # a notice within a batch wins
+            batch[record["notice_id"]] = record
+            if len(batch) >= self.batch_size:
+                self._upsert_batch(list(batch.values()), result)
+                batch = {}
+        if batch:
+            self._upsert_batch(list(batch.values()), result)
+        return result
+
+    async def upsert_stream(
+        self,
+        records: AsyncIterable[Dict],
+        result: Optional[IngestResult] = None
+    ) -> IngestResult:
+        """
+        Like upsert(), writing each batch as soon as it fills from the stream
+        Batches are written on a worker thread so the event loop keeps
+        serving requests while the database works.
+        """
+        result = result or IngestResult()
+        batch: Dict[str, Dict] = {}
+        async for record in records:
+            batch[record["notice_id"]] = record
+            if len(batch) >= self.batch_size:
+                await asyncio.to_thread(self._upsert_batch, list(batch.values()), result)
+                batch = {}
+        if batch:
+            await asyncio.to_thread(self._upsert_batch, list(batch.values()), result)
+        return result
+
+    def _upsert_batch(self, records: List[Dict], result: IngestResult) -> None:
+        now = datetime.utcnow()
+        rows = [
+            {
+                "notice_id": record["notice_id"],
+                **{column: record.get(column) for column in OPPORTUNITY_COLUMNS},
+                "created_at": now,
+                "updated_at": now,
+            }
+            for record in records
+        ]
+
+        stmt = pg_insert(Opportunity).values(rows)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Opportunity.notice_id],
+            set_={
+                **{column: excluded[column] for column in OPPORTUNITY_COLUMNS},
+                "updated_at": excluded.updated_at,
+            },
+            where=or_(*[_changed(column, excluded) for column in OPPORTUNITY_COLUMNS])
+        ).returning(
+            Opportunity.id,
+            # xmax is 0 only for rows this statement inserted
+            literal_column("xmax = 0").label("inserted")
+        )
+
+        returned = self.db.execute(stmt).all()
+        self.db.commit()
+
+        for row in returned:
+            (result.new_ids if row.inserted else result.updated_ids).append(row.id)
+        result.unchanged += len(rows) - len(returned)
@@ -0,0 +1,100 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy import or_, select
+from app.core.config import get_settings
+from app.db.session import AsyncSessionLocal
+from app.models.business import Business
+from app.models.match import Match
+from app.models.opportunity import Opportunity
+from app.services.notification_service import NotificationService
+
+settings = get_settings()
+
+
+async def notify_new_opportunities(opportunity_ids: Iterable[int]) -> Dict[str, int]:
+    """
+    Tell each business about the new notices it matches, in one digest
+
+    Runs after a sync has re-scored the notices it inserted. Candidate
+    businesses were already found through the business snapshot's NAICS
+    and location indexes and scored in bulk when the matches were stored,
+    so this reads those matches (NEW_MATCH_MIN_SCORE or better) in one
+    pass per 1000 notices rather than scanning the businesses once per
+    notice. Each business gets at most one email and one SMS per sync,
+    listing its best NEW_MATCH_DIGEST_LIMIT notices. Digests are only
+    queued; the mail and SMS queues pace, retry and log their delivery, so
+    a sync never waits on them.
+    Returns counts for the job's progress
+    """
+    opportunity_ids = sorted(set(opportunity_ids))
+    counts = {"new_match_digests": 0, "new_matches_notified": 0, "new_match_messages": 0}
+    if not opportunity_ids:
+        return counts
+
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        # Business id -> opportunity id -> (score, opportunity); keyed so a
+        # notice is listed once per business
+        digests = defaultdict(dict)
+        for i in range(0, len(opportunity_ids), 1000):
+            rows = await db.execute(
+                select(Match.business_id, Match.score, Opportunity)
+                .join(Opportunity, Opportunity.id == Match.opportunity_id)
+                .where(
+                    Match.opportunity_id.in_(opportunity_ids[i:i + 1000]),
+                    Match.score >= settings.NEW_MATCH_MIN_SCORE,
+                    Opportunity.status == 'active',
+                    or_(
+                        Opportunity.response_deadline.is_(None),
+                        Opportunity.response_deadline > now
+                    )
+                )
+            )
+            for business_id, score, opportunity in rows:
+                digests[business_id][opportunity.id] = (score, opportunity)
+
+        # Only the columns a digest needs, not the businesses' NAICS codes
+        businesses = {}
+        business_ids = sorted(digests)
+        for i in range(0, len(business_ids), 1000):
+            rows = await db.execute(
+                select(Business.id, Business.name, Business.notification_preferences)
+                .where(Business.id.in_(business_ids[i:i + 1000]))
+            )
+            businesses.update((row.id, row) for row in rows)
+
+    notifications = NotificationService()
+    for business_id, matches in digests.items():
+        business = businesses.get(business_id)
+        if business is None or not _wants_new_matches(business.notification_preferences):
+            continue
+        ordered = sorted(matches.values(), key=lambda match: (-match[0], match[1].id))
+        queued = notifications.queue_new_matches(
+            {'id': business.id, 'name': business.name},
+            [
+                {
+                    'id': opp.id,
+                    'title': opp.title,
+                    'agency': opp.agency,
+                    'contract_value': opp.contract_value,
+                    'response_deadline': opp.response_deadline,
+                    'score': score,
+                }
+                for score, opp in ordered[:settings.NEW_MATCH_DIGEST_LIMIT]
+            ],
+            business.notification_preferences,
+            total=len(ordered)
+        )
+        counts["new_match_digests"] += 1
+        counts["new_match_messages"] += len(queued)
+        counts["new_matches_notified"] += len(ordered)
+    return counts
+
+
+def _wants_new_matches(preferences: Optional[Dict]) -> bool:
+    preferences = preferences or {}
+    return bool(
+        preferences.get('new_matches', True)
+        and (preferences.get('email') or preferences.get('sms'))
+    )
@@ -0,0 +1,294 @@
+import math
+from typing import Iterable, Optional, Tuple
+import numpy as np
+from app.core.config import get_settings
+from app.services.geo import MILES_PER_DEGREE_LATITUDE, haversine_miles
+from app.services.match_scoring import MATCH_WEIGHTS, BusinessProfile
+from app.services.naics import LEVEL_CREDIT, NAICS_LEVELS, NAICSTrie
+
+settings = get_settings()
+
+
+class InvertedIndex:
+    """
+    Maps each key to the row positions that carry it
+    """
+
+    def __init__(self, owners: np.ndarray, keys: np.ndarray):
+        order = np.argsort(keys, kind="stable")
+        self._owners = owners[order]
+        self._keys, self._starts = np.unique(keys[order], return_index=True)
+        self._ends = np.append(self._starts[1:], len(order))
+
+    @classmethod
+    def from_column(cls, keys: np.ndarray) -> "InvertedIndex":
+        return cls(np.arange(len(keys), dtype=np.int64), keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def keys(self) -> np.ndarray:
+        """
+        The distinct keys, sorted; a key's position is its slot
+        """
+        return self._keys
+
+    def lookup(self, keys: Iterable[str]) -> np.ndarray:
+        """
+        Return the sorted, unique row positions carrying any of `keys`
+        """
+        keys = np.array(sorted(set(keys)))
+        if not len(keys) or not len(self._keys):
+            return np.empty(0, dtype=np.int64)
+
+        slots = np.searchsorted(self._keys, keys)
+        slots = slots[slots < len(self._keys)]
+        slots = slots[np.isin(self._keys[slots], keys)]
+        return self.lookup_slots(slots)
+
+    def lookup_slots(self, slots: Iterable[int]) -> np.ndarray:
+        """
+        Return the sorted, unique row positions carrying the keys at `slots`
+        """
+        return self._union([(slot, slot + 1) for slot in slots])
+
+    def lookup_ranges(self, ranges: Iterable[Tuple[int, int]]) -> np.ndarray:
+        """
+        Return the sorted, unique row positions carrying the keys in any of
+        the [first, stop) slot ranges
+        """
+        return self._union(ranges)
+
+    def _union(self, ranges: Iterable[Tuple[int, int]]) -> np.ndarray:
+        # Postings are stored in key order, so a run of slots is one slice
+        postings = [
+            self._owners[self._starts[first]:self._ends[stop - 1]]
+            for first, stop in ranges if stop > first
+        ]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(postings))
+
+
+class PrefixIndex:
+    """
+    Inverted index over NAICS codes that also finds rows by shared prefix
+
+    A NAICSTrie over the distinct codes maps a code and a depth to the index
+    slots below that node, so the lookup walks the code's digits once
+    instead of comparing it against every stored code. Codes sharing a
+    prefix sort next to each other, so those slots form one run.
+    """
+
+    def __init__(self, index: InvertedIndex):
+        self.index = index
+        self.trie = NAICSTrie.from_owners(
+            np.arange(len(index), dtype=np.int64), index.keys
+        )
+
+    def lookup(self, codes: Iterable[str]) -> np.ndarray:
+        return self.index.lookup(codes)
+
+    def lookup_prefix(self, codes: Iterable[str], level: int) -> np.ndarray:
+        """
+        Return the sorted, unique row positions whose code shares at least
+        `level` leading digits with any of `codes`
+        """
+        ranges = []
+        for code in codes:
+            slots = self.trie.owners(code, level)
+            if len(slots):
+                ranges.append((int(slots[0]), int(slots[-1]) + 1))
+        return self.index.lookup_ranges(ranges)
+
+
+class GeoGrid:
+    """
+    Spatial index bucketing coordinates into square cells of
+    GEO_GRID_CELL_MILES of latitude
+
+    A radius query only reads the cells overlapping the circle's bounding
+    box, then keeps the rows whose exact distance is within the radius.
+    Rows without coordinates are not indexed.
+    """
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray,
+                 cell_miles: Optional[float] = None):
+        self.cell_degrees = (
+            cell_miles or settings.GEO_GRID_CELL_MILES
+        ) / MILES_PER_DEGREE_LATITUDE
+        self._latitudes = latitudes
+        self._longitudes = longitudes
+        located = np.flatnonzero(~np.isnan(latitudes) & ~np.isnan(longitudes))
+        self._index = InvertedIndex(
+            located,
+            self._cell_keys(
+                np.floor(latitudes[located] / self.cell_degrees),
+                np.floor(longitudes[located] / self.cell_degrees)
+            )
+        )
+
+    @staticmethod
+    def _cell_keys(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        return rows.astype(np.int64) * 1_000_000 + columns.astype(np.int64)
+
+    def within(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_miles: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the sorted row positions within `radius_miles` of a point,
+        and their distances
+        """
+        if math.isnan(latitude) or math.isnan(longitude) or not len(self._index):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # A degree of longitude shrinks towards the poles; size the box for
+        # the latitude furthest from the equator it reaches
+        lat_span = radius_miles / MILES_PER_DEGREE_LATITUDE
+        widest = math.cos(math.radians(min(abs(latitude) + lat_span, 89.0)))
+        lon_span = lat_span / widest
+        cell_rows = np.arange(
+            math.floor((latitude - lat_span) / self.cell_degrees),
+            math.floor((latitude + lat_span) / self.cell_degrees) + 1
+        )
+        # A box crossing the antimeridian continues on the other side
+        west, east = longitude - lon_span, longitude + lon_span
+        if east - west >= 360.0:
+            spans = [(-180.0, 180.0)]
+        elif west < -180.0:
+            spans = [(-180.0, east), (west + 360.0, 180.0)]
+        elif east > 180.0:
+            spans = [(west, 180.0), (-180.0, east - 360.0)]
+        else:
+            spans = [(west, east)]
+        cell_columns = np.unique(np.concatenate([
+            np.arange(
+                math.floor(first / self.cell_degrees),
+                math.floor(last / self.cell_degrees) + 1
+            )
+            for first, last in spans
+        ]))
+        rows = self._index.lookup(self._cell_keys(
+            np.repeat(cell_rows, len(cell_columns)),
+            np.tile(cell_columns, len(cell_rows))
+        ).tolist())
+
+        distances = haversine_miles(
+            latitude, longitude, self._latitudes[rows], self._longitudes[rows]
+        )
+        keep = distances <= radius_miles
+        return rows[keep], distances[keep]
+
+
+class LocationIndex:
+    """
+    Finds the rows that can earn location credit against a place: those
+    within the match radius, plus those in the same state for the rows or
+    places without coordinates
+    """
+
+    def __init__(self, states: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray):
+        self.states = InvertedIndex.from_column(states)
+        self.grid = GeoGrid(latitudes, longitudes)
+
+    def lookup(self, state: str, latitude: float, longitude: float) -> np.ndarray:
+        rows = self.states.lookup([state])
+        nearby, _ = self.grid.within(
+            latitude, longitude, settings.MATCH_LOCATION_RADIUS_MILES
+        )
+        return np.union1d(rows, nearby)
+
+
+def _prune_plan(min_score: float) -> Optional[bool]:
+    """
+    Decide which index lookups can bound the candidate set
+
+    A row that shares no NAICS prefix, past-performance code or location
+    can only earn the size and text components, and a row that shares only
+    the location can at most add those to it. Any row may share some text,
+    so the text component is always counted in full. Returns None when
+    every row can still reach `min_score`, otherwise whether location-only
+    rows must be kept.
+    """
+    if 0.0 + MATCH_WEIGHTS['size_match'] + MATCH_WEIGHTS['text_match'] >= min_score:
+        return None
+    return (
+        0.0 + MATCH_WEIGHTS['location_match'] + MATCH_WEIGHTS['size_match']
+        + MATCH_WEIGHTS['text_match'] >= min_score
+    )
+
+
+def _min_naics_level(min_score: float) -> Optional[int]:
+    """
+    Fewest leading NAICS digits a row must share to reach `min_score`
+    without a past-performance match, or None if no overlap is enough
+
+    Such a row earns at most its NAICS credit plus the full location, size
+    and text components, added in the scorers' order.
+    """
+    for level in NAICS_LEVELS:
+        if (
+            0.0 + MATCH_WEIGHTS['naics_match'] * LEVEL_CREDIT[level]
+            + MATCH_WEIGHTS['location_match'] + MATCH_WEIGHTS['size_match']
+            + MATCH_WEIGHTS['text_match'] >= min_score
+        ):
+            return level
+    return None
+
+
+def opportunity_candidates(
+    profile: BusinessProfile,
+    naics_index: PrefixIndex,
+    location_index: LocationIndex,
+    min_score: float
+) -> Optional[np.ndarray]:
+    """
+    Row positions of the opportunities that can still reach `min_score` for
+    this business, or None if the full set has to be scored
+    """
+    keep_state_only = _prune_plan(min_score)
+    if keep_state_only is None:
+        return None
+
+    rows = naics_index.lookup(profile.past_naics_codes)
+    level = _min_naics_level(min_score)
+    if level is not None:
+        rows = np.union1d(rows, naics_index.lookup_prefix(profile.naics_codes, level))
+    if keep_state_only:
+        rows = np.union1d(rows, location_index.lookup(
+            profile.state, profile.latitude, profile.longitude
+        ))
+    return rows
+
+
+def business_candidates(
+    naics: str,
+    state: str,
+    latitude: float,
+    longitude: float,
+    naics_index: PrefixIndex,
+    past_naics_index: InvertedIndex,
+    location_index: LocationIndex,
+    min_score: float
+) -> Optional[np.ndarray]:
+    """
+    Row positions of the businesses that can still reach `min_score` for an
+    opportunity with this (encoded) NAICS code, state and coordinates, or
+    None if the full set has to be scored. `naics_index` covers the registered NAICS codes of
+    each business, `past_naics_index` its past-performance codes.
+    """
+    keep_state_only = _prune_plan(min_score)
+    if keep_state_only is None:
+        return None
+
+    rows = past_naics_index.lookup([naics])
+    level = _min_naics_level(min_score)
+    if level is not None:
+        rows = np.union1d(rows, naics_index.lookup_prefix([naics], level))
+    if keep_state_only:
+        rows = np.union1d(rows, location_index.lookup(state, latitude, longitude))
+    return rows
@@ -0,0 +1,381 @@
+from typing import TYPE_CHECKING, Dict, List, Iterable, Optional, Tuple
+import heapq
+import numpy as np
+from app.core.config import get_settings
+from app.services.geo import coordinates_of, location_credits
+from app.services.naics import LEVEL_CREDIT, shared_levels
+
+if TYPE_CHECKING:
+    from app.models.business import Business
+    from app.models.opportunity import Opportunity
+
+settings = get_settings()
+
+# Weight of each score component; without MATCH_TEXT_ENABLED the text
+# component is 0 and is not computed at all
+MATCH_WEIGHTS = dict.fromkeys(
+    ('naics_match', 'location_match', 'size_match', 'past_performance', 'text_match'), 0.0
+)
+MATCH_WEIGHTS.update(
+    settings.MATCH_TEXT_WEIGHTS if settings.MATCH_TEXT_ENABLED else settings.MATCH_WEIGHTS
+)
+if not settings.MATCH_TEXT_ENABLED:
+    MATCH_WEIGHTS['text_match'] = 0.0
+
+# Stand-in for missing NAICS codes / states in the string arrays. It keeps
+# the None == None semantics of the scalar scorer without colliding with
+# real values. (NumPy strips trailing NULs from str arrays, so "\x00" won't do.)
+MISSING = "\x01"
+
+
+def encode_key(value) -> str:
+    if value is None:
+        return MISSING
+    if isinstance(value, str):
+        return value
+    # Keep non-string JSON values (e.g. an integer NAICS code) distinct from
+    # their string form, as the == comparison in the scalar scorer does
+    return f"\x02{value!r}"
+
+
+class BusinessProfile:
+    """
+    The parts of a business that matching reads, computed once per business
+    instead of once per (business, opportunity) pair
+    """
+    __slots__ = (
+        "naics_codes", "state", "avg_contract_value", "past_naics_codes",
+        "latitude", "longitude"
+    )
+
+    def __init__(self, naics_codes, state, avg_contract_value, past_naics_codes,
+                 latitude=float('nan'), longitude=float('nan')):
+        self.naics_codes = naics_codes
+        self.state = state
+        self.avg_contract_value = avg_contract_value
+        self.past_naics_codes = past_naics_codes
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def naics_levels(self, codes: np.ndarray) -> np.ndarray:
+        """
+        For each opportunity code in `codes`, the number of leading digits it
+        shares with the closest registered code
+        """
+        levels = np.zeros(len(codes), dtype=np.int64)
+        for code in self.naics_codes:
+            np.maximum(levels, shared_levels(codes, code), out=levels)
+        return levels
+
+    @classmethod
+    def from_business(cls, business: "Business") -> "BusinessProfile":
+        return cls.from_fields(
+            [code.code for code in business.naics_codes],
+            business.location,
+            business.past_performance
+        )
+
+    @classmethod
+    def from_fields(
+        cls,
+        naics_codes: Iterable[str],
+        location: Optional[Dict],
+        past_performance: Optional[List[Dict]]
+    ) -> "BusinessProfile":
+        past_performance = past_performance or []
+        if past_performance:
+            values = [
+                float(contract['value'])
+                for contract in past_performance
+                if contract.get('value')
+            ]
+            avg_contract_value = float(np.mean(values)) if values else float('nan')
+        else:
+            avg_contract_value = 0.0
+
+        latitude, longitude = coordinates_of(location)
+        return cls(
+            naics_codes={encode_key(code) for code in naics_codes},
+            state=encode_key((location or {}).get('state')),
+            avg_contract_value=avg_contract_value,
+            past_naics_codes={
+                encode_key(contract.get('naics_code')) for contract in past_performance
+            },
+            latitude=latitude,
+            longitude=longitude
+        )
+
+
+class OpportunityColumns:
+    """
+    Column arrays for a set of opportunities, in the order they were given
+
+    NAICS codes are also kept as positions into the sorted distinct codes
+    (`naics_vocab`), so per-code work is done once per distinct code.
+    """
+    __slots__ = (
+        "ids", "naics", "states", "contract_values", "deadlines",
+        "naics_vocab", "naics_ids", "latitudes", "longitudes"
+    )
+
+    def __init__(self, ids, naics, states, contract_values, deadlines=None,
+                 naics_vocab=None, naics_ids=None, latitudes=None, longitudes=None):
+        self.ids = ids
+        self.naics = naics
+        self.states = states
+        self.contract_values = contract_values
+        self.deadlines = deadlines
+        # NaN where a place of performance has no coordinates
+        if latitudes is None:
+            latitudes = np.full(len(ids), np.nan)
+            longitudes = np.full(len(ids), np.nan)
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        if naics_vocab is None:
+            naics_vocab, naics_ids = np.unique(naics, return_inverse=True)
+        self.naics_vocab = naics_vocab
+        self.naics_ids = naics_ids.astype(np.int64, copy=False)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, rows: np.ndarray) -> "OpportunityColumns":
+        """
+        Return the subset of columns at the given row positions
+        """
+        return OpportunityColumns(
+            ids=self.ids[rows],
+            naics=self.naics[rows],
+            states=self.states[rows],
+            contract_values=self.contract_values[rows],
+            deadlines=None if self.deadlines is None else self.deadlines[rows],
+            naics_vocab=self.naics_vocab,
+            naics_ids=self.naics_ids[rows],
+            latitudes=self.latitudes[rows],
+            longitudes=self.longitudes[rows]
+        )
+
+    @classmethod
+    def from_opportunities(cls, opportunities: Iterable["Opportunity"]) -> "OpportunityColumns":
+        opportunities = list(opportunities)
+        coordinates = np.array(
+            [coordinates_of(opp.location) for opp in opportunities],
+            dtype=np.float64
+        ).reshape(-1, 2)
+        return cls(
+            ids=np.array([opp.id for opp in opportunities], dtype=np.int64),
+            naics=np.array([encode_key(opp.naics_code) for opp in opportunities], dtype=str),
+            states=np.array(
+                [encode_key((opp.location or {}).get('state')) for opp in opportunities],
+                dtype=str
+            ),
+            contract_values=np.array(
+                [np.nan if opp.contract_value is None else opp.contract_value
+                 for opp in opportunities],
+                dtype=np.float64
+            ),
+            deadlines=np.array(
+                [opp.response_deadline for opp in opportunities],
+                dtype="datetime64[s]"
+            ),
+            latitudes=coordinates[:, 0],
+            longitudes=coordinates[:, 1]
+        )
+
+
+class BusinessColumns:
+    """
+    Column arrays for a set of businesses. Multi-valued NAICS fields are
+    flattened into (owner row, code) pairs; registered codes are also kept
+    as positions into their sorted distinct values, like OpportunityColumns.
+    """
+    __slots__ = (
+        "ids", "states", "avg_contract_values",
+        "naics_owners", "naics_codes", "past_owners", "past_naics_codes",
+        "naics_vocab", "naics_ids", "latitudes", "longitudes"
+    )
+
+    def __init__(self, ids, states, avg_contract_values,
+                 naics_owners, naics_codes, past_owners, past_naics_codes,
+                 naics_vocab=None, naics_ids=None, latitudes=None, longitudes=None):
+        self.ids = ids
+        self.states = states
+        if latitudes is None:
+            latitudes = np.full(len(ids), np.nan)
+            longitudes = np.full(len(ids), np.nan)
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.avg_contract_values = avg_contract_values
+        self.naics_owners = naics_owners
+        self.naics_codes = naics_codes
+        self.past_owners = past_owners
+        self.past_naics_codes = past_naics_codes
+        if naics_vocab is None:
+            naics_vocab, naics_ids = np.unique(naics_codes, return_inverse=True)
+        self.naics_vocab = naics_vocab
+        self.naics_ids = naics_ids.astype(np.int64, copy=False)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, rows: np.ndarray) -> "BusinessColumns":
+        """
+        Return the subset of columns at the given (sorted, unique) row positions
+        """
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[rows] = np.arange(len(rows))
+        naics_keep = remap[self.naics_owners] >= 0
+        past_keep = remap[self.past_owners] >= 0
+        return BusinessColumns(
+            ids=self.ids[rows],
+            states=self.states[rows],
+            avg_contract_values=self.avg_contract_values[rows],
+            naics_owners=remap[self.naics_owners[naics_keep]],
+            naics_codes=self.naics_codes[naics_keep],
+            past_owners=remap[self.past_owners[past_keep]],
+            past_naics_codes=self.past_naics_codes[past_keep],
+            naics_vocab=self.naics_vocab,
+            naics_ids=self.naics_ids[naics_keep],
+            latitudes=self.latitudes[rows],
+            longitudes=self.longitudes[rows]
+        )
+
+    @classmethod
+    def from_profiles(cls, ids: List[int], profiles: List[BusinessProfile]) -> "BusinessColumns":
+        naics_pairs = [
+            (row, code) for row, profile in enumerate(profiles)
+            for code in profile.naics_codes
+        ]
+        past_pairs = [
+            (row, code) for row, profile in enumerate(profiles)
+            for code in profile.past_naics_codes
+        ]
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            states=np.array([profile.state for profile in profiles], dtype=str),
+            avg_contract_values=np.array(
+                [profile.avg_contract_value for profile in profiles],
+                dtype=np.float64
+            ),
+            naics_owners=np.array([row for row, _ in naics_pairs], dtype=np.int64),
+            naics_codes=np.array([code for _, code in naics_pairs], dtype=str),
+            past_owners=np.array([row for row, _ in past_pairs], dtype=np.int64),
+            past_naics_codes=np.array([code for _, code in past_pairs], dtype=str),
+            latitudes=np.array([profile.latitude for profile in profiles], dtype=np.float64),
+            longitudes=np.array([profile.longitude for profile in profiles], dtype=np.float64)
+        )
+
+
+def _isin(values: np.ndarray, codes) -> np.ndarray:
+    if not codes or not len(values):
+        return np.zeros(len(values), dtype=bool)
+    return np.isin(values, np.array(sorted(codes), dtype=str))
+
+
+def score_opportunity_columns(
+    profile: BusinessProfile,
+    columns: OpportunityColumns,
+    text_similarities: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Score one business against every opportunity in `columns`
+    Components are added in the same order as calculate_match_score so,
+    given the same text similarities, the float results are bit-for-bit
+    identical. `text_similarities` are the
+    capability-to-notice text similarities aligned with `columns`; without
+    them the text component is 0.
+    """
+    naics_credits = LEVEL_CREDIT[profile.naics_levels(columns.naics_vocab)][columns.naics_ids]
+
+    scores = np.zeros(len(columns), dtype=np.float64)
+    scores += MATCH_WEIGHTS['naics_match'] * naics_credits
+    scores += MATCH_WEIGHTS['location_match'] * location_credits(
+        profile.latitude, profile.longitude, profile.state,
+        columns.latitudes, columns.longitudes, columns.states
+    )
+
+    avg_contract_value = profile.avg_contract_value
+    with np.errstate(invalid='ignore'):
+        size_match = (
+            (0.5 * avg_contract_value <= columns.contract_values)
+            & (columns.contract_values <= 2 * avg_contract_value)
+        )
+    scores += np.where(size_match, MATCH_WEIGHTS['size_match'], 0.0)
+
+    scores += np.where(
+        _isin(columns.naics, profile.past_naics_codes),
+        MATCH_WEIGHTS['past_performance'], 0.0
+    )
+    if text_similarities is not None:
+        scores += MATCH_WEIGHTS['text_match'] * text_similarities
+    return scores
+
+
+def score_business_columns(
+    opportunity: "Opportunity",
+    columns: BusinessColumns,
+    text_similarities: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Score one opportunity against every business in `columns`, with text
+    similarities as in score_opportunity_columns
+    """
+    count = len(columns)
+    naics = encode_key(opportunity.naics_code)
+    state = encode_key((opportunity.location or {}).get('state'))
+    latitude, longitude = coordinates_of(opportunity.location)
+    contract_value = (
+        np.nan if opportunity.contract_value is None else opportunity.contract_value
+    )
+
+    # Each business is credited for its registered code closest to the
+    # opportunity's
+    naics_levels = np.zeros(count, dtype=np.int64)
+    np.maximum.at(
+        naics_levels, columns.naics_owners,
+        shared_levels(columns.naics_vocab, naics)[columns.naics_ids]
+    )
+    past_match = np.zeros(count, dtype=bool)
+    past_match[columns.past_owners[columns.past_naics_codes == naics]] = True
+
+    scores = np.zeros(count, dtype=np.float64)
+    scores += MATCH_WEIGHTS['naics_match'] * LEVEL_CREDIT[naics_levels]
+    scores += MATCH_WEIGHTS['location_match'] * location_credits(
+        latitude, longitude, state,
+        columns.latitudes, columns.longitudes, columns.states
+    )
+
+    avg_contract_values = columns.avg_contract_values
+    with np.errstate(invalid='ignore'):
+        size_match = (
+            (0.5 * avg_contract_values <= contract_value)
+            & (contract_value <= 2 * avg_contract_values)
+        )
+    scores += np.where(size_match, MATCH_WEIGHTS['size_match'], 0.0)
+    scores += np.where(past_match, MATCH_WEIGHTS['past_performance'], 0.0)
+    if text_similarities is not None:
+        scores += MATCH_WEIGHTS['text_match'] * text_similarities
+    return scores
+
+
+def select_top(
+    ids: np.ndarray,
+    scores: np.ndarray,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[float, int]] = None
+) -> List[Tuple[int, float]]:
+    """
+    Order (id, score) pairs by score descending, then id ascending
+    Pairs ranked at or before the key `after` are skipped. With `limit`, a
+    heap keeps only the best `limit` pairs instead of sorting all of them.
+    """
+    if after is not None:
+        after_score, after_id = after
+        keep = (scores < after_score) | ((scores == after_score) & (ids > after_id))
+        ids, scores = ids[keep], scores[keep]
+
+    pairs = zip(ids.tolist(), scores.tolist())
+    rank = lambda pair: (-pair[1], pair[0])
+    if limit is None:
+        return sorted(pairs, key=rank)
+    return heapq.nsmallest(limit, pairs, key=rank)
@@ -1,38 +1,100 @@
-from typing import List, Dict
-from sqlalchemy.orm import Session
+import asyncio
+from typing import AsyncIterator, List, Dict, Iterable, Optional, Tuple
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.db.session import SessionLocal
 from app.models.business import Business
+from app.models.match import Match
 from app.models.opportunity import Opportunity
+from app.services.match_scoring import (
+    MATCH_WEIGHTS,
+    BusinessColumns,
+    BusinessProfile,
+    OpportunityColumns,
+    encode_key,
+    score_business_columns,
+    score_opportunity_columns,
+    select_top,
+)
+from app.services.geo import coordinates_of, location_credits
+from app.services.naics import naics_credit
+from app.services.snapshots import (
+    business_snapshot,
+    opportunity_snapshot,
+    opportunity_text_snapshot,
+)
+from app.services.text_index import capability_text, cosine_similarities, opportunity_text
 import numpy as np
 from datetime import datetime
 
+settings = get_settings()
+
+def _with_session(method, *args):
+    db = SessionLocal()
+    try:
+        return method(db, *args)
+    finally:
+        db.close()
+
+async def _snapshot_call(method, *args):
+    """
+    Call a snapshot reader on a worker thread with a synchronous session;
+    the snapshots guard refreshes with a thread lock, which must not be
+    taken on the event loop
+    """
+    return await asyncio.to_thread(_with_session, method, *args)
+
+async def _snapshot_candidates(snapshot, key, min_score):
+    return await _snapshot_call(snapshot.get_candidates, key, min_score)
+
+async def _capability_similarities(business: Business, ids: np.ndarray) -> Optional[np.ndarray]:
+    if not settings.MATCH_TEXT_ENABLED:
+        return None
+    [similarities] = await _snapshot_call(
+        opportunity_text_snapshot.similarities,
+        [capability_text(business.capabilities)], [ids]
+    )
+    return similarities
+
 class MatchingService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
     def calculate_match_score(
         self,
         business: Business,
-        opportunity: Opportunity
+        opportunity: Opportunity,
+        profile: Optional[BusinessProfile] = None
     ) -> float:
         """
         Calculate a match score between a business and an opportunity
         Returns a score between 0 and 1
+
+        Text is weighted by the notice IDF as of the last snapshot refresh,
+        so after a sync the score can differ from the snapshot path by
+        floating-point noise until the next refresh.
         """
         score = 0.0
-        weights = {
-            'naics_match': 0.4,
-            'location_match': 0.2,
-            'size_match': 0.2,
-            'past_performance': 0.2
-        }
+        weights = MATCH_WEIGHTS
+        if profile is None:
+            profile = BusinessProfile.from_business(business)
 
-        # NAICS code matching
-        if opportunity.naics_code in [code.code for code in business.naics_codes]:
-            score += weights['naics_match']
+        # NAICS code matching, with partial credit for a shared sector,
+        # subsector, industry group or industry
+        score += weights['naics_match'] * naics_credit(int(
+            profile.naics_levels(np.array([encode_key(opportunity.naics_code)], dtype=str))[0]
+        ))
 
-        # Location matching (if within same state)
-        if business.location.get('state') == opportunity.location.get('state'):
-            score += weights['location_match']
+        # Location matching: decays with distance, or same state when either
+        # side has no coordinates
+        latitude, longitude = coordinates_of(business.location)
+        opportunity_latitude, opportunity_longitude = coordinates_of(opportunity.location)
+        score += weights['location_match'] * float(location_credits(
+            latitude, longitude, encode_key(business.location.get('state')),
+            np.array([opportunity_latitude]), np.array([opportunity_longitude]),
+            np.array([encode_key(opportunity.location.get('state'))], dtype=str)
+        )[0])
 
         # Contract size matching based on past performance
         avg_contract_value = np.mean([
@@ -41,7 +103,10 @@ class MatchingService:
             if contract.get('value')
         ]) if business.past_performance else 0
 
-        if 0.5 * avg_contract_value <= opportunity.contract_value <= 2 * avg_contract_value:
+        if (
+            opportunity.contract_value is not None
+            and 0.5 * avg_contract_value <= opportunity.contract_value <= 2 * avg_contract_value
+        ):
             score += weights['size_match']
 
         # Past performance in similar contracts
@@ -52,56 +117,316 @@ class MatchingService:
         if similar_contracts:
             score += weights['past_performance']
 
+        # Capability text against the notice's title and description
+        if settings.MATCH_TEXT_ENABLED:
+            score += weights['text_match'] * float(cosine_similarities(
+                capability_text(business.capabilities),
+                [opportunity_text(opportunity.title, opportunity.description)],
+                opportunity_text_snapshot.current_idf()[1]
+            )[0])
+
         return score
 
-    def find_matches(
+    def score_many(
         self,
         business: Business,
-        min_score: float = 0.6
+        opportunities: List[Opportunity],
+        profile: Optional[BusinessProfile] = None
+    ) -> np.ndarray:
+        """
+        Score a business against a batch of opportunities in one vectorized pass
+        Returns scores aligned with `opportunities`
+        """
+        if profile is None:
+            profile = BusinessProfile.from_business(business)
+        columns = OpportunityColumns.from_opportunities(opportunities)
+        text_similarities = cosine_similarities(
+            capability_text(business.capabilities),
+            [opportunity_text(opp.title, opp.description) for opp in opportunities],
+            opportunity_text_snapshot.current_idf()[1]
+        ) if settings.MATCH_TEXT_ENABLED else None
+        return score_opportunity_columns(profile, columns, text_similarities)
+
+    def score_businesses(
+        self,
+        opportunity: Opportunity,
+        businesses: List[Business]
+    ) -> np.ndarray:
+        """
+        Score an opportunity against a batch of businesses in one vectorized pass
+        Returns scores aligned with `businesses`
+        """
+        columns = BusinessColumns.from_profiles(
+            [business.id for business in businesses],
+            [BusinessProfile.from_business(business) for business in businesses]
+        )
+        text_similarities = cosine_similarities(
+            opportunity_text(opportunity.title, opportunity.description),
+            [capability_text(business.capabilities) for business in businesses],
+            opportunity_text_snapshot.current_idf()[1]
+        ) if settings.MATCH_TEXT_ENABLED else None
+        return score_business_columns(opportunity, columns, text_similarities)
+
+    async def find_matches(
+        self,
+        business: Business,
+        min_score: float = 0.6,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        status: Optional[str] = None
     ) -> List[Dict]:
         """
         Find matching opportunities for a business
-        Returns list of opportunities with match scores
-        """
-        opportunities = self.db.query(Opportunity).filter(
-            Opportunity.status == 'active'
-        ).all()
-
-        matches = []
-        for opportunity in opportunities:
-            score = self.calculate_match_score(business, opportunity)
-            if score >= min_score:
-                matches.append({
-                    'opportunity': opportunity,
-                    'score': score,
-                    'matched_at': datetime.utcnow()
-                })
-
-        # Sort matches by score in descending order
-        matches.sort(key=lambda x: x['score'], reverse=True)
-        return matches
-
-    def find_businesses_for_opportunity(
+        Returns list of opportunities with match scores, best first. With
+        `limit` only the top `limit` matches ranked after the (score, id)
+        key `after` are returned, among those with the given `status`.
+        """
+        # Only active opportunities are matched, as in the matches table
+        if status is not None and status != 'active':
+            return []
+
+        # Only candidates that can still reach min_score are scored
+        profile = BusinessProfile.from_business(business)
+        columns = await _snapshot_candidates(opportunity_snapshot, profile, min_score)
+        text_similarities = await _capability_similarities(business, columns.ids)
+        scores = score_opportunity_columns(profile, columns, text_similarities)
+        hits = np.flatnonzero(scores >= min_score)
+        top = select_top(columns.ids[hits], scores[hits], limit, after)
+
+        # Only the selected rows are loaded as full ORM objects
+        opportunities = await self._load_by_id(Opportunity, [match_id for match_id, _ in top])
+        matched_at = datetime.utcnow()
+        return [
+            {
+                'opportunity': opportunities[opportunity_id],
+                'score': score,
+                'matched_at': matched_at
+            }
+            for opportunity_id, score in top
+            if opportunity_id in opportunities
+        ]
+
+    async def find_businesses_for_opportunity(
         self,
         opportunity: Opportunity,
-        min_score: float = 0.6
+        min_score: float = 0.6,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None
     ) -> List[Dict]:
         """
         Find matching businesses for an opportunity
-        Returns list of businesses with match scores
-        """
-        businesses = self.db.query(Business).all()
-
-        matches = []
-        for business in businesses:
-            score = self.calculate_match_score(business, opportunity)
-            if score >= min_score:
-                matches.append({
-                    'business': business,
-                    'score': score,
-                    'matched_at': datetime.utcnow()
-                })
-
-        # Sort matches by score in descending order
-        matches.sort(key=lambda x: x['score'], reverse=True)
-        return matches
+        Returns list of businesses with match scores, best first, paged like
+        find_matches
+        """
+        # Only candidates that can still reach min_score are scored
+        columns = await _snapshot_candidates(business_snapshot, opportunity, min_score)
+        text_similarities = None
+        if settings.MATCH_TEXT_ENABLED:
+            [text_similarities] = await _snapshot_call(
+                business_snapshot.text_similarities,
+                [opportunity_text(opportunity.title, opportunity.description)], [columns.ids]
+            )
+        scores = score_business_columns(opportunity, columns, text_similarities)
+        hits = np.flatnonzero(scores >= min_score)
+        top = select_top(columns.ids[hits], scores[hits], limit, after)
+
+        businesses = await self._load_by_id(Business, [match_id for match_id, _ in top])
+        matched_at = datetime.utcnow()
+        return [
+            {
+                'business': businesses[business_id],
+                'score': score,
+                'matched_at': matched_at
+            }
+            for business_id, score in top
+            if business_id in businesses
+        ]
+
+    async def find_nearby_businesses(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_miles: float,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Find the businesses within `radius_miles` of a point
+        Returns businesses with their distances, nearest first
+        """
+        ids, distances = await _snapshot_call(
+            business_snapshot.within, latitude, longitude, radius_miles
+        )
+        pairs = list(zip(ids.tolist(), distances.tolist()))[:limit]
+        businesses = await self._load_by_id(Business, [business_id for business_id, _ in pairs])
+        return [
+            {
+                'business': businesses[business_id],
+                'distance_miles': distance
+            }
+            for business_id, distance in pairs
+            if business_id in businesses
+        ]
+
+    async def _load_by_id(self, model, ids: List[int]) -> Dict:
+        if not ids:
+            return {}
+        rows = await self.db.scalars(select(model).where(model.id.in_(ids)))
+        return {row.id: row for row in rows}
+
+    async def rescore_business(self, business: Business) -> int:
+        """
+        Recompute the stored matches of one business
+        Returns the number of matches stored
+        """
+        min_score = settings.MATCH_STORE_MIN_SCORE
+        profile = BusinessProfile.from_business(business)
+        columns = await _snapshot_candidates(opportunity_snapshot, profile, min_score)
+        text_similarities = await _capability_similarities(business, columns.ids)
+        scores = score_opportunity_columns(profile, columns, text_similarities)
+        hits = np.flatnonzero(scores >= min_score)
+
+        computed_at = datetime.utcnow()
+        rows = [
+            {
+                'business_id': business.id,
+                'opportunity_id': opportunity_id,
+                'score': float(score),
+                'computed_at': computed_at
+            }
+            for opportunity_id, score in zip(columns.ids[hits].tolist(), scores[hits])
+        ]
+
+        await self.db.execute(delete(Match).where(Match.business_id == business.id))
+        if rows:
+            await self.db.execute(insert(Match), rows)
+        await self.db.commit()
+        return len(rows)
+
+    async def rescore_opportunities(self, opportunity_ids: Iterable[int]) -> int:
+        """
+        Recompute the stored matches of the given opportunities, dropping the
+        matches of any that are no longer active
+        Returns the number of matches stored
+        """
+        opportunity_ids = list(opportunity_ids)
+        if not opportunity_ids:
+            return 0
+
+        min_score = settings.MATCH_STORE_MIN_SCORE
+        computed_at = datetime.utcnow()
+        stored = 0
+        for i in range(0, len(opportunity_ids), 1000):
+            chunk = opportunity_ids[i:i + 1000]
+            opportunities = (await self.db.scalars(
+                select(Opportunity).where(
+                    Opportunity.id.in_(chunk),
+                    Opportunity.status == 'active'
+                )
+            )).all()
+
+            candidates = [
+                await _snapshot_candidates(business_snapshot, opportunity, min_score)
+                for opportunity in opportunities
+            ]
+            # One sparse product scores the text of the whole chunk
+            text_similarities = [None] * len(opportunities)
+            if settings.MATCH_TEXT_ENABLED:
+                text_similarities = await _snapshot_call(
+                    business_snapshot.text_similarities,
+                    [opportunity_text(opp.title, opp.description) for opp in opportunities],
+                    [columns.ids for columns in candidates]
+                )
+
+            rows = []
+            for opportunity, columns, similarities in zip(
+                opportunities, candidates, text_similarities
+            ):
+                scores = score_business_columns(opportunity, columns, similarities)
+                hits = np.flatnonzero(scores >= min_score)
+                rows.extend(
+                    {
+                        'business_id': business_id,
+                        'opportunity_id': opportunity.id,
+                        'score': float(score),
+                        'computed_at': computed_at
+                    }
+                    for business_id, score in zip(columns.ids[hits].tolist(), scores[hits])
+                )
+
+            await self.db.execute(delete(Match).where(Match.opportunity_id.in_(chunk)))
+            if rows:
+                await self.db.execute(insert(Match), rows)
+            await self.db.commit()
+            stored += len(rows)
+        return stored
+
+    def _stored_query(self, model, side, other_side, side_id, min_score, after):
+        query = select(Match, model).join(
+            model, model.id == other_side
+        ).where(
+            side == side_id,
+            Match.score >= min_score
+        )
+        if after is not None:
+            after_score, after_id = after
+            query = query.where(or_(
+                Match.score < after_score,
+                and_(Match.score == after_score, other_side > after_id)
+            ))
+        return query.order_by(Match.score.desc(), other_side.asc())
+
+    async def get_stored_matches(
+        self,
+        business_id: int,
+        min_score: float = 0.6,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        status: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Read the stored matching opportunities of a business, best first
+        Only valid for min_score >= MATCH_STORE_MIN_SCORE. Rows are fetched
+        in batches, so the result can be streamed without loading it all.
+        """
+        query = self._stored_query(
+            Opportunity, Match.business_id, Match.opportunity_id,
+            business_id, min_score, after
+        )
+        if status:
+            query = query.where(Opportunity.status == status)
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.db.stream(query.execution_options(yield_per=500))
+        async for match, opportunity in result:
+            yield {
+                'opportunity': opportunity,
+                'score': match.score,
+                'matched_at': match.computed_at
+            }
+
+    async def get_stored_businesses(
+        self,
+        opportunity_id: int,
+        min_score: float = 0.6,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Read the stored matching businesses of an opportunity, best first
+        Only valid for min_score >= MATCH_STORE_MIN_SCORE
+        """
+        query = self._stored_query(
+            Business, Match.opportunity_id, Match.business_id,
+            opportunity_id, min_score, after
+        )
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.db.stream(query.execution_options(yield_per=500))
+        async for match, business in result:
+            yield {
+                'business': business,
+                'score': match.score,
+                'matched_at': match.computed_at
+            }
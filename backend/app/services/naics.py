@@ -0,0 +1,135 @@
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# NAICS hierarchy depths: 2-digit sector, 3 subsector, 4 industry group,
+# 5 NAICS industry, 6 national industry
+NAICS_LEVELS = (2, 3, 4, 5, 6)
+MAX_LEVEL = NAICS_LEVELS[-1]
+
+# Share of the NAICS weight credited, indexed by the number of leading
+# digits two codes share. Shorter overlaps than a sector earn nothing.
+LEVEL_CREDIT = np.zeros(MAX_LEVEL + 1, dtype=np.float64)
+for _level, _credit in settings.NAICS_LEVEL_CREDIT.items():
+    if int(_level) in NAICS_LEVELS:
+        LEVEL_CREDIT[int(_level)] = float(_credit)
+
+
+def leading_digits(code) -> str:
+    """
+    The run of digits `code` starts with, at most six; empty for missing
+    and non-string codes
+    """
+    if not isinstance(code, str):
+        return ""
+    for position, character in enumerate(code[:MAX_LEVEL]):
+        if not character.isdigit():
+            return code[:position]
+    return code[:MAX_LEVEL]
+
+
+def naics_credit(level: int) -> float:
+    return float(LEVEL_CREDIT[level])
+
+
+def parent_code(code: str) -> Optional[str]:
+    """
+    The code one level up the hierarchy, or None for a sector
+    """
+    return code[:-1] if len(code) > NAICS_LEVELS[0] else None
+
+
+class _Node:
+    __slots__ = ("children", "owners")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.owners = []
+
+
+class NAICSTrie:
+    """
+    Prefix tree over NAICS codes, one digit per edge
+
+    The deepest node reached by walking a code is the longest prefix it
+    shares with any inserted code, so a lookup costs one step per digit
+    however many codes are stored. When codes are inserted with an owner
+    (a row position), every node on the path records it, and owners() lists
+    the rows sharing at least a given number of leading digits.
+    """
+
+    def __init__(self, codes: Iterable[str] = ()):
+        self._root = _Node()
+        self._frozen = False
+        for code in codes:
+            self.insert(code)
+
+    @classmethod
+    def from_owners(cls, owners: np.ndarray, codes: np.ndarray) -> "NAICSTrie":
+        trie = cls()
+        for owner, code in zip(owners.tolist(), codes.tolist()):
+            trie.insert(code, owner)
+        trie._freeze(trie._root)
+        trie._frozen = True
+        return trie
+
+    def insert(self, code: str, owner: Optional[int] = None) -> None:
+        # Only digits count, so missing codes never share a prefix
+        if self._frozen:
+            return
+        node = self._root
+        for digit in leading_digits(code):
+            node = node.children.setdefault(digit, _Node())
+            if owner is not None:
+                node.owners.append(owner)
+
+    def _freeze(self, node: _Node) -> None:
+        for child in node.children.values():
+            child.owners = np.unique(np.array(child.owners, dtype=np.int64))
+            self._freeze(child)
+
+    def _path(self, code: str) -> List[_Node]:
+        path = []
+        node = self._root
+        for digit in leading_digits(code):
+            node = node.children.get(digit)
+            if node is None:
+                break
+            path.append(node)
+        return path
+
+    def match_level(self, code: str) -> int:
+        """
+        Number of leading digits `code` shares with the closest stored code
+        """
+        return len(self._path(code))
+
+    def owners(self, code: str, level: int) -> np.ndarray:
+        """
+        Sorted row positions whose codes share at least `level` leading
+        digits with `code`
+        """
+        path = self._path(code)
+        if level < 1 or len(path) < level:
+            return np.empty(0, dtype=np.int64)
+        return path[level - 1].owners
+
+
+def shared_levels(codes: np.ndarray, code: str) -> np.ndarray:
+    """
+    For each code in `codes`, the number of leading digits it shares with
+    `code`, as NAICSTrie.match_level computes it for a single stored code
+    """
+    levels = np.zeros(len(codes), dtype=np.int64)
+    digits = leading_digits(code)
+    if not len(codes):
+        return levels
+    # Matching a run of digits implies the stored code starts with digits too
+    for length in range(1, len(digits) + 1):
+        hit = codes.astype(f"<U{length}") == digits[:length]
+        if not hit.any():
+            break
+        levels[hit] = length
+    return levels
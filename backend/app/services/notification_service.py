@@ -1,19 +1,21 @@
-from typing import List, Dict
-from twilio.rest import Client
+import asyncio
+import logging
+from typing import List, Dict, Optional
 from app.core.config import get_settings
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from app.core.mail import mail_queue
+from app.core.sms import sms_queue
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
-class NotificationService:
-    def __init__(self):
-        self.twilio_client = Client(
-            settings.TWILIO_ACCOUNT_SID,
-            settings.TWILIO_AUTH_TOKEN
-        )
 
+def _log_undelivered(kind: str, recipient: str):
+    def done(future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None or not future.result():
+            logger.warning("%s to %s was not delivered", kind, recipient)
+    return done
+
+class NotificationService:
     async def send_email_notification(
         self,
         to_email: str,
@@ -21,25 +23,10 @@ class NotificationService:
         content: str
     ) -> bool:
         """
-        Send an email notification using SMTP
+        Send an email notification through the shared mail queue
+        Returns whether it was delivered; the queue retries transient failures
         """
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = "notifications@samshortlist.com"
-            msg['To'] = to_email
-            msg['Subject'] = subject
-
-            msg.attach(MIMEText(content, 'html'))
-
-            with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                server.starttls()
-                server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-                server.send_message(msg)
-
-            return True
-        except Exception as e:
-            print(f"Failed to send email: {str(e)}")
-            return False
+        return await mail_queue.send(to_email, subject, content)
 
     async def send_sms_notification(
         self,
@@ -47,18 +34,38 @@ class NotificationService:
         message: str
     ) -> bool:
         """
-        Send an SMS notification using Twilio
+        Send an SMS notification through the shared SMS queue
+        Returns whether it was delivered; repeats of a recent message are
+        sent once
         """
-        try:
-            self.twilio_client.messages.create(
-                body=message,
-                from_=settings.TWILIO_PHONE_NUMBER,
-                to=to_number
-            )
-            return True
-        except Exception as e:
-            print(f"Failed to send SMS: {str(e)}")
-            return False
+        return await sms_queue.send(to_number, message)
+
+    def queue_email_notification(
+        self,
+        to_email: str,
+        subject: str,
+        content: str
+    ) -> asyncio.Future:
+        """
+        Queue an email notification without waiting for delivery
+        Returns the delivery future; undelivered messages are logged
+        """
+        future = mail_queue.enqueue(to_email, subject, content)
+        future.add_done_callback(_log_undelivered("email", to_email))
+        return future
+
+    def queue_sms_notification(
+        self,
+        to_number: str,
+        message: str
+    ) -> asyncio.Future:
+        """
+        Queue an SMS notification without waiting for delivery
+        Returns the delivery future; undelivered messages are logged
+        """
+        future = sms_queue.enqueue(to_number, message)
+        future.add_done_callback(_log_undelivered("SMS", to_number))
+        return future
 
     async def notify_new_match(
         self,
@@ -108,6 +115,77 @@ class NotificationService:
                 message=sms_content
             )
 
+    def queue_new_matches(
+        self,
+        business: Dict,
+        matches: List[Dict],
+        notification_preferences: Dict,
+        total: Optional[int] = None
+    ) -> List[asyncio.Future]:
+        """
+        Queue one digest of several new matching opportunities for a business
+        `total` is how many matched when only the best are listed
+        Returns the delivery futures without waiting on them
+        """
+        queued = []
+        if not matches:
+            return queued
+        total = max(total or 0, len(matches))
+        more = total - len(matches)
+
+        # Email notification
+        if notification_preferences.get('email'):
+            email_content = f"""
+            <h2>{total} New Matching Opportunities Found!</h2>
+            <ul>
+            """
+
+            for opp in matches:
+                value = (
+                    f"Value: ${opp['contract_value']:,.2f}<br>"
+                    if opp.get('contract_value') is not None else ""
+                )
+                email_content += f"""
+                <li>
+                    <strong>{opp['title']}</strong><br>
+                    Match Score: {opp['score'] * 100:.1f}%<br>
+                    Agency: {opp['agency']}<br>
+                    {value}
+                    Deadline: {opp['response_deadline']}<br>
+                    <a href="https://samshortlist.com/opportunities/{opp['id']}">
+                        View Details
+                    </a>
+                </li>
+                """
+
+            email_content += "</ul>"
+            if more:
+                email_content += f"<p>...and {more} more on Sam Shortlist.</p>"
+
+            queued.append(self.queue_email_notification(
+                to_email=notification_preferences['email'],
+                subject="New Matching Opportunities - Sam Shortlist",
+                content=email_content
+            ))
+
+        # SMS notification
+        if notification_preferences.get('sms'):
+            sms_content = f"{total} new matching opportunities:\n\n"
+            for opp in matches:
+                sms_content += (
+                    f"- {opp['title']} ({opp['score'] * 100:.0f}%)\n"
+                    f"  https://samshortlist.com/opportunities/{opp['id']}\n"
+                )
+            if more:
+                sms_content += f"...and {more} more"
+
+            queued.append(self.queue_sms_notification(
+                to_number=notification_preferences['sms'],
+                message=sms_content
+            ))
+
+        return queued
+
     async def notify_deadline_reminder(
         self,
         business: Dict,
@@ -117,8 +195,23 @@ class NotificationService:
         """
         Send reminders for upcoming opportunity deadlines
         """
+        await asyncio.gather(*self.queue_deadline_reminder(
+            business, opportunities, notification_preferences
+        ))
+
+    def queue_deadline_reminder(
+        self,
+        business: Dict,
+        opportunities: List[Dict],
+        notification_preferences: Dict
+    ) -> List[asyncio.Future]:
+        """
+        Queue reminders for upcoming opportunity deadlines
+        Returns the delivery futures without waiting on them
+        """
+        queued = []
         if not opportunities:
-            return
+            return queued
 
         # Email notification
         if notification_preferences.get('email'):
@@ -141,11 +234,11 @@ class NotificationService:
             
             email_content += "</ul>"
             
-            await self.send_email_notification(
+            queued.append(self.queue_email_notification(
                 to_email=notification_preferences['email'],
                 subject="Upcoming Deadlines - Sam Shortlist",
                 content=email_content
-            )
+            ))
 
         # SMS notification
         if notification_preferences.get('sms'):
@@ -156,7 +249,9 @@ class NotificationService:
                     f"  Deadline: {opp['response_deadline']}\n"
                 )
             
-            await self.send_sms_notification(
+            queued.append(self.queue_sms_notification(
                 to_number=notification_preferences['sms'],
                 message=sms_content
-            )
+            ))
+
+        return queued
@@ -0,0 +1,317 @@
+import asyncio
+import heapq
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, or_, select
+from app.core.config import get_settings
+from app.db.locks import advisory_xact_lock
+from app.db.session import AsyncSessionLocal
+from app.models.business import Business
+from app.models.match import Match
+from app.models.opportunity import Opportunity
+from app.models.sync_state import SyncState
+from app.services.notification_service import NotificationService
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+REMINDER_SOURCE = "reminders/deadlines"
+
+# (fire at, opportunity id, lead hours, deadline)
+Reminder = Tuple[datetime, int, int, datetime]
+
+
+class ReminderScheduler:
+    """
+    Sends each business a digest of its matched opportunities as their
+    response deadlines come within REMINDER_LEAD_HOURS
+
+    Every active opportunity with a future deadline has one heap entry per
+    lead time, ordered by when it is due, and the scheduler sleeps until the
+    earliest one; nothing polls the opportunities table. Entries due within
+    REMINDER_COALESCE_SECONDS of each other go out together, one digest per
+    business, naming only the opportunities it matched at
+    REMINDER_MIN_SCORE or better. Changed deadlines and closed notices are
+    handled lazily: an entry only fires if its deadline is still the
+    opportunity's current one.
+
+    The time up to which reminders have been sent is kept in sync_states,
+    so after a restart the heap is rebuilt from one range scan of the
+    (status, response_deadline) index, and reminders that fell due while
+    the process was down are sent straight away. Each API worker process
+    runs its own scheduler; an advisory lock and that stored time make sure
+    each digest is sent by only one of them.
+    """
+
+    def __init__(self):
+        self._heap: List[Reminder] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._watermark: Optional[datetime] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "fired": 0,
+            "stale_skipped": 0,
+            "already_sent": 0,
+            "digests": 0,
+            "opportunities_reminded": 0,
+        }
+
+    @property
+    def leads(self) -> List[timedelta]:
+        return [timedelta(hours=hours) for hours in settings.REMINDER_LEAD_HOURS]
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "tracked_opportunities": len(self._deadlines),
+            "scheduled": len(self._heap),
+            "next_due": self._heap[0][0].isoformat() if self._heap else None,
+            "sent_through": self._watermark.isoformat() if self._watermark else None,
+        }
+
+    async def rebuild(self) -> int:
+        """
+        Reload every active opportunity with a future deadline
+        Returns the number of opportunities tracked
+        """
+        self._heap = []
+        self._deadlines = {}
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            state = await db.get(SyncState, REMINDER_SOURCE)
+            # Without a record of what was sent, don't replay anything
+            self._watermark = state.watermark if state and state.watermark else now
+            result = await db.stream(
+                select(Opportunity.id, Opportunity.response_deadline)
+                .where(
+                    Opportunity.status == 'active',
+                    Opportunity.response_deadline > now
+                )
+                .order_by(Opportunity.response_deadline)
+                .execution_options(yield_per=5000)
+            )
+            async for opportunity_id, deadline in result:
+                self._schedule(opportunity_id, deadline)
+        heapq.heapify(self._heap)
+        self._notify()
+        return len(self._deadlines)
+
+    async def track(self, opportunity_ids: Iterable[int]) -> None:
+        """
+        Pick up new, changed or closed opportunities, e.g. after a sync
+        """
+        opportunity_ids = list(opportunity_ids)
+        # Until the first rebuild has run, it will pick these up itself
+        if not opportunity_ids or self._watermark is None:
+            return
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            for i in range(0, len(opportunity_ids), 1000):
+                rows = await db.execute(
+                    select(Opportunity.id, Opportunity.status, Opportunity.response_deadline)
+                    .where(Opportunity.id.in_(opportunity_ids[i:i + 1000]))
+                )
+                for opportunity_id, status, deadline in rows:
+                    if status != 'active' or deadline is None or deadline <= now:
+                        self._deadlines.pop(opportunity_id, None)
+                    elif self._deadlines.get(opportunity_id) != deadline:
+                        self._schedule(opportunity_id, deadline, push=True)
+        self._notify()
+
+    def _schedule(self, opportunity_id: int, deadline: datetime, push: bool = False) -> None:
+        self._deadlines[opportunity_id] = deadline
+        for lead in self.leads:
+            fire_at = deadline - lead
+            if fire_at <= self._watermark:
+                continue
+            entry = (fire_at, opportunity_id, int(lead.total_seconds() // 3600), deadline)
+            if push:
+                heapq.heappush(self._heap, entry)
+            else:
+                self._heap.append(entry)
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pop_due(self, now: datetime) -> List[Reminder]:
+        horizon = now + timedelta(seconds=settings.REMINDER_COALESCE_SECONDS)
+        due = []
+        while self._heap and self._heap[0][0] <= horizon:
+            entry = heapq.heappop(self._heap)
+            if self._deadlines.get(entry[1]) != entry[3]:
+                self.counters["stale_skipped"] += 1
+                continue
+            due.append(entry)
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.rebuild()
+                break
+            except Exception:
+                logger.exception("could not load deadline reminders; retrying")
+                await asyncio.sleep(60)
+
+        while True:
+            self._wakeup.clear()
+            now = datetime.utcnow()
+            if self._heap and self._heap[0][0] <= now:
+                due = self._pop_due(now)
+                if due:
+                    try:
+                        digests = await self._record(due)
+                    except Exception:
+                        # Nothing was recorded, so nothing has been sent
+                        logger.exception("deadline reminders failed; retrying")
+                        for entry in due:
+                            heapq.heappush(self._heap, entry)
+                        await asyncio.sleep(60)
+                        continue
+                    self._send(digests)
+                continue
+            timeout = (
+                (self._heap[0][0] - now).total_seconds() if self._heap else None
+            )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire(self, due: List[Reminder]) -> int:
+        """
+        Record a batch of due reminders as sent and queue their digests
+        Returns the number of digests queued
+        """
+        return self._send(await self._record(due))
+
+    async def _record(self, due: List[Reminder]) -> List[Tuple[Business, List[Opportunity]]]:
+        """
+        Advance the stored watermark over a batch of due reminders
+        Returns the digests that are now this process's to send
+
+        Every API worker process runs a scheduler with the same heap, so
+        this runs under an advisory lock and the heap only says when to look:
+        the digests cover every reminder between the stored watermark and
+        the batch, read from the database. Whichever process gets there
+        first sends them; the others find the watermark already past their
+        batch and send nothing.
+        """
+        now = datetime.utcnow()
+        self.counters["fired"] += len(due)
+        sent_through = max(entry[0] for entry in due)
+
+        async with AsyncSessionLocal() as db:
+            await advisory_xact_lock(db, REMINDER_SOURCE)
+            state = await db.get(SyncState, REMINDER_SOURCE)
+            sent_from = state.watermark if state and state.watermark else self._watermark
+            if sent_from is not None and sent_through <= sent_from:
+                self.counters["already_sent"] += len(due)
+                self._watermark = max(self._watermark or sent_from, sent_from)
+                return []
+            sent_from = sent_from or now
+
+            # Reminders fall due `lead` before each deadline, so those due
+            # in (sent_from, sent_through] have deadlines in that range
+            # shifted by the lead; one range of the deadline index per lead
+            rows = await db.execute(
+                select(Match.business_id, Opportunity)
+                .join(Opportunity, Opportunity.id == Match.opportunity_id)
+                .where(
+                    Opportunity.status == 'active',
+                    Opportunity.response_deadline > now,
+                    or_(*[
+                        and_(
+                            Opportunity.response_deadline > sent_from + lead,
+                            Opportunity.response_deadline <= sent_through + lead
+                        )
+                        for lead in self.leads
+                    ]),
+                    Match.score >= settings.REMINDER_MIN_SCORE
+                )
+            )
+            digests = defaultdict(dict)
+            for business_id, opportunity in rows:
+                digests[business_id][opportunity.id] = opportunity
+
+            businesses = {}
+            business_ids = sorted(digests)
+            for i in range(0, len(business_ids), 1000):
+                rows = await db.scalars(
+                    select(Business).where(Business.id.in_(business_ids[i:i + 1000]))
+                )
+                businesses.update((business.id, business) for business in rows)
+
+            # Recorded before anything is queued, so neither a retry nor a
+            # restart repeats a digest; the mail and SMS queues retry
+            # delivery themselves
+            if state is None:
+                state = SyncState(source=REMINDER_SOURCE)
+                db.add(state)
+            state.watermark = sent_through
+            state.last_success_at = now
+            await db.commit()
+        self._watermark = max(self._watermark or sent_through, sent_through)
+
+        return [
+            (
+                businesses[business_id],
+                sorted(opportunities.values(), key=lambda opp: (opp.response_deadline, opp.id))
+            )
+            for business_id, opportunities in digests.items()
+            if business_id in businesses
+            and _wants_reminders(businesses[business_id].notification_preferences)
+        ]
+
+    def _send(self, digests: List[Tuple[Business, List[Opportunity]]]) -> int:
+        # Only queues the messages; a slow SMS batch never holds up the
+        # reminders due after it
+        notifications = NotificationService()
+        queued = 0
+        for business, opportunities in digests:
+            try:
+                notifications.queue_deadline_reminder(
+                    {'id': business.id, 'name': business.name},
+                    [
+                        {
+                            'id': opp.id,
+                            'title': opp.title,
+                            'response_deadline': opp.response_deadline,
+                        }
+                        for opp in opportunities
+                    ],
+                    business.notification_preferences
+                )
+            except Exception:
+                logger.exception("could not queue the deadline reminder of business %s", business.id)
+                continue
+            queued += 1
+            self.counters["digests"] += 1
+            self.counters["opportunities_reminded"] += len(opportunities)
+        return queued
+
+
+def _wants_reminders(preferences: Optional[Dict]) -> bool:
+    preferences = preferences or {}
+    return bool(
+        preferences.get('deadline_reminders', True)
+        and (preferences.get('email') or preferences.get('sms'))
+    )
+
+
+reminder_scheduler = ReminderScheduler()
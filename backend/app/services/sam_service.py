@@ -1,19 +1,150 @@
-import httpx
-from typing import Dict, List, Optional
-from datetime import datetime
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from app.core.cache import response_cache
 from app.core.config import get_settings
+from app.core.streaming import iter_json_items
+from app.core.upstream import upstream
 
 settings = get_settings()
 
+# Marks the end of one page in the notice queue of iter_opportunities
+_PAGE_DONE = object()
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a SAM.gov timestamp into a naive UTC datetime
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _code_or_name(value) -> Optional[str]:
+    if isinstance(value, dict):
+        return value.get("code") or value.get("name")
+    return value
+
+def notice_posted_at(record: Dict) -> Optional[datetime]:
+    """
+    When SAM.gov posted a normalized notice
+    """
+    return _parse_datetime((record.get("source_data") or {}).get("postedDate"))
+
+def normalize_opportunity(notice: Dict) -> Dict:
+    """
+    Map a SAM.gov opportunity notice onto Opportunity columns
+    """
+    award = notice.get("award") or {}
+    place = notice.get("placeOfPerformance") or {}
+    amount = award.get("amount")
+    try:
+        contract_value = float(amount) if amount not in (None, "") else None
+    except (TypeError, ValueError):
+        contract_value = None
+
+    return {
+        "notice_id": notice["noticeId"],
+        "title": notice.get("title"),
+        "description": notice.get("description"),
+        "agency": notice.get("fullParentPathName") or notice.get("department"),
+        "naics_code": notice.get("naicsCode"),
+        "contract_value": contract_value,
+        "response_deadline": _parse_datetime(notice.get("responseDeadLine")),
+        "location": {
+            "city": _code_or_name(place.get("city")),
+            "state": _code_or_name(place.get("state")),
+            "zip": place.get("zip"),
+            "country": _code_or_name(place.get("country")),
+        },
+        "requirements": {
+            "type": notice.get("type"),
+            "set_aside": notice.get("typeOfSetAside"),
+            "solicitation_number": notice.get("solicitationNumber"),
+        },
+        "status": "active" if notice.get("active", "Yes") == "Yes" else "expired",
+        "source": "sam.gov",
+        "source_data": notice,
+    }
+
 class SAMService:
     def __init__(self):
         self.api_key = settings.SAM_API_KEY
         self.base_url = "https://api.sam.gov/entity-information/v3"
+        self.opportunities_url = settings.SAM_OPPORTUNITIES_URL
         self.headers = {
             "X-Api-Key": self.api_key,
             "Accept": "application/json"
         }
 
+    def _opportunity_params(
+        self,
+        naics_code: Optional[str],
+        keyword: Optional[str],
+        posted_from: Optional[datetime],
+        posted_to: Optional[datetime]
+    ) -> Dict:
+        params = {"api_key": self.api_key}
+
+        if naics_code:
+            params["ncode"] = naics_code
+        if keyword:
+            params["title"] = keyword
+        if posted_from:
+            params["postedFrom"] = posted_from.strftime("%m/%d/%Y")
+            # The search API rejects a postedFrom without a postedTo
+            params["postedTo"] = (posted_to or datetime.now()).strftime("%m/%d/%Y")
+        elif posted_to:
+            params["postedTo"] = posted_to.strftime("%m/%d/%Y")
+        return params
+
+    async def _stream_opportunity_page(
+        self,
+        params: Dict,
+        offset: int,
+        limit: int,
+        meta: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield the raw notices of one page of the opportunity search as the
+        response body is parsed; the total record count lands in
+        meta["totalRecords"]
+        """
+        async with upstream.stream(
+            "GET",
+            self.opportunities_url,
+            api_key=self.api_key,
+            params={**params, "offset": offset, "limit": limit},
+            headers=self.headers
+        ) as response:
+            response.raise_for_status()
+            async for notice in iter_json_items(
+                response.aiter_bytes(), "opportunitiesData.item", meta
+            ):
+                yield notice
+
+    async def _fetch_opportunity_page(
+        self,
+        params: Dict,
+        offset: int,
+        limit: int
+    ) -> Tuple[int, List[Dict]]:
+        """
+        Fetch one page of the opportunity search
+        Returns the total record count and the raw notices on the page
+        """
+        meta: Dict = {}
+        notices = [
+            notice
+            async for notice in self._stream_opportunity_page(params, offset, limit, meta)
+        ]
+        return int(meta.get("totalRecords") or 0), notices
+
     async def search_opportunities(
         self,
         naics_code: Optional[str] = None,
@@ -24,42 +155,94 @@ class SAMService:
     ) -> List[Dict]:
         """
         Search for subcontracting opportunities in SAM.gov
+        Returns the first page of raw notices only; use iter_opportunities
+        for the full result set
         """
-        params = {
-            "api_key": self.api_key,
-            "limit": limit,
-        }
+        params = self._opportunity_params(naics_code, keyword, posted_from, posted_to)
+        _, notices = await self._fetch_opportunity_page(params, 0, limit)
+        return notices
 
-        if naics_code:
-            params["naicsCode"] = naics_code
-        if keyword:
-            params["keywords"] = keyword
-        if posted_from:
-            params["postedFrom"] = posted_from.isoformat()
-        if posted_to:
-            params["postedTo"] = posted_to.isoformat()
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/opportunities",
-                params=params,
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()["opportunities"]
+    async def iter_opportunities(
+        self,
+        naics_code: Optional[str] = None,
+        keyword: Optional[str] = None,
+        posted_from: Optional[datetime] = None,
+        posted_to: Optional[datetime] = None,
+        page_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield every matching notice, normalized, across all result pages
+
+        The first page reports the total; the remaining offsets are fetched
+        by at most `concurrency` workers at once. Pages are parsed as they
+        stream in and their notices yielded in arrival order, and at most
+        SAM_STREAM_BUFFER parsed notices wait to be consumed, so memory
+        stays flat whatever the page size and a slow consumer throttles the
+        fetching.
+        """
+        page_size = page_size or settings.SAM_PAGE_SIZE
+        concurrency = concurrency or settings.SAM_MAX_CONCURRENCY
+        params = self._opportunity_params(naics_code, keyword, posted_from, posted_to)
+
+        meta: Dict = {}
+        async for notice in self._stream_opportunity_page(params, 0, page_size, meta):
+            yield normalize_opportunity(notice)
+        total = int(meta.get("totalRecords") or 0)
 
+        offsets: asyncio.Queue = asyncio.Queue()
+        for offset in range(page_size, total, page_size):
+            offsets.put_nowait(offset)
+        remaining = offsets.qsize()
+        notices: asyncio.Queue = asyncio.Queue(maxsize=settings.SAM_STREAM_BUFFER)
+
+        async def worker():
+            while True:
+                try:
+                    offset = offsets.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    async for notice in self._stream_opportunity_page(
+                        params, offset, page_size
+                    ):
+                        await notices.put(normalize_opportunity(notice))
+                except Exception as e:
+                    await notices.put(e)
+                    return
+                await notices.put(_PAGE_DONE)
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(concurrency, remaining))
+        ]
+        try:
+            while remaining:
+                notice = await notices.get()
+                if isinstance(notice, Exception):
+                    raise notice
+                if notice is _PAGE_DONE:
+                    remaining -= 1
+                    continue
+                yield notice
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    @response_cache.cached("sam.entity_details")
     async def get_entity_details(self, cage_code: str) -> Dict:
         """
         Get detailed information about an entity using CAGE code
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/entities",
-                params={"cageCode": cage_code},
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()["entityData"]
+        response = await upstream.get(
+            f"{self.base_url}/entities",
+            api_key=self.api_key,
+            params={"cageCode": cage_code},
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["entityData"]
 
     async def get_contract_awards(
         self,
@@ -80,11 +263,11 @@ class SAMService:
         if end_date:
             params["endDate"] = end_date.isoformat()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/awards",
-                params=params,
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()["awards"]
+        response = await upstream.get(
+            f"{self.base_url}/awards",
+            api_key=self.api_key,
+            params=params,
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["awards"]
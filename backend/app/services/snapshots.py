@@ -0,0 +1,463 @@
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.models.business import Business, business_naics
+from app.models.opportunity import Opportunity
+from app.services.match_index import (
+    InvertedIndex,
+    LocationIndex,
+    PrefixIndex,
+    business_candidates,
+    opportunity_candidates,
+)
+from app.services.geo import coordinates_of
+from app.services.match_scoring import (
+    BusinessColumns,
+    BusinessProfile,
+    OpportunityColumns,
+    encode_key,
+)
+from app.services.text_index import TextIndex, capability_text, opportunity_text
+
+settings = get_settings()
+
+
+class SnapshotRow:
+    """
+    The matching-relevant fields of one active opportunity
+    """
+    __slots__ = (
+        "id", "naics", "state", "contract_value", "deadline", "latitude", "longitude"
+    )
+
+    def __init__(self, id, naics, state, contract_value, deadline, latitude, longitude):
+        self.id = id
+        self.naics = naics
+        self.state = state
+        self.contract_value = contract_value
+        self.deadline = deadline
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def values(self) -> tuple:
+        # NaN never equals itself, so missing coordinates compare as None
+        return (
+            self.id, self.naics, self.state, self.contract_value, self.deadline,
+            None if math.isnan(self.latitude) else self.latitude,
+            None if math.isnan(self.longitude) else self.longitude
+        )
+
+
+def _profile_values(profile: BusinessProfile) -> tuple:
+    avg = profile.avg_contract_value
+    return (
+        frozenset(profile.naics_codes),
+        profile.state,
+        None if math.isnan(avg) else avg,
+        frozenset(profile.past_naics_codes),
+        None if math.isnan(profile.latitude) else (profile.latitude, profile.longitude)
+    )
+
+
+class ResidentSnapshot:
+    """
+    Base for the process-resident column stores used by matching
+
+    Only the columns matching reads are loaded, never the large JSON blobs.
+    Refreshes are incremental: each one reads the rows whose updated_at is at
+    or after the newest timestamp seen so far, less
+    MATCH_SNAPSHOT_OVERLAP_SECONDS, and the column arrays and indexes are
+    only rebuilt when something actually changed.
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        if refresh_interval is None:
+            refresh_interval = settings.MATCH_SNAPSHOT_REFRESH_SECONDS
+        self.refresh_interval = refresh_interval
+        self._rows: Dict[int, object] = {}
+        self._watermark: Optional[datetime] = None
+        self._last_refresh: Optional[float] = None
+        self._built = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def refresh(self, db: Session) -> int:
+        """
+        Pull rows changed since the last refresh
+        Returns the number of rows added, updated or dropped
+        """
+        with self._lock:
+            return self._refresh(db)
+
+    def mark_stale(self) -> None:
+        """
+        Force the next read to refresh
+        """
+        self._last_refresh = None
+
+    def _get_built(self, db: Session):
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._last_refresh is None
+                or now - self._last_refresh >= self.refresh_interval
+            ):
+                self._refresh(db)
+            if self._built is None:
+                self._built = self._build()
+            return self._built
+
+    @property
+    def _changed_since(self) -> Optional[datetime]:
+        # updated_at is stamped by the writer before its transaction commits,
+        # so a concurrent sync or backfill batch can commit rows older than
+        # the newest one already seen. Those are caught by re-reading an
+        # overlap; rows that did not change compare equal and are skipped.
+        if self._watermark is None:
+            return None
+        return self._watermark - timedelta(seconds=settings.MATCH_SNAPSHOT_OVERLAP_SECONDS)
+
+    def _advance_watermark(self, updated_at: Optional[datetime]) -> None:
+        if updated_at and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _refresh(self, db: Session) -> int:
+        changed = self._load_changes(db)
+        self._last_refresh = time.monotonic()
+        if changed:
+            self._built = None
+        return changed
+
+    def _load_changes(self, db: Session) -> int:
+        raise NotImplementedError
+
+    def _build(self):
+        raise NotImplementedError
+
+
+class OpportunitySnapshot(ResidentSnapshot):
+    """
+    Column store of active opportunities, indexed by NAICS code (exact and
+    by prefix) and location (state and coordinates)
+    """
+
+    def get_columns(self, db: Session) -> OpportunityColumns:
+        """
+        Return column arrays for all active opportunities, refreshing first
+        if the snapshot is older than the refresh interval
+        """
+        return self._get_built(db)[0]
+
+    def get_candidates(
+        self,
+        db: Session,
+        profile: BusinessProfile,
+        min_score: float
+    ) -> OpportunityColumns:
+        """
+        Return the columns of the active opportunities that can still reach
+        `min_score` for this business profile
+        """
+        columns, naics_index, location_index = self._get_built(db)
+        rows = opportunity_candidates(profile, naics_index, location_index, min_score)
+        return columns if rows is None else columns.take(rows)
+
+    def _load_changes(self, db: Session) -> int:
+        query = db.query(
+            Opportunity.id,
+            Opportunity.naics_code,
+            Opportunity.location['state'].as_string().label('state'),
+            Opportunity.location['coordinates'].label('coordinates'),
+            Opportunity.contract_value,
+            Opportunity.response_deadline,
+            Opportunity.status,
+            Opportunity.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(Opportunity.updated_at >= self._changed_since)
+
+        changed = 0
+        for row in query.yield_per(5000):
+            if row.status == 'active':
+                record = SnapshotRow(
+                    row.id,
+                    encode_key(row.naics_code),
+                    encode_key(row.state),
+                    row.contract_value,
+                    row.response_deadline,
+                    *coordinates_of({'coordinates': row.coordinates})
+                )
+                existing = self._rows.get(row.id)
+                if existing is None or existing.values() != record.values():
+                    self._rows[row.id] = record
+                    changed += 1
+            elif self._rows.pop(row.id, None) is not None:
+                changed += 1
+            self._advance_watermark(row.updated_at)
+        return changed
+
+    def _build(self):
+        rows = list(self._rows.values())
+        columns = OpportunityColumns(
+            ids=np.array([row.id for row in rows], dtype=np.int64),
+            naics=np.array([row.naics for row in rows], dtype=str),
+            states=np.array([row.state for row in rows], dtype=str),
+            contract_values=np.array(
+                [np.nan if row.contract_value is None else row.contract_value
+                 for row in rows],
+                dtype=np.float64
+            ),
+            deadlines=np.array(
+                [row.deadline for row in rows], dtype="datetime64[s]"
+            ),
+            latitudes=np.array([row.latitude for row in rows], dtype=np.float64),
+            longitudes=np.array([row.longitude for row in rows], dtype=np.float64)
+        )
+        return (
+            columns,
+            PrefixIndex(InvertedIndex.from_column(columns.naics)),
+            LocationIndex(columns.states, columns.latitudes, columns.longitudes)
+        )
+
+
+class OpportunityTextSnapshot(ResidentSnapshot):
+    """
+    TF-IDF index over the titles and descriptions of active opportunities
+
+    Kept apart from OpportunitySnapshot because the text is by far the
+    largest thing matching reads: each refresh tokenizes only the notices
+    that changed, and the first one starts from the file written by
+    scripts/build_text_index.py when TEXT_INDEX_PATH is set.
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None, path: Optional[str] = None):
+        super().__init__(refresh_interval)
+        self.path = settings.TEXT_INDEX_PATH if path is None else path
+        self.index = TextIndex()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get_idf(self, db: Session) -> Tuple[int, np.ndarray]:
+        """
+        Return the (version, IDF weights) of the active notices, refreshing
+        first if the snapshot is older than the refresh interval
+        """
+        self._get_built(db)
+        with self._lock:
+            return self.index.idf()
+
+    def current_idf(self) -> Tuple[int, np.ndarray]:
+        """
+        The IDF weights as of the last refresh, without touching the database
+        """
+        with self._lock:
+            return self.index.idf()
+
+    def similarities(
+        self,
+        db: Session,
+        texts: List[str],
+        ids: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """
+        Cosine similarity of each text against the opportunities with the
+        given ids, scored as one batch
+        """
+        self._get_built(db)
+        with self._lock:
+            return self.index.similarities(texts, ids)
+
+    def save(self, path: str) -> None:
+        """
+        Write the index and the watermark it is current to
+        """
+        with self._lock:
+            watermark = self._watermark.isoformat() if self._watermark else ""
+            self.index.save(path, watermark=watermark)
+
+    def _load_file(self) -> int:
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        index, metadata = TextIndex.load(self.path)
+        # A file hashed into a different feature space can't be mixed with
+        # queries hashed into the configured one
+        if index.n_features != settings.TEXT_INDEX_FEATURES:
+            return 0
+        self.index = index
+        if metadata.get('watermark'):
+            self._watermark = datetime.fromisoformat(metadata['watermark'])
+        return len(index)
+
+    def _load_changes(self, db: Session) -> int:
+        changed = 0 if self._loaded else self._load_file()
+        query = db.query(
+            Opportunity.id,
+            Opportunity.title,
+            Opportunity.description,
+            Opportunity.status,
+            Opportunity.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(Opportunity.updated_at >= self._changed_since)
+
+        for row in query.yield_per(2000):
+            if row.status == 'active':
+                changed += self.index.upsert(
+                    row.id, opportunity_text(row.title, row.description)
+                )
+            else:
+                changed += self.index.remove(row.id)
+            self._advance_watermark(row.updated_at)
+        return changed
+
+    def _build(self):
+        # The index maintains itself; there is nothing to rebuild
+        return self.index
+
+
+class BusinessSnapshot(ResidentSnapshot):
+    """
+    Column store of business match profiles, indexed by registered NAICS code
+    (exact and by prefix), past-performance NAICS code and location, plus
+    the hashed text of their capabilities
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        super().__init__(refresh_interval)
+        self.capabilities = TextIndex()
+
+    def get_columns(self, db: Session) -> BusinessColumns:
+        """
+        Return column arrays for all businesses, refreshing first if the
+        snapshot is older than the refresh interval
+        """
+        return self._get_built(db)[0]
+
+    def get_candidates(
+        self,
+        db: Session,
+        opportunity: Opportunity,
+        min_score: float
+    ) -> BusinessColumns:
+        """
+        Return the columns of the businesses that can still reach `min_score`
+        for this opportunity
+        """
+        columns, naics_index, past_naics_index, location_index = self._get_built(db)
+        rows = business_candidates(
+            encode_key(opportunity.naics_code),
+            encode_key((opportunity.location or {}).get('state')),
+            *coordinates_of(opportunity.location),
+            naics_index,
+            past_naics_index,
+            location_index,
+            min_score
+        )
+        return columns if rows is None else columns.take(rows)
+
+    def within(
+        self,
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius_miles: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the ids of the businesses within `radius_miles` of a point and
+        their distances, nearest first
+        """
+        columns, _, _, location_index = self._get_built(db)
+        rows, distances = location_index.grid.within(latitude, longitude, radius_miles)
+        order = np.lexsort((columns.ids[rows], distances))
+        return columns.ids[rows][order], distances[order]
+
+    def text_similarities(
+        self,
+        db: Session,
+        texts: List[str],
+        ids: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """
+        Cosine similarity of each notice text against the capabilities of
+        the businesses with the given ids, with terms weighted by how rare
+        they are among the active notices
+        """
+        idf = opportunity_text_snapshot.get_idf(db)
+        self._get_built(db)
+        with self._lock:
+            return self.capabilities.similarities(texts, ids, idf)
+
+    def _load_changes(self, db: Session) -> int:
+        query = db.query(
+            Business.id,
+            Business.location['state'].as_string().label('state'),
+            Business.location['coordinates'].label('coordinates'),
+            Business.past_performance,
+            Business.capabilities,
+            Business.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(Business.updated_at >= self._changed_since)
+        rows = query.all()
+        if not rows:
+            return 0
+
+        codes = defaultdict(list)
+        codes_query = db.query(business_naics.c.business_id, business_naics.c.naics_code)
+        if self._watermark is None:
+            chunks = [codes_query]
+        else:
+            ids = [row.id for row in rows]
+            chunks = [
+                codes_query.filter(business_naics.c.business_id.in_(ids[i:i + 1000]))
+                for i in range(0, len(ids), 1000)
+            ]
+        for chunk in chunks:
+            for business_id, naics_code in chunk:
+                codes[business_id].append(naics_code)
+
+        changed = 0
+        for row in rows:
+            profile = BusinessProfile.from_fields(
+                codes[row.id],
+                {'state': row.state, 'coordinates': row.coordinates},
+                row.past_performance
+            )
+            text_changed = settings.MATCH_TEXT_ENABLED and self.capabilities.upsert(
+                row.id, capability_text(row.capabilities)
+            )
+            existing = self._rows.get(row.id)
+            if existing is None or _profile_values(existing) != _profile_values(profile):
+                self._rows[row.id] = profile
+                changed += 1
+            elif text_changed:
+                changed += 1
+            self._advance_watermark(row.updated_at)
+        return changed
+
+    def _build(self):
+        ids: List[int] = list(self._rows.keys())
+        columns = BusinessColumns.from_profiles(ids, [self._rows[i] for i in ids])
+        return (
+            columns,
+            PrefixIndex(InvertedIndex(columns.naics_owners, columns.naics_codes)),
+            InvertedIndex(columns.past_owners, columns.past_naics_codes),
+            LocationIndex(columns.states, columns.latitudes, columns.longitudes)
+        )
+
+
+opportunity_snapshot = OpportunitySnapshot()
+opportunity_text_snapshot = OpportunityTextSnapshot()
+business_snapshot = BusinessSnapshot()
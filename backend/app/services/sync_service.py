@@ -0,0 +1,264 @@
+import asyncio
+from typing import AsyncIterator, Dict, Optional
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.core.jobs import Job
+from app.db.session import AsyncSessionLocal, SessionLocal
+from app.models.business import Business
+from app.models.sync_state import SyncState
+from app.services.award_service import AwardService, merge_past_performance
+from app.services.ingest_service import IngestResult, OpportunityIngestService
+from app.services.match_alert_service import notify_new_opportunities
+from app.services.matching_service import MatchingService
+from app.services.reminder_service import reminder_scheduler
+from app.services.sam_service import SAMService, notice_posted_at
+from app.services.snapshots import (
+    business_snapshot,
+    opportunity_snapshot,
+    opportunity_text_snapshot,
+)
+
+settings = get_settings()
+
+# Job handlers run on the background job queue. Each opens its own
+# sessions; the synchronous ingest session only runs on worker threads, so
+# the API stays responsive while a sync is in progress.
+
+OPPORTUNITY_SOURCE = "sam.gov/opportunities"
+BACKFILL_SOURCE = "sam.gov/opportunities/backfill"
+
+
+def _load_state(db: Session, source: str) -> SyncState:
+    state = db.get(SyncState, source)
+    if state is None:
+        state = SyncState(source=source)
+        db.add(state)
+    return state
+
+
+def _update_state(db: Session, source: str, **values) -> None:
+    # The ingest commits on this session expire the state object, so it is
+    # re-read, changed and committed together on a worker thread rather
+    # than refreshed lazily on the event loop
+    state = _load_state(db, source)
+    for name, value in values.items():
+        setattr(state, name, value)
+    db.commit()
+
+
+class _Tracker:
+    """
+    Counts the notices streaming into an ingest run for job progress, and
+    remembers the newest posted date among them
+    """
+
+    def __init__(self, job: Job, result: IngestResult):
+        self.job = job
+        self.result = result
+        self.latest_posted: Optional[datetime] = None
+        job.progress.setdefault("fetched", 0)
+
+    async def track(self, notices: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        async for notice in notices:
+            posted = notice_posted_at(notice)
+            if posted and (self.latest_posted is None or posted > self.latest_posted):
+                self.latest_posted = posted
+            self.job.progress["fetched"] += 1
+            self.job.progress.update(self.result.as_counts())
+            yield notice
+
+
+async def _ingest(
+    db: Session,
+    job: Job,
+    posted_from: datetime,
+    posted_to: Optional[datetime],
+    batch_size: Optional[int],
+    result: IngestResult
+) -> _Tracker:
+    # Fetch every page from SAM.gov concurrently and write one
+    # INSERT ... ON CONFLICT statement per batch as notices arrive
+    notices = SAMService().iter_opportunities(
+        posted_from=posted_from, posted_to=posted_to
+    )
+    tracker = _Tracker(job, result)
+    changed_before = len(result.changed_ids)
+    await OpportunityIngestService(db, batch_size=batch_size).upsert_stream(
+        tracker.track(notices), result
+    )
+    job.progress.update(result.as_counts())
+    opportunity_snapshot.mark_stale()
+    opportunity_text_snapshot.mark_stale()
+
+    # Re-score only the notices this run inserted or changed
+    async with AsyncSessionLocal() as match_db:
+        stored = await MatchingService(match_db).rescore_opportunities(
+            result.changed_ids[changed_before:]
+        )
+    await reminder_scheduler.track(result.changed_ids[changed_before:])
+    job.progress["matches_stored"] = job.progress.get("matches_stored", 0) + stored
+    return tracker
+
+
+async def sync_opportunities(
+    job: Job,
+    days_back: Optional[int] = None,
+    batch_size: Optional[int] = None
+) -> Dict:
+    """
+    Pull the notices posted since the last successful sync, upsert them and
+    re-score the changes
+
+    The window starts at the stored watermark, the newest posted date seen
+    by the last successful run; SAM.gov filters by day, so that day is read
+    again and its unchanged rows are skipped by the upsert. Without a
+    watermark, or with an explicit `days_back`, the window is that many
+    days back instead.
+
+    The search API can only filter by posted date, not by when a notice
+    last changed, so the window always reaches back at least
+    SYNC_REVISIT_DAYS: amendments (new deadlines, cancellations) to recent
+    notices are picked up and only the rows that changed are written and
+    re-scored. A notice amended later than that after it was posted is not
+    seen again until a backfill covers its posted date.
+    """
+    db = SessionLocal()
+    try:
+        state = await asyncio.to_thread(_load_state, db, OPPORTUNITY_SOURCE)
+        watermark = state.watermark
+        if days_back is None and watermark is not None:
+            posted_from = min(
+                watermark, datetime.now() - timedelta(days=settings.SYNC_REVISIT_DAYS)
+            )
+        else:
+            posted_from = datetime.now() - timedelta(
+                days=days_back or settings.SYNC_INITIAL_DAYS_BACK
+            )
+        job.progress["posted_from"] = posted_from.date().isoformat()
+
+        result = IngestResult()
+        job.progress["stage"] = "syncing"
+        tracker = await _ingest(db, job, posted_from, None, batch_size, result)
+
+        # The watermark only moves once the whole window has been written
+        if tracker.latest_posted and (watermark is None or tracker.latest_posted > watermark):
+            watermark = tracker.latest_posted
+        await asyncio.to_thread(
+            _update_state, db, OPPORTUNITY_SOURCE,
+            watermark=watermark, last_success_at=datetime.utcnow()
+        )
+
+        # Tell businesses about the notices first seen in this window, once
+        # the window is recorded, so a failed or repeated run never announces
+        # them twice; a backfill's historical notices are not news
+        if settings.NEW_MATCHES_ENABLED:
+            job.progress["stage"] = "notifying"
+            job.progress.update(await notify_new_opportunities(result.new_ids))
+        return {
+            **result.as_counts(),
+            "matches_stored": job.progress["matches_stored"],
+            "new_match_digests": job.progress.get("new_match_digests", 0),
+        }
+    finally:
+        db.close()
+
+
+async def backfill_opportunities(
+    job: Job,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    window_days: Optional[int] = None,
+    batch_size: Optional[int] = None
+) -> Dict:
+    """
+    Load a historical range of notices one posted-date window at a time
+
+    A checkpoint is saved after every window, so a backfill that fails or
+    is interrupted resumes from the next window when queued again without
+    a `start`.
+    """
+    db = SessionLocal()
+    try:
+        state = await asyncio.to_thread(_load_state, db, BACKFILL_SOURCE)
+        if start is None:
+            if not state.cursor:
+                raise ValueError("No unfinished backfill to resume")
+            cursor = dict(state.cursor)
+        else:
+            end = end or date.today()
+            cursor = {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "next": start.isoformat(),
+                "window_days": window_days or settings.SYNC_BACKFILL_WINDOW_DAYS,
+            }
+
+        window = timedelta(days=cursor["window_days"])
+        window_start = date.fromisoformat(cursor["next"])
+        end = date.fromisoformat(cursor["end"])
+        job.progress.update({"stage": "backfilling", "start": cursor["start"], "end": cursor["end"]})
+
+        result = IngestResult()
+        while window_start <= end:
+            window_end = min(window_start + window - timedelta(days=1), end)
+            job.progress["window"] = [window_start.isoformat(), window_end.isoformat()]
+            await _ingest(
+                db, job,
+                datetime.combine(window_start, datetime.min.time()),
+                datetime.combine(window_end, datetime.min.time()),
+                batch_size, result
+            )
+
+            window_start = window_end + timedelta(days=1)
+            cursor["next"] = window_start.isoformat()
+            await asyncio.to_thread(
+                _update_state, db, BACKFILL_SOURCE,
+                cursor=dict(cursor) if window_start <= end else None
+            )
+
+        await asyncio.to_thread(
+            _update_state, db, BACKFILL_SOURCE, last_success_at=datetime.utcnow()
+        )
+        return {**result.as_counts(), "matches_stored": job.progress.get("matches_stored", 0)}
+    finally:
+        db.close()
+
+
+async def sync_business(job: Job, business_id: int, cage_code: str) -> Dict:
+    """
+    Refresh one business from its SAM.gov entity record
+    """
+    job.progress["stage"] = "fetching"
+    entity_data = await SAMService().get_entity_details(cage_code)
+
+    job.progress["stage"] = "saving"
+    async with AsyncSessionLocal() as db:
+        business = await db.get(Business, business_id)
+        if not business:
+            raise ValueError(f"Business {business_id} not found")
+
+        business.name = entity_data.get("entityName")
+        business.duns = entity_data.get("dunsNumber")
+        business.location = {
+            "address": entity_data.get("address", {}),
+            "coordinates": entity_data.get("coordinates", {})
+        }
+
+        # Update certifications
+        if "certifications" in entity_data:
+            business.certifications = entity_data["certifications"]
+
+        # Awards from the locally loaded archive are added to the past
+        # performance entered through the API, never in place of it
+        if business.duns:
+            history = await AwardService(db).past_performance(business.duns)
+            if history:
+                business.past_performance = merge_past_performance(
+                    business.past_performance, history
+                )
+
+        await db.commit()
+        business_snapshot.mark_stale()
+        await MatchingService(db).rescore_business(business)
+    return {"business_id": business_id}
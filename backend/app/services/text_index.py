@@ -0,0 +1,344 @@
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from scipy import sparse
+from app.core.config import get_settings
+
+settings = get_settings()
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+URL_PATTERN = re.compile(r"(?:https?://|www\.)\S+")
+
+STOP_WORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by
+can could do does each for from had has have he her his how i if in into is
+it its may more most must no not of on or other our shall she should so such
+than that the their them then there these they this those through to under
+up upon us was we were what when where which while who will with within would
+you your
+""".split())
+
+# Capability keys that describe an upload rather than what the business does
+METADATA_KEYS = frozenset({"filename", "url", "content_type", "size"})
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Lowercase word tokens of `text`, without URLs, stop words, single
+    characters or bare numbers
+    """
+    if not text:
+        return []
+    text = URL_PATTERN.sub(" ", text.lower())
+    return [
+        token for token in TOKEN_PATTERN.findall(text)
+        if len(token) > 1 and not token.isdigit() and token not in STOP_WORDS
+    ]
+
+
+def hashed_terms(text: Optional[str], n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorted feature positions of the tokens of `text` and their sublinear
+    term frequencies (1 + log count)
+
+    Tokens are hashed with CRC-32, which unlike hash() is the same in every
+    process, so there is no vocabulary to build or keep in sync.
+    """
+    counts: Dict[int, int] = {}
+    for token in tokenize(text):
+        feature = zlib.crc32(token.encode()) % n_features
+        counts[feature] = counts.get(feature, 0) + 1
+    if not counts:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+    features = np.array(sorted(counts), dtype=np.int32)
+    frequencies = 1.0 + np.log([counts[feature] for feature in features.tolist()])
+    return features, frequencies
+
+
+def opportunity_text(title: Optional[str], description: Optional[str]) -> str:
+    """
+    The indexed text of a notice. SAM.gov often sends a link to the full
+    description rather than the text itself; links are dropped by tokenize.
+    """
+    return " ".join(part for part in (title, description) if part)
+
+
+def capability_text(capabilities) -> str:
+    """
+    All the text in a business's capabilities, e.g. capability statement
+    summaries, core competencies and keywords, without upload metadata
+    """
+    parts: List[str] = []
+
+    def collect(value, key=None):
+        if key is not None and (key in METADATA_KEYS or key.endswith("_at")):
+            return
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for child_key, child in value.items():
+                collect(child, str(child_key))
+        elif isinstance(value, (list, tuple)):
+            for child in value:
+                collect(child)
+
+    collect(capabilities)
+    return " ".join(parts)
+
+
+def inverse_document_frequency(document_frequency: np.ndarray, documents: int) -> np.ndarray:
+    # Smoothed, so features no document has still get a finite weight
+    return np.log((1.0 + documents) / (1.0 + document_frequency)) + 1.0
+
+
+def _normalized_rows(matrix: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+    # TF-IDF weights scaled to unit length per row; empty rows stay empty
+    weighted = matrix.astype(np.float64, copy=True)
+    weighted.data *= idf[weighted.indices]
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    weighted.data *= np.repeat(scale, np.diff(weighted.indptr))
+    return weighted
+
+
+def query_matrix(texts: Sequence[str], idf: np.ndarray) -> sparse.csr_matrix:
+    """
+    Unit-length TF-IDF rows for a batch of query texts
+    """
+    n_features = len(idf)
+    indptr = [0]
+    indices, data = [], []
+    for text in texts:
+        features, frequencies = hashed_terms(text, n_features)
+        indices.append(features)
+        data.append(frequencies)
+        indptr.append(indptr[-1] + len(features))
+    matrix = sparse.csr_matrix(
+        (
+            np.concatenate(data) if data else np.empty(0),
+            np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+            np.array(indptr, dtype=np.int64)
+        ),
+        shape=(len(texts), n_features)
+    )
+    return _normalized_rows(matrix, idf)
+
+
+def cosine_similarities(query: str, texts: Sequence[str], idf: np.ndarray) -> np.ndarray:
+    """
+    TF-IDF cosine similarity of `query` against each of `texts`, computed
+    directly rather than through an index
+
+    With the same IDF this agrees with TextIndex.similarities up to
+    floating-point rounding: the two sum the same products in different
+    orders.
+    """
+    if not len(texts):
+        return np.empty(0, dtype=np.float64)
+    similarities = query_matrix(texts, idf) @ query_matrix([query], idf).T
+    return similarities.toarray().ravel()
+
+
+class TextIndex:
+    """
+    Hashed term-frequency rows of a set of documents, keyed by id
+
+    Documents are tokenized once, when they are added; rows are appended,
+    and a replaced or removed document leaves a dead row behind until dead
+    rows make up half the matrix. Document frequencies are kept current on
+    every change, so the IDF weights cost one pass over the features. The
+    unit-length TF-IDF matrix, transposed so a batch of queries is a single
+    sparse product touching only the postings of their terms, is rebuilt
+    lazily once per change of the rows or the weights.
+    """
+
+    def __init__(self, n_features: Optional[int] = None):
+        self.n_features = n_features or settings.TEXT_INDEX_FEATURES
+        self.document_frequency = np.zeros(self.n_features, dtype=np.int64)
+        self._matrix = sparse.csr_matrix((0, self.n_features), dtype=np.float64)
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._row_ids: List[int] = []  # -1 for dead rows
+        self._positions: Dict[int, int] = {}
+        self._digests: Dict[int, int] = {}
+        self._dead = 0
+        self._version = 0
+        self._idf: Optional[Tuple[int, np.ndarray]] = None
+        self._weighted = None
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def upsert(self, doc_id: int, text: Optional[str]) -> bool:
+        """
+        Add or replace the text of a document
+        Returns whether anything changed
+        """
+        digest = zlib.crc32((text or "").encode())
+        if self._digests.get(doc_id) == digest:
+            return False
+        self._drop(doc_id)
+        self._digests[doc_id] = digest
+        features, frequencies = hashed_terms(text, self.n_features)
+        if len(features):
+            self._positions[doc_id] = len(self._row_ids)
+            self._row_ids.append(doc_id)
+            self._pending.append((features, frequencies))
+            self.document_frequency[features] += 1
+        self._version += 1
+        return True
+
+    def remove(self, doc_id: int) -> bool:
+        """
+        Drop a document
+        Returns whether it was indexed
+        """
+        if doc_id not in self._digests:
+            return False
+        self._drop(doc_id)
+        del self._digests[doc_id]
+        self._version += 1
+        return True
+
+    def _drop(self, doc_id: int) -> None:
+        row = self._positions.pop(doc_id, None)
+        if row is None:
+            return
+        if row < self._matrix.shape[0]:
+            start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+            features = self._matrix.indices[start:end]
+        else:
+            features = self._pending[row - self._matrix.shape[0]][0]
+        self.document_frequency[features] -= 1
+        self._row_ids[row] = -1
+        self._dead += 1
+
+    def idf(self) -> Tuple[int, np.ndarray]:
+        """
+        (version, IDF weights) over the live documents
+        """
+        if self._idf is None or self._idf[0] != self._version:
+            self._idf = (
+                self._version,
+                inverse_document_frequency(self.document_frequency, len(self._positions))
+            )
+        return self._idf
+
+    def _consolidate(self) -> None:
+        if self._pending:
+            matrix = sparse.csr_matrix(
+                (
+                    np.concatenate([data for _, data in self._pending]),
+                    np.concatenate([features for features, _ in self._pending]),
+                    np.concatenate((
+                        [0], np.cumsum([len(features) for features, _ in self._pending])
+                    ))
+                ),
+                shape=(len(self._pending), self.n_features)
+            )
+            self._matrix = sparse.vstack((self._matrix, matrix), format="csr")
+            self._pending = []
+        if self._dead and self._dead * 2 >= len(self._row_ids):
+            row_ids = np.array(self._row_ids, dtype=np.int64)
+            live = np.flatnonzero(row_ids >= 0)
+            self._matrix = self._matrix[live]
+            self._row_ids = row_ids[live].tolist()
+            self._positions = {doc_id: row for row, doc_id in enumerate(self._row_ids)}
+            self._dead = 0
+
+    def _weighted_index(self, idf_key: Tuple[int, np.ndarray]):
+        idf_version, idf = idf_key
+        key = (self._version, idf_version)
+        if self._weighted is None or self._weighted[0] != key:
+            self._consolidate()
+            row_ids = np.array(self._row_ids, dtype=np.int64)
+            weighted = _normalized_rows(self._matrix, idf)
+            # Dead rows are zeroed rather than removed until compaction
+            weighted.data[np.repeat(row_ids < 0, np.diff(weighted.indptr))] = 0.0
+            order = np.argsort(row_ids, kind="stable")
+            self._weighted = (key, weighted.T.tocsr(), row_ids[order], order)
+        return self._weighted[1:]
+
+    def similarities(
+        self,
+        texts: Sequence[str],
+        ids: Sequence[np.ndarray],
+        idf: Optional[Tuple[int, np.ndarray]] = None
+    ) -> List[np.ndarray]:
+        """
+        Cosine similarity of each query text against the documents with the
+        given ids, 0 for ids that are not indexed
+
+        All queries are scored with one sparse product. `idf` defaults to the
+        weights of this index's own documents; pass another index's idf() to
+        weight terms by that corpus instead.
+        """
+        if idf is None:
+            idf = self.idf()
+        transposed, sorted_ids, order = self._weighted_index(idf)
+        products = (query_matrix(texts, idf[1]) @ transposed).tocsr()
+
+        results = []
+        for query, wanted in enumerate(ids):
+            wanted = np.asarray(wanted, dtype=np.int64)
+            positions = np.searchsorted(sorted_ids, wanted)
+            positions = np.minimum(positions, max(len(sorted_ids) - 1, 0))
+            found = (
+                sorted_ids[positions] == wanted if len(sorted_ids)
+                else np.zeros(len(wanted), dtype=bool)
+            )
+            row = products.getrow(query).toarray().ravel()
+            values = np.zeros(len(wanted), dtype=np.float64)
+            values[found] = row[order[positions[found]]]
+            results.append(values)
+        return results
+
+    def save(self, path: str, **metadata) -> None:
+        """
+        Write the index (and any string metadata) to an .npz file
+        """
+        self._consolidate()
+        digests = list(self._digests.items())
+        np.savez(
+            path,
+            data=self._matrix.data,
+            indices=self._matrix.indices,
+            indptr=self._matrix.indptr,
+            row_ids=np.array(self._row_ids, dtype=np.int64),
+            digest_ids=np.array([doc_id for doc_id, _ in digests], dtype=np.int64),
+            digests=np.array([digest for _, digest in digests], dtype=np.int64),
+            document_frequency=self.document_frequency,
+            **{f"meta_{key}": np.array(str(value)) for key, value in metadata.items()}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["TextIndex", Dict[str, str]]:
+        """
+        Read an index written by save()
+        Returns the index and its metadata
+        """
+        with np.load(path) as stored:
+            document_frequency = stored["document_frequency"]
+            index = cls(n_features=len(document_frequency))
+            index.document_frequency = document_frequency.astype(np.int64)
+            index._matrix = sparse.csr_matrix(
+                (stored["data"], stored["indices"], stored["indptr"]),
+                shape=(len(stored["row_ids"]), index.n_features)
+            )
+            index._row_ids = stored["row_ids"].tolist()
+            index._positions = {
+                doc_id: row for row, doc_id in enumerate(index._row_ids) if doc_id >= 0
+            }
+            index._dead = len(index._row_ids) - len(index._positions)
+            index._digests = dict(zip(
+                stored["digest_ids"].tolist(), stored["digests"].tolist()
+            ))
+            metadata = {
+                key[len("meta_"):]: str(stored[key])
+                for key in stored.files if key.startswith("meta_")
+            }
+        return index, metadata
@@ -1,7 +1,8 @@
-import httpx
 from typing import Dict, List, Optional
 from datetime import datetime
+from app.core.cache import response_cache
 from app.core.config import get_settings
+from app.core.upstream import upstream
 
 settings = get_settings()
 
@@ -14,17 +15,14 @@ class USASpendingService:
             "Accept": "application/json"
         }
 
-    async def search_awards(
+    def _award_search_payload(
         self,
-        recipient_duns: Optional[str] = None,
-        naics_codes: Optional[List[str]] = None,
-        award_type: Optional[str] = None,
-        start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
-    ) -> List[Dict]:
-        """
-        Search for contract awards in USAspending.gov
-        """
+        recipient_duns: Optional[str],
+        naics_codes: Optional[List[str]],
+        award_type: Optional[str],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> Dict:
         filters = {
             "award_type_codes": [award_type] if award_type else ["A", "B", "C", "D"],
         }
@@ -41,7 +39,7 @@ class USASpendingService:
                 }
             ]
 
-        payload = {
+        return {
             "filters": filters,
             "fields": [
                 "award_id",
@@ -57,27 +55,46 @@ class USASpendingService:
             ]
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/search/spending_by_award",
-                json=payload,
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()["results"]
+    @response_cache.cached("usaspending.search_awards")
+    async def search_awards(
+        self,
+        recipient_duns: Optional[str] = None,
+        naics_codes: Optional[List[str]] = None,
+        award_type: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Search for contract awards in USAspending.gov
+        Returns the first page of results
+        """
+        payload = self._award_search_payload(
+            recipient_duns, naics_codes, award_type, start_date, end_date
+        )
+        response = await upstream.post(
+            f"{self.base_url}/search/spending_by_award",
+            api_key=self.api_key,
+            json=payload,
+            coalesce=True,
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["results"]
 
+    @response_cache.cached("usaspending.recipient_profile")
     async def get_recipient_profile(self, duns: str) -> Dict:
         """
         Get detailed profile information about a recipient
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/recipient/duns/{duns}/",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstream.get(
+            f"{self.base_url}/recipient/duns/{duns}/",
+            api_key=self.api_key,
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()
 
+    @response_cache.cached("usaspending.award_spending_summary")
     async def get_award_spending_summary(
         self,
         recipient_duns: str,
@@ -90,15 +107,16 @@ class USASpendingService:
         if fiscal_year:
             params["fiscal_year"] = fiscal_year
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/recipient/award_spending/summary/",
-                params=params,
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstream.get(
+            f"{self.base_url}/recipient/award_spending/summary/",
+            api_key=self.api_key,
+            params=params,
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()
 
+    @response_cache.cached("usaspending.subaward_count")
     async def get_subaward_count(
         self,
         award_id: str,
@@ -113,11 +131,11 @@ class USASpendingService:
         if recipient_duns:
             params["recipient_duns"] = recipient_duns
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/subawards/count/",
-                params=params,
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstream.get(
+            f"{self.base_url}/subawards/count/",
+            api_key=self.api_key,
+            params=params,
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,111 @@
+"""
+Measure API throughput and latency under a concurrent mixed read load
+
+    python scripts/benchmark_concurrency.py --base-url http://localhost:8000 \\
+        --concurrency 64 --duration 30 --business-id 1 --opportunity-id 1
+
+Runs `concurrency` clients in a closed loop for `duration` seconds, each
+picking an endpoint from the weighted mix below, and prints requests per
+second and latency percentiles per endpoint. Run it against a single
+uvicorn worker before and after a change to compare: with blocking database
+calls, throughput stays flat as concurrency grows, because one query at a
+time holds the event loop.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def endpoint_mix(args):
+    api = "/api/v1"
+    return [
+        # (name, weight, path)
+        ("list", 4, f"{api}/opportunities/?limit=50&status=active"),
+        ("get_opportunity", 3, f"{api}/opportunities/{args.opportunity_id}"),
+        ("get_business", 2, f"{api}/businesses/{args.business_id}"),
+        ("matching_opportunities", 2,
+         f"{api}/businesses/{args.business_id}/matching-opportunities?limit=25"),
+        ("matching_businesses", 1,
+         f"{api}/opportunities/{args.opportunity_id}/matching-businesses?limit=25"),
+        ("search", 1, f"{api}/opportunities/search?q={args.query}"),
+    ]
+
+
+async def client_loop(client, mix, deadline, latencies, errors, rng):
+    names, weights, paths = zip(*mix)
+    while time.perf_counter() < deadline:
+        index = rng.choices(range(len(mix)), weights=weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await client.get(paths[index])
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            latencies[names[index]].append(elapsed)
+        else:
+            errors[names[index]] += 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run(args):
+    mix = endpoint_mix(args)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=60.0
+    ) as client:
+        # Warm the matching snapshots and connection pools first
+        for _, _, path in mix:
+            await client.get(path)
+
+        rng = random.Random(args.seed)
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*[
+            client_loop(client, mix, deadline, latencies, errors, random.Random(rng.random()))
+            for _ in range(args.concurrency)
+        ])
+
+    total = sum(len(values) for values in latencies.values())
+    print(
+        f"{args.concurrency} clients, {args.duration}s: "
+        f"{total / args.duration:.1f} req/s, {sum(errors.values())} errors"
+    )
+    for name, _, _ in mix:
+        values = latencies.get(name)
+        if not values:
+            print(f"  {name}: no successful requests ({errors[name]} errors)")
+            continue
+        print(
+            f"  {name}: {len(values) / args.duration:.1f} req/s, "
+            f"p50 {statistics.median(values) * 1000:.1f} ms, "
+            f"p95 {percentile(values, 0.95) * 1000:.1f} ms, "
+            f"p99 {percentile(values, 0.99) * 1000:.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--business-id", type=int, default=1)
+    parser.add_argument("--opportunity-id", type=int, default=1)
+    parser.add_argument("--query", default="software")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
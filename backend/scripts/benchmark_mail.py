@@ -0,0 +1,119 @@
+"""
+Send a burst of email through the mail queue to a local SMTP sink
+
+    python scripts/benchmark_mail.py --messages 2000 --fail-rate 0.05
+
+Starts an aiosmtpd sink on localhost, which can answer a share of messages
+with a temporary 451 failure to exercise retries, and compares the queue
+against opening one connection per message. Nothing leaves the machine.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import aiosmtplib  # noqa: E402
+from aiosmtpd.controller import Controller  # noqa: E402
+from app.core.config import get_settings  # noqa: E402
+from app.core.mail import MailQueue  # noqa: E402
+
+settings = get_settings()
+
+
+class Sink:
+    def __init__(self, fail_rate, seed):
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.received = 0
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        if self.rng.random() < self.fail_rate:
+            return "451 Temporary failure, try again"
+        self.received += 1
+        return "250 OK"
+
+
+async def one_connection_per_message(count):
+    for i in range(count):
+        await aiosmtplib.send(
+            f"Subject: baseline {i}\n\nhello",
+            sender=settings.MAIL_FROM,
+            recipients=[f"user{i}@example.com"],
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            start_tls=False,
+        )
+
+
+async def run(args):
+    sink = Sink(args.fail_rate, args.seed)
+    controller = Controller(sink, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    settings.SMTP_HOST = "127.0.0.1"
+    settings.SMTP_PORT = args.port
+    settings.SMTP_STARTTLS = False
+    settings.SMTP_USE_TLS = False
+    settings.SMTP_USERNAME = ""
+    settings.MAIL_BACKOFF_BASE_SECONDS = 0.01
+    settings.MAIL_BACKOFF_MAX_SECONDS = 0.1
+    try:
+        baseline = min(args.messages, args.baseline)
+        start = time.perf_counter()
+        received = sink.received
+        sink.fail_rate = 0.0
+        await one_connection_per_message(baseline)
+        baseline_rate = baseline / (time.perf_counter() - start)
+        assert sink.received - received == baseline
+
+        sink.fail_rate = args.fail_rate
+        sink.received = 0
+        sink.sessions.clear()
+        queue = MailQueue(workers=args.workers, batch_size=args.batch_size)
+        await queue.start()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            queue.enqueue(f"user{i}@example.com", f"queued {i}", "<p>hello</p>")
+            for i in range(args.messages)
+        ))
+        elapsed = time.perf_counter() - start
+        await queue.close()
+    finally:
+        controller.stop()
+
+    stats = queue.stats()
+    print(f"one connection per message: {baseline_rate:.0f} messages/s ({baseline} sent)")
+    print(
+        f"mail queue: {args.messages / elapsed:.0f} messages/s, "
+        f"{sum(results)} delivered, {results.count(False)} failed, "
+        f"{sink.received} received by the sink over {len(sink.sessions)} sessions"
+    )
+    print(
+        f"  retries {stats['retries']}, connections {stats['connections_opened']}, "
+        f"batches {stats['batches']}, {stats['messages_per_connection']} messages/connection, "
+        f"latency p50 {stats['delivery_latency_ms']['p50']} ms "
+        f"p95 {stats['delivery_latency_ms']['p95']} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--baseline", type=int, default=200,
+                        help="messages sent one connection each for comparison")
+    parser.add_argument("--workers", type=int, default=settings.MAIL_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=settings.MAIL_BATCH_SIZE)
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="share of messages the sink answers with 451")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Benchmark index-pruned matching against the full scan on synthetic data
+
+    python scripts/benchmark_matching.py --businesses 10000 --opportunities 100000
+
+Checks that both paths return the same matches and prints per-query timings,
+and the build and batched query times of the text index.
+No database is needed: the column stores are built in memory.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.match_index import (  # noqa: E402
+    InvertedIndex,
+    LocationIndex,
+    PrefixIndex,
+    business_candidates,
+    opportunity_candidates,
+)
+from app.services.geo import coordinates_of  # noqa: E402
+from app.services.match_scoring import (  # noqa: E402
+    BusinessColumns,
+    BusinessProfile,
+    OpportunityColumns,
+    score_business_columns,
+    score_opportunity_columns,
+)
+from app.services.text_index import TextIndex  # noqa: E402
+
+STATES = [
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DC", "DE", "FL", "GA", "HI",
+    "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN",
+    "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH",
+    "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA",
+    "WV", "WI", "WY",
+]
+SECTORS = ["23", "31", "33", "42", "48", "51", "54", "56", "61", "62"]
+
+
+class _Opportunity:
+    __slots__ = ("naics_code", "location", "contract_value", "text")
+
+    def __init__(self, naics_code, location, contract_value, text):
+        self.naics_code = naics_code
+        self.location = location
+        self.contract_value = contract_value
+        self.text = text
+
+
+def random_text(rng, words, length):
+    # Word frequencies fall off like natural text, so a few terms are common
+    return " ".join(
+        words[min(int(rng.paretovariate(1.0)) - 1, len(words) - 1)]
+        for _ in range(length)
+    )
+
+
+def random_location(rng):
+    # Most places carry coordinates somewhere in the contiguous US
+    location = {"state": rng.choice(STATES)}
+    if rng.random() < 0.8:
+        location["coordinates"] = {
+            "latitude": rng.uniform(25.0, 49.0),
+            "longitude": rng.uniform(-124.0, -67.0),
+        }
+    return location
+
+
+def build(business_count, opportunity_count, naics_count, seed):
+    rng = random.Random(seed)
+    # Codes spread over a few sectors, so partial prefix matches occur
+    naics = sorted({
+        f"{rng.choice(SECTORS)}{rng.randint(0, 9999):04d}" for _ in range(naics_count)
+    })
+    words = [f"term{i}" for i in range(20000)]
+    rng.shuffle(words)
+
+    opportunities = [
+        _Opportunity(
+            rng.choice(naics), random_location(rng), rng.uniform(1e4, 5e6),
+            random_text(rng, words, rng.randint(10, 60))
+        )
+        for _ in range(opportunity_count)
+    ]
+    coordinates = np.array([coordinates_of(o.location) for o in opportunities])
+    opportunity_columns = OpportunityColumns(
+        ids=np.arange(opportunity_count, dtype=np.int64),
+        naics=np.array([o.naics_code for o in opportunities], dtype=str),
+        states=np.array([o.location["state"] for o in opportunities], dtype=str),
+        contract_values=np.array([o.contract_value for o in opportunities]),
+        latitudes=coordinates[:, 0],
+        longitudes=coordinates[:, 1]
+    )
+
+    profiles = [
+        BusinessProfile.from_fields(
+            rng.sample(naics, rng.randint(1, 4)),
+            random_location(rng),
+            [
+                {"value": rng.uniform(1e4, 5e6), "naics_code": rng.choice(naics)}
+                for _ in range(rng.randint(0, 5))
+            ]
+        )
+        for _ in range(business_count)
+    ]
+    business_columns = BusinessColumns.from_profiles(list(range(business_count)), profiles)
+    capabilities = [random_text(rng, words, rng.randint(20, 120)) for _ in profiles]
+    return opportunities, opportunity_columns, profiles, business_columns, capabilities
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--businesses", type=int, default=10000)
+    parser.add_argument("--opportunities", type=int, default=100000)
+    parser.add_argument("--naics", type=int, default=1000, help="distinct NAICS codes")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--min-score", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    opportunities, opp_columns, profiles, biz_columns, capabilities = build(
+        args.businesses, args.opportunities, args.naics, args.seed
+    )
+    start = time.perf_counter()
+    opp_text_index = TextIndex()
+    for opportunity_id, opportunity in enumerate(opportunities):
+        opp_text_index.upsert(opportunity_id, opportunity.text)
+    idf = opp_text_index.idf()
+    # The first query builds the weighted matrix
+    opp_text_index.similarities([""], [opp_columns.ids[:0]])
+    text_build_time = time.perf_counter() - start
+    biz_text_index = TextIndex()
+    for business_id, text in enumerate(capabilities):
+        biz_text_index.upsert(business_id, text)
+    opp_naics_index = PrefixIndex(InvertedIndex.from_column(opp_columns.naics))
+    opp_location_index = LocationIndex(
+        opp_columns.states, opp_columns.latitudes, opp_columns.longitudes
+    )
+    biz_naics_index = PrefixIndex(
+        InvertedIndex(biz_columns.naics_owners, biz_columns.naics_codes)
+    )
+    biz_past_naics_index = InvertedIndex(biz_columns.past_owners, biz_columns.past_naics_codes)
+    biz_location_index = LocationIndex(
+        biz_columns.states, biz_columns.latitudes, biz_columns.longitudes
+    )
+    min_score = args.min_score
+
+    def opportunity_text(business_id, ids):
+        return opp_text_index.similarities([capabilities[business_id]], [ids])[0]
+
+    def business_text(opportunity, ids):
+        return biz_text_index.similarities([opportunity.text], [ids], idf)[0]
+
+    def full_opportunities(business_id):
+        profile = profiles[business_id]
+        text = opportunity_text(business_id, opp_columns.ids)
+        scores = score_opportunity_columns(profile, opp_columns, text)
+        hits = scores >= min_score
+        return dict(zip(opp_columns.ids[hits].tolist(), scores[hits].tolist()))
+
+    def pruned_opportunities(business_id):
+        profile = profiles[business_id]
+        rows = opportunity_candidates(profile, opp_naics_index, opp_location_index, min_score)
+        columns = opp_columns if rows is None else opp_columns.take(rows)
+        text = opportunity_text(business_id, columns.ids)
+        scores = score_opportunity_columns(profile, columns, text)
+        hits = scores >= min_score
+        return dict(zip(columns.ids[hits].tolist(), scores[hits].tolist()))
+
+    def full_businesses(opportunity):
+        text = business_text(opportunity, biz_columns.ids)
+        scores = score_business_columns(opportunity, biz_columns, text)
+        hits = scores >= min_score
+        return dict(zip(biz_columns.ids[hits].tolist(), scores[hits].tolist()))
+
+    def pruned_businesses(opportunity):
+        rows = business_candidates(
+            opportunity.naics_code, opportunity.location["state"],
+            *coordinates_of(opportunity.location),
+            biz_naics_index, biz_past_naics_index, biz_location_index, min_score
+        )
+        columns = biz_columns if rows is None else biz_columns.take(rows)
+        text = business_text(opportunity, columns.ids)
+        scores = score_business_columns(opportunity, columns, text)
+        hits = scores >= min_score
+        return dict(zip(columns.ids[hits].tolist(), scores[hits].tolist()))
+
+    rng = random.Random(args.seed + 1)
+    totals = {"full_opp": 0.0, "pruned_opp": 0.0, "full_biz": 0.0, "pruned_biz": 0.0}
+    for _ in range(args.queries):
+        business_id = rng.randrange(len(profiles))
+        full_time, full = timed(lambda: full_opportunities(business_id))
+        pruned_time, pruned = timed(lambda: pruned_opportunities(business_id))
+        assert full == pruned, "pruned opportunity matches differ from full scan"
+        totals["full_opp"] += full_time
+        totals["pruned_opp"] += pruned_time
+
+        opportunity = rng.choice(opportunities)
+        full_time, full = timed(lambda: full_businesses(opportunity))
+        pruned_time, pruned = timed(lambda: pruned_businesses(opportunity))
+        assert full == pruned, "pruned business matches differ from full scan"
+        totals["full_biz"] += full_time
+        totals["pruned_biz"] += pruned_time
+
+    print(
+        f"{args.businesses} businesses x {args.opportunities} opportunities, "
+        f"min_score={min_score}, {args.queries} queries per direction"
+    )
+    for direction, full_key, pruned_key in (
+        ("business -> opportunities", "full_opp", "pruned_opp"),
+        ("opportunity -> businesses", "full_biz", "pruned_biz"),
+    ):
+        full_ms = totals[full_key] / args.queries * 1000
+        pruned_ms = totals[pruned_key] / args.queries * 1000
+        print(
+            f"  {direction}: full scan {full_ms:.2f} ms, "
+            f"pruned {pruned_ms:.2f} ms ({full_ms / pruned_ms:.1f}x)"
+        )
+
+    batch = capabilities[:100]
+    batch_time, _ = timed(
+        lambda: opp_text_index.similarities(batch, [opp_columns.ids] * len(batch))
+    )
+    print(
+        f"  text index: built in {text_build_time:.1f} s, {len(batch)} capability "
+        f"texts against every opportunity in {batch_time * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
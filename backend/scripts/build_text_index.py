@@ -0,0 +1,41 @@
+"""
+Build the opportunity text index offline
+
+    python scripts/build_text_index.py /var/lib/samshortlist/text_index.npz
+
+Tokenizing every active notice is the slow part of starting the text
+index from nothing. Point TEXT_INDEX_PATH at the file this writes and the
+API loads it on first use, then only reads the notices changed since it
+was built. Re-run it after changing TEXT_INDEX_FEATURES.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.services.snapshots import OpportunityTextSnapshot  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="where to write the index (.npz)")
+    args = parser.parse_args()
+
+    # Start from the database, not from a previous file
+    snapshot = OpportunityTextSnapshot(path="")
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        snapshot.refresh(db)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    snapshot.save(args.path)
+    print(f"Indexed {len(snapshot)} active opportunities in {elapsed:.1f}s -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
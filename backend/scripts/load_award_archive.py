@@ -0,0 +1,98 @@
+"""
+Load a USAspending award archive (a zip of CSVs) into the awards table
+
+    python scripts/load_award_archive.py FY2024_All_Contracts_Full.zip --workers 4
+    python scripts/load_award_archive.py sample.zip --generate-sample 100000
+
+Each CSV is streamed through PostgreSQL COPY in chunks and merged on the
+award's unique key, so re-running the same archive is safe. With
+--generate-sample a synthetic archive is written first, for trying the
+loader locally.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+import zipfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.award_loader import ARCHIVE_COLUMNS, load_archive  # noqa: E402
+
+STATES = ["CA", "DC", "FL", "MD", "NY", "TX", "VA", "WA"]
+AGENCIES = ["Department of Defense", "Department of Energy", "General Services Administration"]
+
+
+def generate_sample(path, rows, files, seed):
+    rng = random.Random(seed)
+    header = list(ARCHIVE_COLUMNS) + ["award_type"]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for file_number in range(files):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(header)
+            for i in range(file_number, rows, files):
+                start = date(2018, 1, 1) + timedelta(days=rng.randint(0, 2000))
+                value = round(rng.uniform(1e4, 5e6), 2)
+                writer.writerow([
+                    f"CONT_AWD_{i:09d}",
+                    f"PIID{i:09d}",
+                    f"UEI{rng.randint(0, 4999):09d}",
+                    f"{rng.randint(0, 4999):09d}",
+                    f"Recipient {i % 5000}",
+                    str(541000 + rng.randint(0, 999)),
+                    "",
+                    rng.choice(AGENCIES),
+                    rng.choice(AGENCIES),
+                    value * rng.uniform(0.3, 1.0),
+                    value,
+                    start.isoformat(),
+                    (start + timedelta(days=rng.randint(30, 1500))).isoformat(),
+                    rng.choice(STATES),
+                    "D",
+                ])
+            archive.writestr(f"sample_contracts_{file_number + 1}.csv", buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("archive")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-rows", type=int, default=None)
+    parser.add_argument("--generate-sample", type=int, metavar="ROWS", default=None)
+    parser.add_argument("--sample-files", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.generate_sample:
+        generate_sample(args.archive, args.generate_sample, args.sample_files, args.seed)
+        print(f"wrote {args.generate_sample} sample awards to {args.archive}")
+
+    from app.db.session import engine  # noqa: E402
+    from app.models.award import Award  # noqa: E402
+
+    Award.__table__.create(bind=engine, checkfirst=True)
+
+    start = time.perf_counter()
+    result = load_archive(
+        args.archive,
+        workers=args.workers,
+        chunk_rows=args.chunk_rows,
+        on_member=lambda member, member_result: print(
+            f"  {member}: {member_result.rows_read} read, "
+            f"{member_result.rows_written} written"
+        )
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{result.rows_read} rows read, {result.rows_written} written "
+        f"in {elapsed:.1f}s ({result.rows_read / max(elapsed, 1e-9):.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Load the NAICS reference table from the Census Bureau code list
+
+    python scripts/load_naics_codes.py 2022_NAICS_Codes.csv
+
+Takes the "2-6 digit" code file saved as CSV (a code column and a title
+column; the sequence column is ignored). Sector ranges such as "31-33" are
+expanded to each sector. Codes already registered by businesses but missing
+from the file are kept as untitled entries, and the business_naics foreign
+key is added if the table predates it. Safe to run repeatedly.
+"""
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.dialects.postgresql import insert as pg_insert  # noqa: E402
+from app.db.session import engine  # noqa: E402
+from app.models.business import business_naics  # noqa: E402
+from app.models.naics import NAICSCode  # noqa: E402
+from app.services.naics import parent_code  # noqa: E402
+
+
+def read_codes(path):
+    codes = {}
+    with open(path, newline="", encoding="utf-8-sig") as stream:
+        reader = csv.reader(stream)
+        header = [name.lower() for name in next(reader)]
+        code_column = next(i for i, name in enumerate(header) if "code" in name)
+        title_column = next(i for i, name in enumerate(header) if "title" in name)
+        for row in reader:
+            if len(row) <= max(code_column, title_column):
+                continue
+            code = row[code_column].strip()
+            title = row[title_column].strip()
+            if "-" in code:
+                first, last = code.split("-")
+                for sector in range(int(first), int(last) + 1):
+                    codes[str(sector)] = title
+            elif code.isdigit() and 2 <= len(code) <= 6:
+                codes[code] = title
+    return codes
+
+
+def rows_for(codes, known):
+    rows = []
+    for code, title in sorted(codes.items(), key=lambda item: (len(item[0]), item[0])):
+        parent = parent_code(code)
+        while parent and parent not in known:
+            parent = parent_code(parent)
+        rows.append({"code": code, "title": title, "level": len(code), "parent_code": parent})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    codes = read_codes(args.path)
+    with engine.begin() as connection:
+        NAICSCode.__table__.create(bind=connection, checkfirst=True)
+        registered = connection.execute(
+            select(business_naics.c.naics_code).distinct()
+        ).scalars().all()
+        for code in registered:
+            if code and code not in codes:
+                codes[code[:6]] = None
+
+        # Parents sort before their children, so each parent row exists first
+        rows = rows_for(codes, set(codes))
+        table = NAICSCode.__table__
+        for i in range(0, len(rows), 1000):
+            statement = pg_insert(table).values(rows[i:i + 1000])
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.code],
+                set_={
+                    "title": statement.excluded.title,
+                    "level": statement.excluded.level,
+                    "parent_code": statement.excluded.parent_code,
+                }
+            ))
+
+        connection.execute(text(
+            "DO $$ BEGIN "
+            "IF NOT EXISTS (SELECT 1 FROM pg_constraint "
+            "WHERE conname = 'business_naics_naics_code_fkey') THEN "
+            "ALTER TABLE business_naics ADD CONSTRAINT business_naics_naics_code_fkey "
+            "FOREIGN KEY (naics_code) REFERENCES naics_codes (code); "
+            "END IF; END $$"
+        ))
+    print(f"loaded {len(rows)} NAICS codes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Recompute the whole matches table
+
+    python scripts/rebuild_matches.py
+
+Matches are normally kept current incrementally by the sync and business
+endpoints; run this once after creating the table, or after changing the
+match weights, NAICS_LEVEL_CREDIT or MATCH_STORE_MIN_SCORE.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select  # noqa: E402
+from app.db.session import AsyncSessionLocal, engine  # noqa: E402
+from app.models.base import Base  # noqa: E402
+from app.models.business import Business  # noqa: E402
+from app.services.matching_service import MatchingService  # noqa: E402
+
+
+async def rebuild():
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        matching_service = MatchingService(db)
+        business_ids = list(await db.scalars(select(Business.id).order_by(Business.id)))
+        stored = 0
+        for business_id in business_ids:
+            business = await db.get(Business, business_id)
+            stored += await matching_service.rescore_business(business)
+            db.expunge(business)
+        print(f"Stored {stored} matches for {len(business_ids)} businesses")
+
+
+def main():
+    asyncio.run(rebuild())
+
+
+if __name__ == "__main__":
+    main()
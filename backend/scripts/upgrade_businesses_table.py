@@ -0,0 +1,28 @@
+"""
+Bring an existing businesses table up to the current model
+
+    python scripts/upgrade_businesses_table.py
+
+create_all only creates missing tables, so a database created before the
+notification_preferences column existed needs this once. It is safe to run
+repeatedly.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+
+def main():
+    with engine.begin() as connection:
+        connection.execute(text(
+            "ALTER TABLE businesses ADD COLUMN IF NOT EXISTS notification_preferences json"
+        ))
+    print("businesses table is up to date")
+
+
+if __name__ == "__main__":
+    main()
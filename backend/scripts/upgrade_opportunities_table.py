@@ -0,0 +1,35 @@
+"""
+Bring an existing opportunities table up to the current model
+
+    python scripts/upgrade_opportunities_table.py
+
+create_all only creates missing tables, so a database created before the
+search_vector column and the listing/search indexes existed needs this
+once. It is safe to run repeatedly.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app.db.session import engine  # noqa: E402
+from app.models.opportunity import Opportunity  # noqa: E402
+
+
+def main():
+    expression = Opportunity.__table__.c.search_vector.computed.sqltext
+    with engine.begin() as connection:
+        # Adding a stored generated column rewrites the table once
+        connection.execute(text(
+            "ALTER TABLE opportunities ADD COLUMN IF NOT EXISTS search_vector "
+            f"tsvector GENERATED ALWAYS AS ({expression}) STORED"
+        ))
+        for index in Opportunity.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+            print(f"  {index.name}")
+    print("opportunities table is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+The award archive loader against a real PostgreSQL database
+
+Set TEST_DATABASE_URL to a scratch database to run these; the awards
+table in it is dropped and recreated.
+"""
+import csv
+import io
+import os
+import zipfile
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models.award import Award
+from app.services import award_loader
+from app.services.award_loader import ARCHIVE_COLUMNS, load_archive
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+
+def award_row(i, value):
+    return {
+        "contract_award_unique_key": f"CONT_AWD_{i:09d}",
+        "award_id_piid": f"PIID{i:09d}",
+        "recipient_uei": f"UEI{i % 3:09d}",
+        "recipient_duns": f"{i % 3:09d}",
+        "recipient_name": f"Recipient {i % 3}",
+        "naics_code": "541511",
+        "naics_description": "",
+        "awarding_agency_name": "Department of Defense",
+        "funding_agency_name": "",
+        "total_dollars_obligated": value / 2,
+        "current_total_value_of_award": value,
+        "period_of_performance_start_date": "2022-01-01",
+        "period_of_performance_current_end_date": "",
+        "primary_place_of_performance_state_code": "VA",
+    }
+
+
+def write_archive(path, files):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, rows in files.items():
+            buffer = io.StringIO()
+            # Archives carry more columns than are loaded
+            writer = csv.DictWriter(buffer, list(ARCHIVE_COLUMNS) + ["award_type"])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({**row, "award_type": "D"})
+            archive.writestr(name, buffer.getvalue())
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(TEST_DATABASE_URL)
+    Award.__table__.drop(engine, checkfirst=True)
+    Award.__table__.create(engine)
+    monkeypatch.setattr(award_loader.settings, "SQLALCHEMY_DATABASE_URI", TEST_DATABASE_URL)
+    yield engine
+    Award.__table__.drop(engine)
+    engine.dispose()
+
+
+def award_values(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(select(Award.award_key, Award.award_value)).all())
+
+
+def test_reloading_an_archive_writes_nothing(engine, tmp_path):
+    path = str(tmp_path / "awards.zip")
+    write_archive(path, {
+        # A later modification of award 3, chunks after the first, and an
+        # award with no key
+        "contracts_1.csv": [award_row(i, 1000.0 * i) for i in range(7)]
+        + [award_row(3, 999.0), {**award_row(12, 1.0), "contract_award_unique_key": ""}],
+        "contracts_2.csv": [award_row(i, 1000.0 * i) for i in range(7, 12)],
+    })
+
+    first = load_archive(path, workers=1, chunk_rows=3)
+    assert first.rows_read == 14
+    assert first.rows_written == 12
+    loaded = award_values(engine)
+    assert len(loaded) == 12
+    assert loaded["CONT_AWD_000000003"] == 999.0
+
+    second = load_archive(path, workers=1, chunk_rows=3)
+    assert second.rows_read == 14
+    assert second.rows_written == 0
+    assert award_values(engine) == loaded
+
+
+def test_reload_rewrites_only_changed_awards(engine, tmp_path):
+    path = str(tmp_path / "awards.zip")
+    rows = [award_row(i, 1000.0 * i) for i in range(5)]
+    write_archive(path, {"contracts.csv": rows})
+    load_archive(path, workers=1)
+
+    rows[2] = award_row(2, 5.0)
+    write_archive(path, {"contracts.csv": rows})
+    result = load_archive(path, workers=1)
+
+    assert result.rows_written == 1
+    assert award_values(engine)["CONT_AWD_000000002"] == 5.0
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(Award)) == 5
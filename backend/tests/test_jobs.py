@@ -0,0 +1,46 @@
+"""
+JobQueue shutdown, with the jobs table replaced by a record of each save
+"""
+import asyncio
+
+import pytest
+
+from app.core.jobs import JobQueue
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    saved = {}
+
+    async def save(self, job):
+        saved[job.id] = (job.status, job.error, job.finished_at)
+    monkeypatch.setattr(JobQueue, "_save", save)
+    return saved
+
+
+async def forever(job):
+    await asyncio.Event().wait()
+
+
+async def quick(job):
+    return {"ok": True}
+
+
+@pytest.mark.asyncio
+async def test_close_records_interrupted_jobs_as_failed(saved):
+    queue = JobQueue(workers=1)
+    await queue.start()
+    done = await queue.enqueue(quick)
+    running = await queue.enqueue(forever)
+    waiting = await queue.enqueue(forever)
+    while running.status != "running":
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(queue.close(), 5)
+
+    assert saved[done.id][:2] == ("succeeded", None)
+    for job in (running, waiting):
+        status, error, finished_at = saved[job.id]
+        assert status == "failed"
+        assert error == "interrupted by shutdown"
+        assert finished_at is not None
+        assert queue.get(job.id).done
@@ -0,0 +1,147 @@
+"""
+MailQueue against a local aiosmtpd sink
+"""
+import asyncio
+import socket
+from email import message_from_bytes
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.core import mail
+from app.core.mail import MailQueue
+
+
+class Sink:
+    """
+    Accepts every message, except that a subject listed in `replies` gets
+    those replies first, one per attempt
+    """
+
+    def __init__(self):
+        self.received = []
+        self.sessions = set()
+        self.replies = {}
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        subject = message_from_bytes(envelope.content)["Subject"]
+        replies = self.replies.get(subject)
+        if replies:
+            return replies.pop(0)
+        self.received.append(subject)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    sink = Sink()
+    port = free_port()
+    controller = Controller(sink, hostname="127.0.0.1", port=port)
+    controller.start()
+    for name, value in {
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": port,
+        "SMTP_STARTTLS": False,
+        "SMTP_USE_TLS": False,
+        "SMTP_USERNAME": "",
+        "MAIL_BACKOFF_BASE_SECONDS": 0.01,
+        "MAIL_BACKOFF_MAX_SECONDS": 0.05,
+    }.items():
+        monkeypatch.setattr(mail.settings, name, value)
+    yield sink
+    controller.stop()
+
+
+@pytest.mark.asyncio
+async def test_queued_messages_go_out_in_batches_on_one_connection(sink):
+    queue = MailQueue(workers=1, batch_size=10)
+    # Queued before the worker starts, so it finds full batches waiting
+    results = [
+        queue.enqueue(f"user{i}@example.com", f"message {i}", "<p>hello</p>")
+        for i in range(25)
+    ]
+    await queue.start()
+    try:
+        assert all(await asyncio.gather(*results))
+    finally:
+        await queue.close()
+
+    assert sorted(sink.received) == sorted(f"message {i}" for i in range(25))
+    assert len(sink.sessions) == 1
+    assert queue.counters["connections_opened"] == 1
+    assert queue.counters["batches"] == 3
+    assert queue.counters["sent"] == 25
+
+
+@pytest.mark.asyncio
+async def test_temporary_failure_is_retried(sink):
+    sink.replies["flaky"] = ["451 Temporary failure, try again"]
+    queue = MailQueue(workers=1)
+    await queue.start()
+    try:
+        results = await asyncio.gather(
+            queue.send("a@example.com", "flaky", "<p>hello</p>"),
+            queue.send("b@example.com", "steady", "<p>hello</p>"),
+        )
+    finally:
+        await queue.close()
+
+    assert results == [True, True]
+    assert sorted(sink.received) == ["flaky", "steady"]
+    assert queue.counters["retries"] == 1
+    assert queue.counters["failed"] == 0
+    # The 451 leaves the connection usable
+    assert queue.counters["connections_opened"] == 1
+
+
+@pytest.mark.asyncio
+async def test_permanent_failure_is_not_retried(sink):
+    sink.replies["refused"] = ["550 Mailbox unavailable"]
+    queue = MailQueue(workers=1)
+    await queue.start()
+    try:
+        delivered = await queue.send("a@example.com", "refused", "<p>hello</p>")
+    finally:
+        await queue.close()
+
+    assert delivered is False
+    assert sink.received == []
+    assert queue.counters["retries"] == 0
+    assert queue.counters["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_close_fails_messages_waiting_to_retry(sink, monkeypatch):
+    sink.replies["flaky"] = ["451 Temporary failure, try again"]
+    queue = MailQueue(workers=1)
+    monkeypatch.setattr(queue, "_backoff", lambda attempt: 60.0)
+    await queue.start()
+    result = queue.enqueue("a@example.com", "flaky", "<p>hello</p>")
+    while not queue.stats()["retrying"]:
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(queue.close(), 5)
+
+    assert result.done() and result.result() is False
+    assert queue.stats()["retrying"] == 0
+
+
+@pytest.mark.asyncio
+async def test_close_waits_for_retries_due_before_the_timeout(sink, monkeypatch):
+    sink.replies["flaky"] = ["451 Temporary failure, try again"]
+    queue = MailQueue(workers=1)
+    monkeypatch.setattr(queue, "_backoff", lambda attempt: 0.2)
+    await queue.start()
+    result = queue.enqueue("a@example.com", "flaky", "<p>hello</p>")
+    while not queue.stats()["retrying"]:
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(queue.close(timeout=5), 5)
+
+    assert result.result() is True
+    assert sink.received == ["flaky"]
@@ -0,0 +1,95 @@
+"""
+Index-pruned candidates against the full scan: pruning may only skip rows
+that cannot reach the minimum score
+"""
+import random
+
+import numpy as np
+import pytest
+
+from app.services.geo import coordinates_of
+from app.services.match_index import (
+    InvertedIndex,
+    LocationIndex,
+    PrefixIndex,
+    business_candidates,
+    opportunity_candidates,
+)
+from app.services.match_scoring import (
+    BusinessColumns,
+    BusinessProfile,
+    OpportunityColumns,
+    encode_key,
+    score_business_columns,
+    score_opportunity_columns,
+)
+from tests.test_match_scoring import random_business, random_opportunity
+
+MIN_SCORES = [0.2, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+
+
+@pytest.fixture
+def fixture(text_scoring):
+    rng = random.Random(23)
+    businesses = [random_business(rng, i) for i in range(120)]
+    opportunities = [random_opportunity(rng, i) for i in range(600)]
+    return rng, businesses, opportunities
+
+
+def hits(ids, scores, min_score):
+    keep = scores >= min_score
+    return dict(zip(ids[keep].tolist(), scores[keep].tolist()))
+
+
+def test_opportunity_candidates_keep_every_hit(fixture):
+    rng, businesses, opportunities = fixture
+    columns = OpportunityColumns.from_opportunities(opportunities)
+    naics_index = PrefixIndex(InvertedIndex.from_column(columns.naics))
+    location_index = LocationIndex(columns.states, columns.latitudes, columns.longitudes)
+    # Text similarity is the one component an index can't bound, so every
+    # row gets some
+    text = np.array([rng.random() for _ in opportunities])
+
+    pruned_any = False
+    for business in businesses:
+        profile = BusinessProfile.from_business(business)
+        full = score_opportunity_columns(profile, columns, text)
+        for min_score in MIN_SCORES:
+            rows = opportunity_candidates(profile, naics_index, location_index, min_score)
+            if rows is None:
+                rows = np.arange(len(columns))
+            else:
+                pruned_any = pruned_any or len(rows) < len(columns)
+            scores = score_opportunity_columns(profile, columns.take(rows), text[rows])
+            assert hits(columns.ids[rows], scores, min_score) == hits(columns.ids, full, min_score)
+    assert pruned_any
+
+
+def test_business_candidates_keep_every_hit(fixture):
+    rng, businesses, opportunities = fixture
+    columns = BusinessColumns.from_profiles(
+        [business.id for business in businesses],
+        [BusinessProfile.from_business(business) for business in businesses]
+    )
+    naics_index = PrefixIndex(InvertedIndex(columns.naics_owners, columns.naics_codes))
+    past_naics_index = InvertedIndex(columns.past_owners, columns.past_naics_codes)
+    location_index = LocationIndex(columns.states, columns.latitudes, columns.longitudes)
+    text = np.array([rng.random() for _ in businesses])
+
+    pruned_any = False
+    for opportunity in opportunities[:150]:
+        full = score_business_columns(opportunity, columns, text)
+        for min_score in MIN_SCORES:
+            rows = business_candidates(
+                encode_key(opportunity.naics_code),
+                encode_key(opportunity.location.get('state')),
+                *coordinates_of(opportunity.location),
+                naics_index, past_naics_index, location_index, min_score
+            )
+            if rows is None:
+                rows = np.arange(len(columns))
+            else:
+                pruned_any = pruned_any or len(rows) < len(columns)
+            scores = score_business_columns(opportunity, columns.take(rows), text[rows])
+            assert hits(columns.ids[rows], scores, min_score) == hits(columns.ids, full, min_score)
+    assert pruned_any
@@ -0,0 +1,104 @@
+"""
+The vectorized scorers against the scalar one, on random businesses and
+opportunities
+"""
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.matching_service import MatchingService
+
+STATES = ["CA", "DC", "MD", "NY", "TX", "VA"]
+NAICS = ["541511", "541512", "541519", "541611", "236220", "238210", "561210"]
+WORDS = ["software", "cloud", "cyber", "security", "construction", "facility",
+         "support", "network", "training", "logistics", "data", "analytics"]
+
+
+def random_location(rng):
+    location = {"state": rng.choice(STATES)}
+    if rng.random() < 0.7:
+        location["coordinates"] = {
+            "latitude": rng.uniform(30.0, 45.0),
+            "longitude": rng.uniform(-120.0, -75.0),
+        }
+    return location
+
+
+def random_text(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def random_business(rng, business_id):
+    return SimpleNamespace(
+        id=business_id,
+        naics_codes=[
+            SimpleNamespace(code=code) for code in rng.sample(NAICS, rng.randint(1, 3))
+        ],
+        location=random_location(rng),
+        past_performance=[
+            {"value": rng.uniform(5e4, 2e6), "naics_code": rng.choice(NAICS)}
+            for _ in range(rng.randint(0, 4))
+        ],
+        capabilities=rng.sample(WORDS, rng.randint(0, 4)),
+    )
+
+
+def random_opportunity(rng, opportunity_id):
+    return SimpleNamespace(
+        id=opportunity_id,
+        naics_code=rng.choice(NAICS),
+        location=random_location(rng),
+        contract_value=None if rng.random() < 0.1 else rng.uniform(5e4, 2e6),
+        response_deadline=None,
+        title=random_text(rng, rng.randint(2, 6)),
+        description=None if rng.random() < 0.2 else random_text(rng, rng.randint(5, 20)),
+    )
+
+
+@pytest.fixture
+def fixture(text_scoring):
+    rng = random.Random(11)
+    businesses = [random_business(rng, i) for i in range(40)]
+    opportunities = [random_opportunity(rng, i) for i in range(200)]
+    return businesses, opportunities
+
+
+def test_score_many_matches_scalar_scores(fixture):
+    businesses, opportunities = fixture
+    service = MatchingService(db=None)
+    for business in businesses:
+        expected = [service.calculate_match_score(business, opp) for opp in opportunities]
+        np.testing.assert_allclose(
+            service.score_many(business, opportunities), expected, rtol=0, atol=1e-9
+        )
+
+
+def test_score_businesses_matches_scalar_scores(fixture):
+    businesses, opportunities = fixture
+    service = MatchingService(db=None)
+    for opportunity in opportunities[:50]:
+        expected = [service.calculate_match_score(business, opportunity) for business in businesses]
+        np.testing.assert_allclose(
+            service.score_businesses(opportunity, businesses), expected, rtol=0, atol=1e-9
+        )
+
+
+def test_exact_naics_match_in_the_same_state_meets_the_default_threshold():
+    # With text scoring off (the default) the weights are unchanged, so
+    # this pair still makes the 0.6 the match endpoints and alerts use
+    business = SimpleNamespace(
+        naics_codes=[SimpleNamespace(code="541511")],
+        location={"state": "VA"},
+        past_performance=[],
+        capabilities=["software"],
+    )
+    opportunity = SimpleNamespace(
+        id=1, naics_code="541511", location={"state": "VA"}, contract_value=None,
+        response_deadline=None, title="Cloud migration", description=None,
+    )
+    service = MatchingService(db=None)
+
+    assert service.calculate_match_score(business, opportunity) == pytest.approx(0.6)
+    assert service.score_many(business, [opportunity])[0] == pytest.approx(0.6)
@@ -0,0 +1,106 @@
+"""
+SAMService.iter_opportunities against a stub opportunity search
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core import upstream
+from app.core.http import http_client
+from app.services import sam_service
+from app.services.sam_service import SAMService
+
+
+class SearchStub:
+    """
+    Serves `total` notices in pages by offset and limit, slowly enough for
+    pages to overlap; a page at an offset in `failing` answers 500
+    """
+
+    def __init__(self, total, failing=()):
+        self.total = total
+        self.failing = set(failing)
+        self.offsets = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        self.offsets.append(offset)
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            self.in_flight -= 1
+        if offset in self.failing:
+            return httpx.Response(500, json={"error": "internal error"})
+        items = [
+            {"noticeId": f"N{i:05d}", "title": f"Notice {i}", "postedDate": "2024-01-02"}
+            for i in range(offset, min(offset + limit, self.total))
+        ]
+        body = json.dumps({"totalRecords": self.total, "opportunitiesData": items})
+        return httpx.Response(200, content=body.encode())
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_DEFAULT_RATE", 1000.0)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_DEFAULT_BURST", 1000)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_RATE_LIMITS", {})
+    monkeypatch.setattr(upstream, "upstream", upstream.UpstreamClient())
+    monkeypatch.setattr(sam_service, "upstream", upstream.upstream)
+
+    def serve(stub):
+        monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(
+            transport=httpx.MockTransport(stub)
+        ))
+        return stub
+    return serve
+
+
+async def collect(**kwargs):
+    return [
+        notice["notice_id"]
+        async for notice in SAMService().iter_opportunities(**kwargs)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_every_notice_arrives_once(serve, monkeypatch):
+    # A buffer smaller than a page makes the workers wait on the consumer
+    monkeypatch.setattr(sam_service.settings, "SAM_STREAM_BUFFER", 5)
+    stub = serve(SearchStub(total=95))
+    notice_ids = await collect(page_size=10, concurrency=3)
+
+    assert sorted(notice_ids) == [f"N{i:05d}" for i in range(95)]
+    assert sorted(stub.offsets) == list(range(0, 95, 10))
+    assert stub.most_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_single_page_result(serve):
+    stub = serve(SearchStub(total=4))
+
+    assert await collect(page_size=10) == ["N00000", "N00001", "N00002", "N00003"]
+    assert stub.offsets == [0]
+
+
+@pytest.mark.asyncio
+async def test_failing_page_raises(serve, monkeypatch):
+    monkeypatch.setattr(sam_service.settings, "SAM_STREAM_BUFFER", 5)
+    serve(SearchStub(total=95, failing={50}))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await asyncio.wait_for(collect(page_size=10, concurrency=3), 5)
+
+
+@pytest.mark.asyncio
+async def test_failing_first_page_raises(serve):
+    serve(SearchStub(total=95, failing={0}))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await asyncio.wait_for(collect(page_size=10, concurrency=3), 5)
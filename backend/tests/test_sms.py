@@ -0,0 +1,126 @@
+"""
+SMSQueue with the in-memory sender
+"""
+import asyncio
+
+import pytest
+
+from app.core import sms
+from app.core.sms import MemorySender, SMSQueue
+
+
+class FlakySender(MemorySender):
+    """
+    Fails each number's first `failures` sends with `error`
+    """
+
+    def __init__(self, error: Exception, failures: int = 1):
+        super().__init__()
+        self.error = error
+        self.failures = failures
+        self.attempts = {}
+
+    def send(self, to_number: str, body: str) -> None:
+        self.attempts[to_number] = self.attempts.get(to_number, 0) + 1
+        if self.attempts[to_number] <= self.failures:
+            raise self.error
+        super().send(to_number, body)
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    for name, value in {
+        "SMS_RATE_PER_SECOND": 1000.0,
+        "SMS_BURST": 100,
+        "SMS_BACKOFF_BASE_SECONDS": 0.01,
+        "SMS_BACKOFF_MAX_SECONDS": 0.05,
+    }.items():
+        monkeypatch.setattr(sms.settings, name, value)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_message_is_sent_once():
+    sender = MemorySender()
+    queue = SMSQueue(sender=sender, workers=2)
+    await queue.start()
+    try:
+        first = queue.enqueue("+15550100", "3 new matches")
+        second = queue.enqueue("+15550100", "3 new matches")
+        other = queue.enqueue("+15550101", "3 new matches")
+        assert second is first
+        assert await asyncio.gather(first, other) == [True, True]
+    finally:
+        await queue.close()
+
+    assert sorted(sender.sent) == [("+15550100", "3 new matches"), ("+15550101", "3 new matches")]
+    assert queue.counters["deduplicated"] == 1
+    assert queue.counters["sent"] == 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_new_messages(monkeypatch):
+    monkeypatch.setattr(sms.settings, "SMS_QUEUE_SIZE", 2)
+    sender = MemorySender()
+    queue = SMSQueue(sender=sender, workers=1)
+    # No workers yet, so nothing drains the queue
+    accepted = [queue.enqueue(f"+1555010{i}", "hello") for i in range(2)]
+    rejected = queue.enqueue("+15550109", "hello")
+
+    assert rejected.done() and rejected.result() is False
+    assert queue.counters["rejected"] == 1
+    assert queue.stats()["pending"] == 2
+    # A rejected message isn't remembered, so it may be queued again later
+    assert queue.enqueue("+15550109", "hello") is not rejected
+
+    await queue.start()
+    try:
+        assert await asyncio.gather(*accepted) == [True, True]
+    finally:
+        await queue.close()
+    assert len(sender.sent) == 2
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_retried():
+    sender = FlakySender(OSError("connection reset"))
+    queue = SMSQueue(sender=sender, workers=1)
+    await queue.start()
+    try:
+        assert await queue.send("+15550100", "hello") is True
+    finally:
+        await queue.close()
+
+    assert sender.attempts["+15550100"] == 2
+    assert sender.sent == [("+15550100", "hello")]
+    assert queue.counters["retries"] == 1
+    assert queue.counters["failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_permanent_failure_is_not_retried():
+    sender = FlakySender(ValueError("invalid number"))
+    queue = SMSQueue(sender=sender, workers=1)
+    await queue.start()
+    try:
+        assert await queue.send("+15550100", "hello") is False
+    finally:
+        await queue.close()
+
+    assert sender.attempts["+15550100"] == 1
+    assert queue.counters["retries"] == 0
+    assert queue.counters["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_close_fails_messages_waiting_to_retry(monkeypatch):
+    sender = FlakySender(OSError("connection reset"))
+    queue = SMSQueue(sender=sender, workers=1)
+    monkeypatch.setattr(queue, "_backoff", lambda attempt: 60.0)
+    await queue.start()
+    result = queue.enqueue("+15550100", "hello")
+    while not queue.stats()["retrying"]:
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(queue.close(), 5)
+
+    assert result.done() and result.result() is False
+    assert queue.stats()["retrying"] == 0
@@ -0,0 +1,56 @@
+"""
+The posted-date window of sync_opportunities, with the ingest replaced by
+a record of the windows it was asked for
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.jobs import Job
+from app.services import sync_service
+from app.services.sync_service import sync_opportunities
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    windows = []
+    state = SimpleNamespace(watermark=None)
+
+    async def ingest(db, job, posted_from, posted_to, batch_size, result):
+        windows.append(posted_from)
+        job.progress["matches_stored"] = 0
+        return SimpleNamespace(latest_posted=None)
+
+    def update_state(db, source, **values):
+        state.__dict__.update(values)
+
+    monkeypatch.setattr(sync_service, "SessionLocal", lambda: SimpleNamespace(close=lambda: None))
+    monkeypatch.setattr(sync_service, "_load_state", lambda db, source: state)
+    monkeypatch.setattr(sync_service, "_update_state", update_state)
+    monkeypatch.setattr(sync_service, "_ingest", ingest)
+    monkeypatch.setattr(sync_service.settings, "NEW_MATCHES_ENABLED", False)
+    monkeypatch.setattr(sync_service.settings, "SYNC_REVISIT_DAYS", 7)
+    return SimpleNamespace(windows=windows, state=state)
+
+
+def run():
+    return sync_opportunities(Job(sync_opportunities, {}))
+
+
+@pytest.mark.asyncio
+async def test_recent_watermark_still_revisits_the_trailing_days(sync):
+    sync.state.watermark = datetime.now() - timedelta(hours=2)
+    await run()
+
+    [posted_from] = sync.windows
+    assert abs(posted_from - (datetime.now() - timedelta(days=7))) < timedelta(minutes=1)
+
+
+@pytest.mark.asyncio
+async def test_old_watermark_starts_the_window(sync):
+    watermark = datetime.now() - timedelta(days=30)
+    sync.state.watermark = watermark
+    await run()
+
+    assert sync.windows == [watermark]
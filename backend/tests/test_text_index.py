@@ -0,0 +1,33 @@
+"""
+The indexed text similarities against the pairwise ones
+"""
+import random
+
+import numpy as np
+
+from app.services.text_index import TextIndex, cosine_similarities
+from tests.test_match_scoring import WORDS, random_text
+
+
+def test_index_agrees_with_pairwise_similarities():
+    rng = random.Random(5)
+    documents = {i: random_text(rng, rng.randint(3, 30)) for i in range(300)}
+    index = TextIndex(n_features=2 ** 12)
+    for doc_id, text in documents.items():
+        index.upsert(doc_id, text)
+    # Replaced and removed documents leave dead rows the index must skip
+    for doc_id in range(0, 300, 7):
+        documents[doc_id] = random_text(rng, rng.randint(3, 30))
+        index.upsert(doc_id, documents[doc_id])
+    for doc_id in range(3, 300, 11):
+        del documents[doc_id]
+        index.remove(doc_id)
+
+    _, idf = index.idf()
+    ids = np.array(sorted(documents), dtype=np.int64)
+    queries = [" ".join(rng.sample(WORDS, rng.randint(1, 5))) for _ in range(20)]
+    indexed = index.similarities(queries, [ids] * len(queries))
+    for query, similarities in zip(queries, indexed):
+        pairwise = cosine_similarities(query, [documents[i] for i in ids.tolist()], idf)
+        # The two sum the same products in different orders
+        np.testing.assert_allclose(similarities, pairwise, rtol=0, atol=1e-12)
@@ -0,0 +1,108 @@
+"""
+UpstreamClient against a stub upstream server
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import upstream
+from app.core.http import http_client
+from app.core.upstream import UpstreamClient
+
+URL = "https://api.example.gov/opportunities"
+
+
+class StubServer:
+    """
+    Answers with the queued responses in turn, then 200s; holds each
+    request until `release` is set
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await self.release.wait()
+        if self.responses:
+            return self.responses.pop(0)
+        return httpx.Response(200, json={"call": self.calls})
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubServer()
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(
+        transport=httpx.MockTransport(server)
+    ))
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_BACKOFF_MAX_SECONDS", 0.01)
+    return server
+
+
+@pytest.mark.asyncio
+async def test_identical_reads_share_one_call(stub):
+    client = UpstreamClient()
+    stub.release.clear()
+    requests = [
+        asyncio.create_task(client.get(URL, params={"page": 1})) for _ in range(5)
+    ]
+    await asyncio.sleep(0.05)
+    stub.release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert stub.calls == 1
+    assert all(response.json() == {"call": 1} for response in responses)
+    assert client.counters["coalesced"] == 4
+    # Different parameters are a different request
+    await client.get(URL, params={"page": 2})
+    assert stub.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_response_is_retried_after_the_requested_delay(stub):
+    client = UpstreamClient()
+    stub.responses = [httpx.Response(429, headers={"Retry-After": "0.2"})]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    response = await client.get(URL)
+
+    assert response.status_code == 200
+    assert loop.time() - start >= 0.2
+    assert stub.calls == 2
+    assert client.counters["rate_limited_responses"] == 1
+    assert client.counters["retries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_is_returned_to_the_caller(stub):
+    client = UpstreamClient()
+    stub.responses = [httpx.Response(429, headers={"Retry-After": "86400"})]
+    response = await client.get(URL)
+
+    assert response.status_code == 429
+    assert stub.calls == 1
+    assert client.counters["gave_up"] == 1
+
+
+@pytest.mark.asyncio
+async def test_followers_survive_a_cancelled_leader(stub):
+    client = UpstreamClient()
+    stub.release.clear()
+    leader = asyncio.create_task(client.get(URL))
+    await asyncio.sleep(0.05)
+    followers = [asyncio.create_task(client.get(URL)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    leader.cancel()
+    await asyncio.sleep(0.05)
+    stub.release.set()
+    responses = await asyncio.gather(*followers)
+
+    assert leader.cancelled()
+    # One follower repeats the call and the others share its response
+    assert stub.calls == 2
+    assert all(response.json() == {"call": 2} for response in responses)